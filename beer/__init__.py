@@ -6,3 +6,5 @@ from . import features
 from . import nnet
 from . import priors
 from . import graph
+from .decoders import *
+from .scorers import *
@@ -0,0 +1,350 @@
+'''Decoders for the compiled graphs.'''
+
+import numpy as np
+import torch
+from .graph import _backtrack_dtype, _traceback
+
+
+class BeamSearchDecoder:
+    '''Beam-pruned token-passing (Viterbi) decoder.
+
+    Contrary to :any:`CompiledGraph.best_path`, only the states whose
+    score is within the beam of the best score of the frame are kept
+    active and the emissions are evaluated only for the pdfs of the
+    active states. The emissions are evaluated by chunks of frames:
+    when a frame needs pdfs that were not evaluated yet, these pdfs
+    are evaluated at once for all the remaining frames of the chunk.
+    As the active states change slowly, most of the frames reuse the
+    log-likelihoods already computed.
+
+    Note:
+        The decoder is meant for large decoding graphs (e.g. word
+        loops or phone loops with thousands of states). The active
+        states are processed frame by frame with a fixed overhead
+        per frame, so on small graphs such as the TIMIT phone loop
+        (about 150 states) the exhaustive search of
+        :any:`CompiledGraph.best_path`, which also evaluates the
+        emissions of all the frames at once, is faster.
+
+    Attributes:
+        graph (:any:`CompiledGraph`): Decoding graph.
+        beam (float): Log-likelihood beam.
+        max_active (int): Maximum number of active states per frame.
+        chunk_size (int): Number of frames per chunk of emissions.
+        n_active (list): Number of active states for each frame of the
+            last decoded utterance.
+        n_llh_calls (int): Number of calls to the log-likelihood
+            function for the last decoded utterance.
+
+    '''
+
+    def __init__(self, graph, beam=None, max_active=None, chunk_size=50):
+        '''
+        Args:
+            graph (:any:`CompiledGraph`): Decoding graph.
+            beam (float): Log-likelihood beam. If None, the states are
+                not pruned according to their score.
+            max_active (int): Maximum number of active states per
+                frame. If None, the number of active states is not
+                limited.
+            chunk_size (int): Number of frames per chunk of emissions.
+
+        '''
+        self.graph = graph
+        self.beam = beam
+        self.max_active = max_active
+        self.chunk_size = chunk_size
+        self.n_active = []
+        self.n_llh_calls = 0
+
+        # Outgoing arcs of each state (CSR format).
+        trans_probs = graph.trans_probs
+        if not graph.is_sparse:
+            trans_probs = trans_probs.to_sparse()
+        trans_probs = trans_probs.coalesce()
+        self._src, self._dest = trans_probs.indices()
+        self._log_weights = trans_probs.values().log()
+        counts = torch.bincount(self._src, minlength=graph.n_states)
+        self._offsets = torch.zeros(graph.n_states + 1, dtype=torch.long,
+                                    device=counts.device)
+        self._offsets[1:] = counts.cumsum(dim=0)
+
+        if graph.pdf_id_mapping is not None:
+            self._pdf_ids = torch.tensor(graph.pdf_id_mapping,
+                                         device=counts.device)
+        else:
+            self._pdf_ids = torch.arange(graph.n_states, device=counts.device)
+        self._n_pdfs = int(self._pdf_ids.max()) + 1
+
+    def _expand(self, states, scores):
+        # Outgoing arcs of the given states and their scores.
+        starts = self._offsets[states]
+        counts = self._offsets[states + 1] - starts
+        arc_offsets = counts.cumsum(dim=0) - counts
+        arcs = torch.arange(int(counts.sum()), device=states.device)
+        arcs += (starts - arc_offsets).repeat_interleave(counts)
+        src_idxs = torch.arange(len(states), device=states.device)
+        src_idxs = src_idxs.repeat_interleave(counts)
+        return arcs, src_idxs, scores[src_idxs] + self._log_weights[arcs]
+
+    def _recombine(self, arcs, src_idxs, arc_scores, dtype):
+        # Best incoming arc of each reached state. On ties, the arc
+        # with the lowest start state is selected as in
+        # :any:`CompiledGraph.best_path`.
+        dest = self._dest[arcs]
+        best_scores = torch.full((self.graph.n_states,), float('-inf'),
+                                 dtype=dtype, device=arc_scores.device)
+        best_scores.scatter_reduce_(0, dest, arc_scores, reduce='amax')
+        states = torch.nonzero(best_scores > float('-inf')).view(-1)
+        candidates = torch.where(arc_scores == best_scores[dest], src_idxs,
+                                 torch.full_like(src_idxs, len(src_idxs)))
+        best_src = torch.full((self.graph.n_states,), len(src_idxs),
+                              dtype=torch.long, device=arc_scores.device)
+        best_src.scatter_reduce_(0, dest, candidates, reduce='amin')
+        return states, best_scores[states], best_src[states]
+
+    def _prune(self, states, scores, backpointers):
+        keep = None
+        if self.beam is not None:
+            keep = scores >= scores.max() - self.beam
+            states, scores = states[keep], scores[keep]
+            backpointers = backpointers[keep]
+        if self.max_active is not None and len(states) > self.max_active:
+            keep = torch.topk(scores, self.max_active)[1].sort()[0]
+            states, scores = states[keep], scores[keep]
+            backpointers = backpointers[keep]
+        return states, scores, backpointers
+
+    def _emissions(self, emissions, frame, states):
+        pdf_ids = self._pdf_ids[states]
+        if not emissions.is_evaluated(frame, pdf_ids):
+            emissions.evaluate(frame, pdf_ids)
+        return emissions.log_likelihood(frame, pdf_ids)
+
+    def decode(self, llh_fn, n_frames):
+        '''Most likely sequence of states.
+
+        Args:
+            llh_fn (function): Function ``llh_fn(frames, pdf_ids)``
+                returning the log-likelihood
+                (``torch.Tensor[n, len(pdf_ids)]``) of the given pdfs
+                for the frames selected by the slice ``frames``.
+            n_frames (int): Number of frames of the utterance.
+
+        Returns:
+            ``torch.LongTensor[n_frames]``
+
+        '''
+        emissions = _ChunkedEmissions(llh_fn, n_frames, self._n_pdfs,
+                                      self.chunk_size, self._pdf_ids.device)
+        init_probs = self.graph.init_probs
+        states = torch.nonzero(init_probs > 0).view(-1)
+        scores = init_probs[states].log() \
+            + self._emissions(emissions, 0, states)
+        backpointers = torch.zeros_like(states)
+        states, scores, backpointers = self._prune(states, scores,
+                                                   backpointers)
+
+        # For each frame, the active states and the index of their
+        # predecessor in the active states of the previous frame.
+        history = [(states.cpu().numpy(), backpointers.cpu().numpy())]
+        for frame in range(1, n_frames):
+            arcs, src_idxs, arc_scores = self._expand(states, scores)
+            states, scores, backpointers = \
+                self._recombine(arcs, src_idxs, arc_scores, scores.dtype)
+            scores = scores + self._emissions(emissions, frame, states)
+            states, scores, backpointers = self._prune(states, scores,
+                                                       backpointers)
+            history.append((states.cpu().numpy(), backpointers.cpu().numpy()))
+
+        final_scores = scores + self.graph.final_probs[states].log()
+        if torch.isinf(final_scores).all():
+            # No final state survived the pruning: we pick the best
+            # active state.
+            final_scores = scores
+        best_idx = int(torch.argmax(final_scores))
+        self.n_active = [len(frame_states) for frame_states, _ in history]
+        self.n_llh_calls = emissions.n_calls
+        return torch.from_numpy(_history_traceback(history, best_idx))
+
+
+class _ChunkedEmissions:
+    '''Log-likelihoods of the pdfs evaluated on demand by chunks of
+    frames.'''
+
+    def __init__(self, llh_fn, n_frames, n_pdfs, chunk_size, device):
+        self.llh_fn = llh_fn
+        self.n_frames = n_frames
+        self.n_pdfs = n_pdfs
+        self.chunk_size = chunk_size
+        self.n_calls = 0
+        self.start = self.end = 0
+        self.llhs = None
+        self.scored = torch.zeros(n_pdfs, dtype=torch.bool, device=device)
+
+    def is_evaluated(self, frame, pdf_ids):
+        'Whether the given pdfs are already evaluated for the frame.'
+        return frame < self.end and bool(self.scored[pdf_ids].all())
+
+    def log_likelihood(self, frame, pdf_ids):
+        'Log-likelihood of the given (evaluated) pdfs for the frame.'
+        return self.llhs[frame - self.start, pdf_ids]
+
+    def evaluate(self, frame, pdf_ids):
+        '''Evaluate the given pdfs (if not done already) from the given
+        frame up to the end of its chunk.'''
+        if frame >= self.end:
+            self.start = frame
+            self.end = min(frame + self.chunk_size, self.n_frames)
+            self.scored.zero_()
+        pdf_ids = torch.unique(pdf_ids)
+        pdf_ids = pdf_ids[~self.scored[pdf_ids]]
+        llhs = self.llh_fn(slice(frame, self.end), pdf_ids)
+        self.n_calls += 1
+        if self.llhs is None:
+            self.llhs = torch.zeros(self.chunk_size, self.n_pdfs,
+                                    dtype=llhs.dtype, device=llhs.device)
+        self.llhs[frame - self.start:self.end - self.start, pdf_ids] = llhs
+        self.scored[pdf_ids] = True
+
+
+class OnlineViterbiDecoder:
+    '''Incremental Viterbi decoder for streams.
+
+    The log-likelihoods are given chunk by chunk and the decoder keeps
+    the Viterbi scores and the back-pointers between the calls. As soon
+    as all the surviving hypotheses share the same history, this
+    history is part of the best path whatever comes next and it is
+    output (partial traceback) and removed from the buffer.
+
+    Attributes:
+        graph (:any:`CompiledGraph`): Decoding graph.
+        max_delay (int): Maximum number of buffered frames.
+
+    '''
+
+    def __init__(self, graph, max_delay=None):
+        '''
+        Args:
+            graph (:any:`CompiledGraph`): Decoding graph.
+            max_delay (int): Maximum number of frames kept in the
+                buffer. When the buffer gets longer, the oldest frames
+                of the current best hypothesis are output even if the
+                hypotheses do not agree on them yet. This bounds the
+                memory for streams where the hypotheses never
+                converge at the price of a (possibly) sub-optimal
+                path. If None, the delay is not limited.
+
+        '''
+        self.graph = graph
+        self.max_delay = max_delay
+        self._log_trans_probs = graph._log_trans_probs()
+        self._dtype = _backtrack_dtype(graph.n_states)
+        self.reset()
+
+    def reset(self):
+        '''Prepare the decoder for a new stream.'''
+        self._omega = None
+        self._backtrack = torch.zeros((0, self.graph.n_states),
+                                      dtype=self._dtype).numpy()
+
+    @property
+    def delay(self):
+        'int: Number of frames in the buffer (not output yet).'
+        return len(self._backtrack)
+
+    def push(self, llhs):
+        '''Decode a new chunk of the stream.
+
+        Args:
+            llhs (``torch.Tensor[n_frames, n_states]``): Per-frame
+                log-likelihood of each state for the new chunk.
+
+        Returns:
+            ``torch.LongTensor``: Newly decided states of the best
+            path (possibly empty).
+
+        '''
+        backtrack = torch.zeros(llhs.shape, dtype=self._dtype,
+                                device=llhs.device)
+        start = 0
+        if self._omega is None and len(llhs) > 0:
+            self._omega = llhs[0] + self.graph.init_probs.log()
+            start = 1
+        omega = self._omega
+        for i in range(start, len(llhs)):
+            hypothesis, backtrack[i] = \
+                self.graph._viterbi_step(omega, self._log_trans_probs)
+            omega = llhs[i] + hypothesis
+        self._omega = omega
+        self._backtrack = np.concatenate([self._backtrack,
+                                          backtrack.cpu().numpy()])
+        return torch.from_numpy(self._partial_traceback())
+
+    def finalize(self):
+        '''End of the stream: output the remaining states of the best
+        path and reset the decoder.
+
+        Returns:
+            ``torch.LongTensor``
+
+        '''
+        if self.delay == 0:
+            self.reset()
+            return torch.zeros(0, dtype=torch.long)
+        final_scores = self._omega + self.graph.final_probs.log()
+        if torch.isinf(final_scores).all():
+            # No final state reached: we pick the best current state.
+            final_scores = self._omega
+        last_state = int(torch.argmax(final_scores))
+        path = _traceback(self._backtrack, last_state)
+        self.reset()
+        return torch.from_numpy(path)
+
+    def _output(self, n_frames, last_state):
+        # Output the first frames of the buffer ending with the given
+        # state.
+        path = _traceback(self._backtrack[:n_frames], last_state)
+        self._backtrack = self._backtrack[n_frames:].copy()
+        return path
+
+    def _partial_traceback(self):
+        buffer_len = len(self._backtrack)
+        if buffer_len == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Follow the back-pointers of all the surviving hypotheses
+        # until they merge.
+        states = torch.nonzero(self._omega > float('-inf')).view(-1)
+        states = np.unique(states.cpu().numpy())
+        frame = buffer_len - 1
+        while len(states) > 1 and frame > 0:
+            states = np.unique(self._backtrack[frame, states])
+            frame -= 1
+        if len(states) == 1:
+            path = self._output(frame + 1, int(states[0]))
+        else:
+            path = np.zeros(0, dtype=np.int64)
+
+        if self.max_delay is not None and self.delay > self.max_delay:
+            # Force the output of the oldest frames of the current best
+            # hypothesis.
+            n_frames = self.delay - self.max_delay
+            best_state = int(torch.argmax(self._omega))
+            best_path = _traceback(self._backtrack, best_state)
+            path = np.concatenate([
+                path, self._output(n_frames, int(best_path[n_frames - 1]))
+            ])
+        return path
+
+
+def _history_traceback(history, best_idx):
+    path = np.zeros(len(history), dtype=np.int64)
+    for frame in range(len(history) - 1, -1, -1):
+        states, backpointers = history[frame]
+        path[frame] = states[best_idx]
+        best_idx = backpointers[best_idx]
+    return path
+
+
+__all__ = ['BeamSearchDecoder', 'OnlineViterbiDecoder']
@@ -1,33 +1,68 @@
 'Acoustic graph for the HMM.'
 
+from array import array
 from collections import defaultdict, OrderedDict
+from collections.abc import Mapping
+import json
+import math
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 import torch
+from torch.nn.utils.rnn import PackedSequence, pad_packed_sequence
 from .utils import logsumexp
 
 
 class Arc:
     '''Arc between to state (i.e. node) of a graph with a weight.
 
+    Note:
+        The arcs are stored by the graph in compact arrays. An
+        :any:`Arc` object is only a light view on this storage:
+        setting its weight modifies the graph.
+
     Attributes:
+        arc_id (int): Identifier of the arc within the graph.
         start (int): Identifier of the starting state.
         end (int): Identifier of the ending state.
         weight (float): Weight of the arc.
     '''
     __repr_str = 'Arc(start={}, end={}, weight={})'
+    __slots__ = ('_graph', 'arc_id')
 
-    def __init__(self, start, end, weight):
+    def __init__(self, graph, arc_id):
         '''
         Args:
-            start (State): Starting state.
-            end (State): Final state,
-            weight (int): Weight of the arc.
+            graph (:any:`Graph`): Graph storing the arc.
+            arc_id (int): Identifier of the arc.
         '''
-        self.start = start
-        self.end = end
-        self.weight = weight
+        self._graph = graph
+        self.arc_id = arc_id
+
+    @property
+    def start(self):
+        return self._graph._arc_starts[self.arc_id]
+
+    @property
+    def end(self):
+        return self._graph._arc_ends[self.arc_id]
+
+    @property
+    def weight(self):
+        return self._graph._arc_weights[self.arc_id]
+
+    @weight.setter
+    def weight(self, value):
+        self._graph._arc_weights[self.arc_id] = value
 
     def __hash__(self):
-        return hash('{}:{}'.format(self.start, self.end))
+        return hash(self.arc_id)
+
+    def __eq__(self, other):
+        if isinstance(other, Arc):
+            return self._graph is other._graph and self.arc_id == other.arc_id
+        return NotImplemented
 
     def __repr__(self):
         return self.__repr_str.format(self.start, self.end, self.weight)
@@ -70,6 +105,11 @@ def _state_name(symbols, state_id):
 class Graph:
     '''Graph.
 
+    The arcs are stored in compact arrays (start state, end state and
+    weight) and are identified by their integer index in these arrays.
+    Each state keeps an index of its outgoing and incoming arcs so that
+    all the operations on the graph run in O(V + E).
+
     Attributes:
         states (dictionary): All the states of the graph.
         arcs (dictionary): All the arcs of the graph.
@@ -78,11 +118,29 @@ class Graph:
     def __init__(self):
         self._state_count = 0
         self._states = OrderedDict()
-        self._arcs = set()
+        self._arc_starts = array('l')
+        self._arc_ends = array('l')
+        self._arc_weights = array('d')
+        self._out_arcs = defaultdict(dict)
+        self._in_arcs = defaultdict(dict)
         self.symbols = {}
         self.start_state = None
         self.end_state = None
 
+    def __setstate__(self, state):
+        # Graphs pickled before the indexed storage kept a set of
+        # "Arc" objects.
+        old_arcs = state.pop('_arcs', None)
+        self.__dict__.update(state)
+        if old_arcs is not None:
+            self._arc_starts = array('l')
+            self._arc_ends = array('l')
+            self._arc_weights = array('d')
+            self._out_arcs = defaultdict(dict)
+            self._in_arcs = defaultdict(dict)
+            for arc in old_arcs:
+                self.add_arc(arc.start, arc.end, arc.weight)
+
     def __repr__(self):
         retval = ''
         for i, state in enumerate(self._states):
@@ -110,21 +168,30 @@ class Graph:
                      label=str(round(arc.weight, 3)))
         return graphviz.Source(dot.source)._repr_svg_()
 
+    @property
+    def n_arcs(self):
+        'Number of arcs in the graph.'
+        return sum(len(arc_ids) for arc_ids in self._out_arcs.values())
+
     def states(self):
         '''Iterate over the states.'''
         return self._states.keys()
 
+    def _arc_ids(self, state_id=None, incoming=False):
+        if state_id is None:
+            for arc_ids in self._out_arcs.values():
+                yield from arc_ids
+        elif incoming:
+            yield from self._in_arcs.get(state_id, ())
+        else:
+            yield from self._out_arcs.get(state_id, ())
+
     def arcs(self, state_id=None, incoming=False):
         '''Iterates over the arcs. If state is provided enumerate the
         outgoing args from "state_id"
         '''
-        for arc in self._arcs:
-            if not incoming:
-                if arc.start == state_id or state_id is None:
-                    yield arc
-            else:
-                if arc.end == state_id or state_id is None:
-                    yield arc
+        for arc_id in list(self._arc_ids(state_id, incoming)):
+            yield Arc(self, arc_id)
 
     def add_state(self, pdf_id=None):
         state_id = self._state_count
@@ -134,17 +201,26 @@ class Graph:
         return state_id
 
     def add_arc(self, start, end, weight=1.0):
-        new_arc = Arc(start, end, weight)
-        self._arcs.add(new_arc)
-        return new_arc
+        arc_id = len(self._arc_starts)
+        self._arc_starts.append(start)
+        self._arc_ends.append(end)
+        self._arc_weights.append(weight)
+        self._out_arcs[start][arc_id] = None
+        self._in_arcs[end][arc_id] = None
+        return Arc(self, arc_id)
+
+    def _remove_arc(self, arc_id):
+        del self._out_arcs[self._arc_starts[arc_id]][arc_id]
+        del self._in_arcs[self._arc_ends[arc_id]][arc_id]
 
     def normalize(self):
-        for state_id in self.states():
+        weights = self._arc_weights
+        for arc_ids in self._out_arcs.values():
             sum_out_weights = 0.
-            for arc in self.arcs(state_id):
-                sum_out_weights += arc.weight
-            for arc in self.arcs(state_id):
-                arc.weight /= sum_out_weights
+            for arc_id in arc_ids:
+                sum_out_weights += weights[arc_id]
+            for arc_id in arc_ids:
+                weights[arc_id] /= sum_out_weights
 
     def replace_state(self, old_state_id, graph):
         '''Replace a state with a graph.'''
@@ -157,157 +233,579 @@ class Graph:
             new_states[state_id] = new_state_id
 
         # Copy the arcs.
-        for arc in graph.arcs():
-            self.add_arc(new_states[arc.start], new_states[arc.end], arc.weight)
+        for arc_id in graph._arc_ids():
+            self.add_arc(new_states[graph._arc_starts[arc_id]],
+                         new_states[graph._arc_ends[arc_id]],
+                         graph._arc_weights[arc_id])
 
         # Connect the unit graph to the main graph.
         to_delete = []
         new_arcs = []
-        for arc in self.arcs(old_state_id):
-            to_delete.append(arc)
-            new_arcs.append((new_states[graph.end_state], arc.end, arc.weight))
-        for arc in self.arcs(old_state_id, incoming=True):
-            to_delete.append(arc)
-            new_arcs.append((arc.start, new_states[graph.start_state], arc.weight))
+        unit_start = new_states[graph.start_state]
+        unit_end = new_states[graph.end_state]
+        for arc_id in self._arc_ids(old_state_id):
+            to_delete.append(arc_id)
+            new_arcs.append((unit_end, self._arc_ends[arc_id],
+                             self._arc_weights[arc_id]))
+        for arc_id in self._arc_ids(old_state_id, incoming=True):
+            to_delete.append(arc_id)
+            new_arcs.append((self._arc_starts[arc_id], unit_start,
+                             self._arc_weights[arc_id]))
 
         # Add the new arcs.
         for start, end, weight in new_arcs:
             self.add_arc(start, end, weight)
 
         # Remove the old arcs and the replaced state.
-        for arc in to_delete:
-            self._arcs.remove(arc)
+        for arc_id in to_delete:
+            # A self-loop appears in both the outgoing and incoming arcs.
+            if arc_id in self._out_arcs[self._arc_starts[arc_id]]:
+                self._remove_arc(arc_id)
+        self._out_arcs.pop(old_state_id, None)
+        self._in_arcs.pop(old_state_id, None)
         del self._states[old_state_id]
 
-    def _find_next_pdf_ids(self, start_state, init_weight):
-        to_explore = [(arc, init_weight) for arc in self.arcs(start_state)]
-        visited = set([start_state])
-        while to_explore:
-            arc, weight = to_explore.pop()
-            pdf_id = self._states[arc.end].pdf_id
-            if pdf_id is not None:
-                yield arc.end, weight * arc.weight
-            else:
-                if arc.end not in visited:
-                    to_explore += [(arc, arc.weight * weight)
-                                    for arc in self.arcs(arc.end)]
-                    visited.add(arc.end)
-
-    def _find_previous_pdf_ids(self, start_state, init_weight):
-        to_explore = [(arc, init_weight)
-                      for arc in self.arcs(start_state, incoming=True)]
-        visited = set([start_state])
-        while to_explore:
-            arc, weight = to_explore.pop()
-            pdf_id = self._states[arc.start].pdf_id
-            if pdf_id is not None:
-                yield arc.start, weight * arc.weight
-            else:
-                if arc.start not in visited:
-                    to_explore += [(arc, arc.weight * weight)
-                                    for arc in self.arcs(arc.start, incoming=True)]
-                    visited.add(arc.start)
+    def _arc_matrices(self):
+        # Sparse weight matrices of the arcs between the emitting and
+        # the non-emitting states. The parallel arcs are summed.
+        pdf_ids = [state.pdf_id for state in self._states.values()]
+        state_ids = np.fromiter(self._states.keys(), dtype=np.int64,
+                                count=len(self._states))
+        is_emitting = np.zeros(self._state_count, dtype=bool)
+        is_emitting[state_ids] = [pdf_id is not None for pdf_id in pdf_ids]
+        emitting, non_emitting = state_ids[is_emitting[state_ids]], \
+            state_ids[~is_emitting[state_ids]]
+        idxs = np.zeros(self._state_count, dtype=np.int64)
+        idxs[emitting] = np.arange(len(emitting))
+        idxs[non_emitting] = np.arange(len(non_emitting))
+
+        arc_ids = np.fromiter(self._arc_ids(), dtype=np.int64)
+        starts = np.array(self._arc_starts, dtype=np.int64)[arc_ids]
+        ends = np.array(self._arc_ends, dtype=np.int64)[arc_ids]
+        weights = np.array(self._arc_weights, dtype=np.float64)[arc_ids]
+        start_emitting, end_emitting = is_emitting[starts], is_emitting[ends]
+
+        def matrix(start_type, end_type):
+            mask = (start_emitting == start_type) & (end_emitting == end_type)
+            shape = (len(emitting) if start_type else len(non_emitting),
+                     len(emitting) if end_type else len(non_emitting))
+            return scipy.sparse.csr_matrix(
+                (weights[mask], (idxs[starts[mask]], idxs[ends[mask]])),
+                shape=shape
+            )
+
+        matrices = {
+            (start_type, end_type): matrix(start_type, end_type)
+            for start_type in [True, False] for end_type in [True, False]
+        }
+        pdf_id_mapping = [pdf_id for pdf_id in pdf_ids if pdf_id is not None]
+        return matrices, is_emitting, idxs, pdf_id_mapping
 
     def compile(self):
-        '''Compile the graph.'''
-        # Total number of emitting states.
-        tot_n_states = 0
-        pdf_id_mapping = []
-        state2pdf_id = {}
-        for state_id, state in self._states.items():
-            if state.pdf_id is not None:
-                state2pdf_id[state_id] = tot_n_states
-                pdf_id_mapping.append(state.pdf_id)
-                tot_n_states += 1
-
-        init_probs = torch.zeros(tot_n_states)
-        final_probs = torch.zeros(tot_n_states)
-        trans_probs = torch.zeros(tot_n_states, tot_n_states)
+        '''Compile the graph.
 
-        # Init probs.
-        for state_id, weight in self._find_next_pdf_ids(self.start_state, 1.0):
-            init_probs[state2pdf_id[state_id]] += weight
-        init_probs /= init_probs.sum()
+        The non-emitting states are removed: the weight of the
+        transition between two emitting states is the sum of the
+        weights of all the paths joining them through non-emitting
+        states only. These sums are obtained at once from the closure
+        of the sub-graph of non-emitting states.
+
+        Returns:
+            :any:`CompiledGraph`
+        '''
+        matrices, is_emitting, idxs, pdf_id_mapping = self._arc_matrices()
+        emit2emit, emit2eps = matrices[(True, True)], matrices[(True, False)]
+        eps2emit, eps2eps = matrices[(False, True)], matrices[(False, False)]
+
+        # Paths from the non-emitting states to the emitting states.
+        eps_closure = _closure(eps2eps, eps2emit)
+        trans_probs = (emit2emit + emit2eps @ eps_closure).tocsr()
 
         # Init probs.
-        for state_id, weight in self._find_previous_pdf_ids(self.end_state, 1.0):
-            final_probs[state2pdf_id[state_id]] += weight
-        final_probs /= final_probs.sum()
+        if is_emitting[self.start_state]:
+            init_probs = trans_probs[idxs[self.start_state]]
+        else:
+            init_probs = eps_closure[idxs[self.start_state]]
+        init_probs = init_probs.toarray().ravel()
 
-        # Transprobs
-        for arc in self.arcs():
-            pdf_id1 = self._states[arc.start].pdf_id
-            pdf_id2 = self._states[arc.end].pdf_id
-            weight = arc.weight
-
-            # These connections are handled by the init_probs.
-            if pdf_id1 is None:
-                continue
-
-            # We need to follow the path until the next valid pdf_id
-            pdf_id1 = state2pdf_id[arc.start]
-            if pdf_id2 is None:
-                for state_id, weight in self._find_next_pdf_ids(arc.end, weight):
-                    trans_probs[pdf_id1, state2pdf_id[state_id]] += weight
-            else:
-                trans_probs[pdf_id1, state2pdf_id[arc.end]] += weight
+        # Final probs.
+        if is_emitting[self.end_state]:
+            final_probs = trans_probs[:, idxs[self.end_state]]
+        else:
+            end_state = scipy.sparse.csr_matrix(
+                ([1.], ([idxs[self.end_state]], [0])),
+                shape=(eps2eps.shape[0], 1)
+            )
+            final_probs = emit2eps @ _closure(eps2eps, end_state)
+        final_probs = final_probs.toarray().ravel()
+
+        trans_probs = trans_probs.tocoo()
+        trans_probs.sum_duplicates()
+        arcs = (trans_probs.row, trans_probs.col, trans_probs.data)
+        cgraph = _make_compiled_graph(init_probs / init_probs.sum(),
+                                      final_probs / final_probs.sum(),
+                                      arcs, pdf_id_mapping)
+
+        # The weights before normalization are kept to assemble the
+        # linear graphs of units (see CompiledGraph.from_sequence).
+        cgraph._unit_block = _UnitBlock(init_probs, final_probs, arcs,
+                                        pdf_id_mapping)
+        return cgraph
+
+
+class _UnitBlock:
+    # Arrays of the graph of a unit used to assemble linear graphs
+    # (see CompiledGraph.from_sequence): the arcs between the emitting
+    # states and the initial/final weights before normalization.
+
+    @classmethod
+    def get(cls, graph):
+        # The blocks are cached in the (immutable) compiled graphs as
+        # the same units are used for all the utterances.
+        block = getattr(graph, '_unit_block', None)
+        if block is None:
+            block = cls.from_compiled_graph(graph)
+            graph._unit_block = block
+        return block
+
+    @classmethod
+    def from_compiled_graph(cls, graph):
+        # Compiled graph not created by "Graph.compile" (e.g. loaded
+        # from an archive): the weights before normalization are lost
+        # and the exit weight of a final state is approximated by the
+        # probability mass missing from its row of the transition
+        # matrix.
+        trans_probs = graph.trans_probs
+        if not trans_probs.is_sparse:
+            trans_probs = trans_probs.to_sparse()
+        trans_probs = trans_probs.coalesce().cpu()
+        rows, cols = trans_probs.indices().numpy()
+        weights = trans_probs.values().double().numpy()
+        n_states = graph.n_states
+        final_probs = graph.final_probs.cpu().double().numpy()
+        row_sums = np.bincount(rows, weights=weights, minlength=n_states)
+        exit_weights = np.where(final_probs > 0.,
+                                np.clip(1. - row_sums, 0., None), 0.)
+        pdf_id_mapping = graph.pdf_id_mapping
+        if pdf_id_mapping is None:
+            pdf_id_mapping = range(n_states)
+        return cls(graph.init_probs.cpu().double().numpy(), final_probs,
+                   (rows, cols, weights), pdf_id_mapping, exit_weights)
 
-        # Normalize the transition matrix withouth changing its diagonal.
-        for dim in range(len(trans_probs)):
-            diag = trans_probs[dim, dim].clone()
-            off_diag  = trans_probs[dim, :].sum() - diag
-            if diag > 0. and off_diag > 0:
-                norms = off_diag
-                trans_probs[dim, :] /= norms / (1 - diag)
-                trans_probs[dim, dim] =  diag
+    def __init__(self, init_probs, final_probs, arcs, pdf_id_mapping,
+                 exit_weights=None):
+        self.rows, self.cols, self.weights = arcs
+        self.n_states = len(init_probs)
+        self.init_states = np.nonzero(init_probs)[0]
+        self.init_probs = init_probs[self.init_states]
+        self.final_probs = final_probs / final_probs.sum()
+        if exit_weights is None:
+            exit_weights = final_probs
+        self.exit_states = np.nonzero(exit_weights)[0]
+        self.exit_probs = exit_weights[self.exit_states]
+        self.pdf_id_mapping = list(pdf_id_mapping)
 
-        return CompiledGraph(init_probs, final_probs, trans_probs, pdf_id_mapping)
+
+def _make_compiled_graph(init_probs, final_probs, arcs, pdf_id_mapping):
+    # Create a CompiledGraph from numpy arrays. The arcs (rows, columns,
+    # weights) of the transition matrix must be unique. The rows of the
+    # transition matrix are normalized without changing its diagonal.
+    rows, cols, weights = arcs
+    n_states = len(init_probs)
+    is_diag = rows == cols
+    diag = np.zeros(n_states)
+    diag[rows[is_diag]] = weights[is_diag]
+    off_diag = np.bincount(rows, weights=weights, minlength=n_states) - diag
+    mask = (diag > 0.) & (off_diag > 0.)
+    scales = np.ones(n_states)
+    scales[mask] = (1 - diag[mask]) / off_diag[mask]
+    weights = np.where(is_diag, weights, weights * scales[rows])
+    nonzero = weights != 0.
+
+    dtype = torch.get_default_dtype()
+    indices = np.vstack([rows[nonzero], cols[nonzero]])
+    trans_probs = torch.sparse_coo_tensor(
+        torch.from_numpy(indices).long(),
+        torch.from_numpy(weights[nonzero]).type(dtype),
+        (n_states, n_states)
+    )
+    return CompiledGraph(torch.from_numpy(init_probs).type(dtype),
+                         torch.from_numpy(final_probs).type(dtype),
+                         trans_probs, pdf_id_mapping)
+
+
+def _closure(adjacency, rhs):
+    '''Compute (I - A)^-1 @ rhs, i.e. the weighted sum over all the
+    paths of the graph with adjacency matrix A.
+
+    When the graph is acyclic, A is nilpotent and the sum of the powers
+    of A is computed until no path is left. Otherwise, the linear
+    system is solved.
+
+    Args:
+        adjacency (``scipy.sparse.csr_matrix[n, n]``): Weighted
+            adjacency matrix.
+        rhs (``scipy.sparse.csr_matrix[n, m]``): Right hand side.
+
+    Returns:
+        ``scipy.sparse.csr_matrix[n, m]``
+    '''
+    n_components, _ = scipy.sparse.csgraph.connected_components(
+        adjacency, directed=True, connection='strong')
+    if n_components == adjacency.shape[0] and not adjacency.diagonal().any():
+        result = term = rhs
+        while term.nnz > 0:
+            term = adjacency @ term
+            result = result + term
+        return result.tocsr()
+    system = scipy.sparse.identity(adjacency.shape[0], format='csc') \
+        - adjacency.tocsc()
+    solution = scipy.sparse.linalg.spsolve(system, rhs.tocsc())
+    return scipy.sparse.csr_matrix(solution.reshape(rhs.shape))
+
+
+# The transition matrix of a compiled graph is stored as a sparse
+# tensor when the graph has at least "_SPARSE_MIN_STATES" states and
+# when the fraction of non-zero transitions is at most
+# "_SPARSE_MAX_DENSITY".
+_SPARSE_MIN_STATES = 200
+_SPARSE_MAX_DENSITY = .1
+
+
+def _use_sparse(trans_probs):
+    n_states = trans_probs.shape[0]
+    if trans_probs.is_sparse:
+        nnz = trans_probs.coalesce()._nnz()
+    else:
+        nnz = int((trans_probs != 0).sum())
+    return n_states >= _SPARSE_MIN_STATES and \
+        nnz <= _SPARSE_MAX_DENSITY * n_states ** 2
+
+
+def _backtrack_dtype(n_states):
+    # Smallest integer type able to store the back-pointers.
+    if n_states <= torch.iinfo(torch.int16).max + 1:
+        return torch.int16
+    if n_states <= torch.iinfo(torch.int32).max + 1:
+        return torch.int32
+    return torch.long
+
+
+def _traceback(backtrack, last_state):
+    '''Follow the back-pointers of the Viterbi algorithm.
+
+    The back-pointers are read from a single contiguous array (in
+    their compact integer type) and the offset of each frame in this
+    array is computed at once. Only the pointer chase itself is
+    sequential (the state of a frame is needed to read the
+    back-pointer of the previous frame): it reads and writes plain
+    integers through memory views and the path is written in a
+    pre-allocated array in a single pass starting from the last
+    frame.
+
+    Note:
+        The traceback is not vectorized. Gathering the back-pointers
+        with array operations requires composing the back-pointer maps
+        of the frames (e.g. by blocks of frames), that is reading all
+        the ``n_frames x n_states`` back-pointers instead of one per
+        frame: on 100000 frames x 144 states, it is about 4 times
+        slower than this loop.
+
+    Args:
+        backtrack (``numpy.ndarray[n_frames, n_states]``): Back-pointers.
+        last_state (int): Best state of the last frame.
+
+    Returns:
+        ``numpy.ndarray[n_frames]``
+    '''
+    n_frames, n_states = backtrack.shape
+    flat_backtrack = memoryview(np.ascontiguousarray(backtrack).reshape(-1))
+    offsets = memoryview(np.arange(n_frames, dtype=np.int64) * n_states)
+    path = np.empty(n_frames, dtype=np.int64)
+    path_view = memoryview(path)
+    path_view[-1] = state = int(last_state)
+    for i in range(n_frames - 1, 0, -1):
+        state = flat_backtrack[offsets[i] + state]
+        path_view[i - 1] = state
+    return path
+
+
+def _unpack_batch(llhs, lengths):
+    # Padded tensor, lengths and mask of the valid frames of a batch
+    # of utterances.
+    if isinstance(llhs, PackedSequence):
+        llhs, lengths = pad_packed_sequence(llhs, batch_first=True)
+    lengths = torch.as_tensor(lengths, device=llhs.device)
+    frames = torch.arange(llhs.shape[1], device=llhs.device)
+    mask = frames[None, :] < lengths[:, None]
+    return llhs, lengths, mask
 
 
 class CompiledGraph:
-    '''Inference graph for a HMM model.'''
+    '''Inference graph for a HMM model.
 
-    def __init__(self, init_probs, final_probs, trans_probs, pdf_id_mapping=None):
+    The transition matrix is either stored as a dense N x N tensor or,
+    for large graphs with few arcs per state, as a sparse (COO) tensor.
+    In the latter case, the forward, backward and Viterbi recursions
+    cost O(E) per frame instead of O(N^2).
+
+    '''
+
+    def __init__(self, init_probs, final_probs, trans_probs,
+                 pdf_id_mapping=None, sparse=None):
         '''
         Args:
             init_probs (``torch.Tensor``): Initial probabilities.
             final_probs (``torch.Tensor``): Final probabilities.
-            trans_probs (``torch.Tensor``): Transition probabilities.
+            trans_probs (``torch.Tensor``): Transition probabilities
+                (dense or sparse tensor).
             pdf_id_mapping (list): Mapping of the pdf ids (optional)
+            sparse (boolean): Store the transition matrix as a sparse
+                tensor. If not provided, the representation is chosen
+                from the number of states and the density of the
+                matrix.
         '''
+        if sparse is None:
+            sparse = _use_sparse(trans_probs)
+        if sparse:
+            if not trans_probs.is_sparse:
+                trans_probs = trans_probs.to_sparse()
+            trans_probs = trans_probs.coalesce()
+        elif trans_probs.is_sparse:
+            trans_probs = trans_probs.to_dense()
         self.init_probs = init_probs
         self.final_probs = final_probs
         self.trans_probs = trans_probs
         self.pdf_id_mapping = pdf_id_mapping
 
+    @classmethod
+    def from_sequence(cls, seq, unit_graphs):
+        '''Create the linear graph of a sequence of units (alignment
+        graph) from the compiled graphs of the units.
+
+        The transitions of the units are the diagonal blocks of the
+        transition matrix and the weight of the arcs from a state of
+        a unit to the unit's final state is distributed over the
+        initial states of the next unit. The weights before
+        normalization are used so that, for the units compiled with
+        :any:`Graph.compile`, this is equivalent to (but much faster
+        than) replacing the states of a linear :any:`Graph` with the
+        units' graphs and compiling it. For other compiled graphs
+        (e.g. loaded from an archive), the exit weight of a final
+        state is approximated by the probability mass missing from
+        its row of the transition matrix.
+
+        Args:
+            seq (list): Sequence of unit ids.
+            unit_graphs (dict or list): Mapping unit id ->
+                :any:`CompiledGraph`.
+
+        Returns:
+            :any:`CompiledGraph`
+        '''
+        if len(seq) == 0:
+            raise ValueError('Cannot create the graph of an empty sequence')
+
+        blocks = [_UnitBlock.get(unit_graphs[unit]) for unit in seq]
+        sizes = np.array([block.n_states for block in blocks])
+        offsets = np.cumsum(sizes) - sizes
+        n_states = int(sizes.sum())
+
+        # Transitions within the units (diagonal blocks).
+        n_arcs = np.array([len(block.rows) for block in blocks])
+        arc_offsets = np.repeat(offsets, n_arcs)
+        rows = np.concatenate([block.rows for block in blocks]) + arc_offsets
+        cols = np.concatenate([block.cols for block in blocks]) + arc_offsets
+        weights = np.concatenate([block.weights for block in blocks])
+
+        # Transitions from the exit states of each unit to the initial
+        # states of the next unit: all the pairs (exit state, initial
+        # state) for each of the n_units - 1 boundaries.
+        exit_states = [block.exit_states + offset
+                       for block, offset in zip(blocks[:-1], offsets[:-1])]
+        init_states = [block.init_states + offset
+                       for block, offset in zip(blocks[1:], offsets[1:])]
+        n_exits = np.array([len(states) for states in exit_states], dtype=int)
+        n_inits = np.array([len(states) for states in init_states], dtype=int)
+        n_pairs = n_exits * n_inits
+        boundaries = np.repeat(np.arange(len(n_pairs)), n_pairs)
+        pair_idxs = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs)
+                                                         - n_pairs, n_pairs)
+        exit_idxs = np.repeat(np.cumsum(n_exits) - n_exits, n_pairs) \
+            + pair_idxs // n_inits[boundaries]
+        init_idxs = np.repeat(np.cumsum(n_inits) - n_inits, n_pairs) \
+            + pair_idxs % n_inits[boundaries]
+        if len(blocks) > 1:
+            exit_probs = np.concatenate([block.exit_probs
+                                         for block in blocks[:-1]])
+            init_probs = np.concatenate([block.init_probs
+                                         for block in blocks[1:]])
+            rows = np.concatenate([rows,
+                                   np.concatenate(exit_states)[exit_idxs]])
+            cols = np.concatenate([cols,
+                                   np.concatenate(init_states)[init_idxs]])
+            weights = np.concatenate([weights, exit_probs[exit_idxs]
+                                      * init_probs[init_idxs]])
+
+        init_probs = np.zeros(n_states)
+        init_probs[blocks[0].init_states] = blocks[0].init_probs \
+            / blocks[0].init_probs.sum()
+        final_probs = np.zeros(n_states)
+        final_probs[offsets[-1]:] = blocks[-1].final_probs
+        pdf_id_mapping = [pdf_id for block in blocks
+                          for pdf_id in block.pdf_id_mapping]
+        return _make_compiled_graph(init_probs, final_probs,
+                                    (rows, cols, weights),
+                                    pdf_id_mapping)
+
     @property
     def n_states(self):
         'Total number of states in the graph.'
-        return len(self.trans_probs)
+        return self.trans_probs.shape[0]
+
+    @property
+    def is_sparse(self):
+        'True if the transition matrix is stored as a sparse tensor.'
+        return self.trans_probs.is_sparse
+
+    def _arcs(self):
+        # Start state, end state and weight of the arcs of a sparse
+        # graph.
+        indices = self.trans_probs.indices()
+        return indices[0], indices[1], self.trans_probs.values()
+
+    def _forward_prod(self, vec):
+        # Compute vec @ trans_probs for vec of shape (..., N).
+        if self.is_sparse:
+            src, dest, weights = self._arcs()
+            return torch.zeros_like(vec).index_add_(-1, dest,
+                                                    vec[..., src] * weights)
+        return vec @ self.trans_probs
+
+    def _backward_prod(self, vec):
+        # Compute vec @ trans_probs^T for vec of shape (..., N).
+        if self.is_sparse:
+            src, dest, weights = self._arcs()
+            return torch.zeros_like(vec).index_add_(-1, src,
+                                                    vec[..., dest] * weights)
+        return vec @ self.trans_probs.t()
+
+    def _log_trans_probs(self):
+        if self.is_sparse:
+            return self.trans_probs.values().log()
+        return self.trans_probs.log()
+
+    def _viterbi_step(self, omega, log_trans_probs):
+        # Best previous state and its score for each state given the
+        # scores "omega" of the previous frame.
+        if not self.is_sparse:
+            hypothesis = omega[..., :, None] + log_trans_probs
+            return torch.max(hypothesis, dim=-2)
+
+        src, dest, _ = self._arcs()
+        n_states = self.n_states
+        hypothesis = omega[..., src] + log_trans_probs
+        dest = dest.expand_as(hypothesis)
+        best = torch.full_like(omega, float('-inf'))
+        best.scatter_reduce_(-1, dest, hypothesis, 'amax')
+
+        # Among the arcs reaching the best score, we select the one with
+        # the lowest starting state as done by "argmax" on the dense
+        # matrix.
+        is_best = hypothesis == best.gather(-1, dest)
+        candidates = torch.where(is_best, src.expand_as(hypothesis),
+                                 torch.full_like(dest, n_states))
+        backtrack = torch.full_like(omega, n_states, dtype=torch.long)
+        backtrack.scatter_reduce_(-1, dest, candidates, 'amin')
+        backtrack[backtrack == n_states] = 0
+        return best, backtrack
 
     def _baum_welch_forward(self, lhs, eps=1e-6):
         alphas = torch.zeros_like(lhs)
         consts = torch.zeros(len(lhs), dtype=lhs.dtype, device=lhs.device)
-        trans_mat = self.trans_probs
         res = lhs[0] * self.init_probs
         consts[0] = res.sum()
         alphas[0] = res / consts[0]
         for i in range(1, lhs.shape[0]):
-            res = lhs[i] * (trans_mat.t() @ (alphas[i-1] + eps))
+            res = lhs[i] * self._forward_prod(alphas[i-1] + eps)
             consts[i] = res.sum()
             alphas[i] = res / consts[i]
         return alphas, consts
 
     def _baum_welch_backward(self, lhs, consts, eps=1e-6):
         betas = torch.zeros_like(lhs)
-        trans_mat = self.trans_probs
         betas[-1] = self.final_probs
         for i in reversed(range(lhs.shape[0] - 1)):
-            res = trans_mat @ (lhs[i+1] * (betas[i+1] + eps))
+            res = self._backward_prod(lhs[i+1] * (betas[i+1] + eps))
             betas[i] = res / consts[i+1]
         return betas
 
-    def posteriors(self, llhs, eps=1e-6):
+    def _batch_baum_welch_forward(self, lhs, mask, eps=1e-6):
+        # Once an utterance is finished, its alphas are carried over
+        # unchanged and its scaling constants are set to one.
+        alphas = torch.zeros_like(lhs)
+        consts = torch.ones(lhs.shape[:2], dtype=lhs.dtype, device=lhs.device)
+        res = lhs[:, 0] * self.init_probs
+        consts[:, 0] = res.sum(dim=-1)
+        alphas[:, 0] = res / consts[:, 0, None]
+        for i in range(1, lhs.shape[1]):
+            res = lhs[:, i] * self._forward_prod(alphas[:, i-1] + eps)
+            consts[:, i] = torch.where(mask[:, i], res.sum(dim=-1),
+                                       consts[:, i])
+            alphas[:, i] = torch.where(mask[:, i, None],
+                                       res / consts[:, i, None],
+                                       alphas[:, i-1])
+        return alphas, consts
+
+    def _batch_baum_welch_backward(self, lhs, consts, lengths, eps=1e-6):
+        # The betas of the last frame (and of the padding frames) of
+        # each utterance are set to the final probabilities.
+        betas = torch.zeros_like(lhs)
+        final_probs = self.final_probs.expand_as(betas[:, 0])
+        betas[:, -1] = final_probs
+        for i in reversed(range(lhs.shape[1] - 1)):
+            res = self._backward_prod(lhs[:, i+1] * (betas[:, i+1] + eps))
+            betas[:, i] = torch.where((i + 1 < lengths)[:, None],
+                                      res / consts[:, i+1, None],
+                                      final_probs)
+        return betas
+
+    def posteriors(self, llhs, eps=1e-6, lengths=None, checkpoint=False):
+        '''Posterior probabilities of the states (forward-backward
+        algorithm).
+
+        Args:
+            llhs (``torch.Tensor[n_frames, n_states]``): Per-frame
+                log-likelihood of each state. For a batch of
+                utterances, either a padded
+                ``torch.Tensor[batch_size, max_frames, n_states]`` with
+                the `lengths` argument or a ``PackedSequence``.
+            eps (float): Smoothing constant.
+            lengths (``torch.LongTensor[batch_size]``): Number of
+                frames of each utterance of the batch.
+            checkpoint (boolean or int): If set, the forward variables
+                are stored only every `checkpoint` frames (every
+                sqrt(n_frames) frames if True) and recomputed segment
+                by segment during the backward pass. This reduces the
+                memory to the posteriors and O(sqrt(n_frames) x
+                n_states) buffers for the cost of a second forward
+                pass. Not available for batches (ValueError).
+
+        Returns:
+            ``torch.Tensor[n_frames, n_states]`` or, for a batch,
+            ``torch.Tensor[batch_size, max_frames, n_states]`` with
+            zero posteriors on the padding frames.
+        '''
+        if isinstance(llhs, PackedSequence) or lengths is not None:
+            if checkpoint:
+                raise ValueError('checkpointing is not available for '
+                                 'batches')
+            return self._batch_posteriors(llhs, eps, lengths)
+        if checkpoint:
+            if checkpoint is True:
+                checkpoint = int(math.ceil(math.sqrt(len(llhs))))
+            return self._checkpointed_posteriors(llhs, eps, checkpoint)
+
         # Scale the log-likelihoods to avoid overflow.
         max_val = llhs.max()
         lhs = (llhs - max_val).exp() + eps
@@ -321,39 +819,294 @@ class CompiledGraph:
 
         return posts
 
-    def best_path(self, llhs):
-        init_log_prob = self.init_probs.log()
-        backtrack = torch.zeros_like(llhs, dtype=torch.long, device=llhs.device)
-        omega = llhs[0] + init_log_prob
-        log_trans_mat = self.trans_probs.log()
+    def _forward_segment(self, lhs, alpha, eps):
+        # Forward variables and scaling constants of a segment given
+        # the forward variables of the frame preceding the segment
+        # (None for the first segment).
+        alphas = torch.zeros_like(lhs)
+        consts = torch.zeros(len(lhs), dtype=lhs.dtype, device=lhs.device)
+        for i in range(lhs.shape[0]):
+            if alpha is None:
+                res = lhs[i] * self.init_probs
+            else:
+                res = lhs[i] * self._forward_prod(alpha + eps)
+            consts[i] = res.sum()
+            alpha = alphas[i] = res / consts[i]
+        return alphas, consts
+
+    def _checkpointed_posteriors(self, llhs, eps, step):
+        n_frames = llhs.shape[0]
+        max_val = llhs.max()
+        segments = [(start, min(start + step, n_frames))
+                    for start in range(0, n_frames, step)]
+
+        # Forward pass: we keep only the forward variables of the last
+        # frame of each segment.
+        consts = torch.zeros(n_frames, dtype=llhs.dtype, device=llhs.device)
+        checkpoints = [None]
+        for start, end in segments:
+            lhs = (llhs[start:end] - max_val).exp() + eps
+            alphas, consts[start:end] = self._forward_segment(
+                lhs, checkpoints[-1], eps)
+            checkpoints.append(alphas[-1])
+
+        # Backward pass: the forward variables of each segment are
+        # recomputed from the previous checkpoint.
+        posts = torch.zeros_like(llhs)
+        beta = self.final_probs
+        for (start, end), alpha in reversed(list(zip(segments, checkpoints))):
+            lhs = (llhs[start:end] - max_val).exp() + eps
+            alphas, _ = self._forward_segment(lhs, alpha, eps)
+            for i in reversed(range(end - start)):
+                post = (alphas[i] + eps) * (beta + eps)
+                posts[start + i] = post / post.sum()
+                beta = self._backward_prod(lhs[i] * (beta + eps))
+                beta = beta / (consts[start + i] + eps)
+
+        return posts
+
+    def _batch_posteriors(self, llhs, eps, lengths):
+        llhs, lengths, mask = _unpack_batch(llhs, lengths)
+
+        # Scale the log-likelihoods of each utterance to avoid overflow.
+        max_vals = torch.where(mask[:, :, None], llhs,
+                               torch.full_like(llhs, float('-inf')))
+        max_vals = max_vals.view(len(llhs), -1).max(dim=-1)[0]
+        lhs = (llhs - max_vals[:, None, None]).exp() + eps
+        lhs = torch.where(mask[:, :, None], lhs, torch.ones_like(lhs))
+
+        # Scaled forward-backward algorithm.
+        alphas, consts = self._batch_baum_welch_forward(lhs, mask, eps)
+        betas = self._batch_baum_welch_backward(lhs, consts + eps, lengths,
+                                                eps)
+        posts = (alphas + eps) * (betas + eps)
+        norm = posts.sum(dim=-1)
+        posts /= norm[:, :, None]
+
+        return posts * mask[:, :, None].type(posts.dtype)
+
+    def best_path(self, llhs, lengths=None):
+        '''Most likely sequence of states (Viterbi algorithm).
+
+        Args:
+            llhs (``torch.Tensor[n_frames, n_states]``): Per-frame
+                log-likelihood of each state. For a batch of
+                utterances, either a padded
+                ``torch.Tensor[batch_size, max_frames, n_states]`` with
+                the `lengths` argument or a ``PackedSequence``.
+            lengths (``torch.LongTensor[batch_size]``): Number of
+                frames of each utterance of the batch.
+
+        Returns:
+            ``torch.LongTensor[n_frames]`` or, for a batch, a list of
+            ``torch.LongTensor`` (one per utterance).
+        '''
+        if isinstance(llhs, PackedSequence) or lengths is not None:
+            return self._batch_best_path(llhs, lengths)
+
+        backtrack = torch.zeros(llhs.shape, device=llhs.device,
+                                dtype=_backtrack_dtype(self.n_states))
+        omega = llhs[0] + self.init_probs.log()
+        log_trans_probs = self._log_trans_probs()
 
         for i in range(1, llhs.shape[0]):
-            hypothesis = omega + log_trans_mat.t()
-            backtrack[i] = torch.argmax(hypothesis, dim=1)
-            omega = llhs[i] + hypothesis[range(len(log_trans_mat)), backtrack[i]]
+            hypothesis, backtrack[i] = self._viterbi_step(omega,
+                                                          log_trans_probs)
+            omega = llhs[i] + hypothesis
+
+        last_state = int(torch.argmax(omega + self.final_probs.log()))
+        path = _traceback(backtrack.cpu().numpy(), last_state)
+        return torch.from_numpy(path)
 
-        path = [torch.argmax(omega + self.final_probs.log())]
-        for i in reversed(range(1, len(llhs))):
-            path.insert(0, backtrack[i, path[0]])
-        return torch.LongTensor(path)
+    def _batch_best_path(self, llhs, lengths):
+        llhs, lengths, mask = _unpack_batch(llhs, lengths)
+        backtrack = torch.zeros(llhs.shape, device=llhs.device,
+                                dtype=_backtrack_dtype(self.n_states))
+        omega = llhs[:, 0] + self.init_probs.log()
+        log_trans_probs = self._log_trans_probs()
+
+        # The scores of the finished utterances are left unchanged.
+        for i in range(1, llhs.shape[1]):
+            hypothesis, backtrack[:, i] = self._viterbi_step(omega,
+                                                             log_trans_probs)
+            omega = torch.where(mask[:, i, None], llhs[:, i] + hypothesis,
+                                omega)
+
+        last_states = torch.argmax(omega + self.final_probs.log(), dim=-1)
+        backtrack = backtrack.cpu().numpy()
+        return [
+            torch.from_numpy(_traceback(backtrack[i, :length], int(last_state)))
+            for i, (length, last_state) in enumerate(zip(lengths.tolist(),
+                                                          last_states))
+        ]
 
     def float(self):
-            return CompiledGraph(self.init_probs.float(),
-                                 self.final_probs.float(),
-                                 self.trans_probs.float(),
-                                 self.pdf_id_mapping)
+        return CompiledGraph(self.init_probs.float(),
+                             self.final_probs.float(),
+                             self.trans_probs.float(),
+                             self.pdf_id_mapping,
+                             sparse=self.is_sparse)
 
     def double(self):
         return CompiledGraph(self.init_probs.double(),
-                                 self.final_probs.double(),
-                                 self.trans_probs.double(),
-                                 self.pdf_id_mapping)
+                             self.final_probs.double(),
+                             self.trans_probs.double(),
+                             self.pdf_id_mapping,
+                             sparse=self.is_sparse)
 
     def to(self, device):
         return CompiledGraph(self.init_probs.to(device),
-                                 self.final_probs.to(device),
-                                 self.trans_probs.to(device),
-                                 self.pdf_id_mapping)
+                             self.final_probs.to(device),
+                             self.trans_probs.to(device),
+                             self.pdf_id_mapping,
+                             sparse=self.is_sparse)
+
+
+# Layout of the archive of compiled graphs: magic string, length of the
+# (JSON) header, header and the arrays of all the graphs concatenated.
+_ARCHIVE_MAGIC = b'BEERCGA1'
+_ARCHIVE_ALIGNMENT = 64
+
+
+def save_compiled_graphs(path, graphs):
+    '''Store compiled graphs in a single file.
+
+    The graphs are stored as sparse arrays (concatenated for all the
+    graphs) along with an index of the offsets of each graph. The file
+    can then be memory-mapped with :any:`CompiledGraphArchive` to load
+    any graph without reading (or unpickling) the whole file.
+
+    Args:
+        path (str): Path of the output file.
+        graphs (dict or list): Mapping key -> :any:`CompiledGraph` or
+            sequence of (key, :any:`CompiledGraph`) pairs.
+    '''
+    if isinstance(graphs, dict):
+        graphs = graphs.items()
+    keys, is_sparse, has_pdf_ids = [], [], []
+    init_probs, final_probs, pdf_ids, indices, weights = [], [], [], [], []
+    state_offsets, arc_offsets = [0], [0]
+    dtype = None
+    for key, graph in graphs:
+        trans_probs = graph.trans_probs
+        if not trans_probs.is_sparse:
+            trans_probs = trans_probs.to_sparse()
+        trans_probs = trans_probs.coalesce().cpu()
+        if dtype is None:
+            dtype = graph.init_probs.cpu().numpy().dtype
+        keys.append(key)
+        is_sparse.append(graph.is_sparse)
+        has_pdf_ids.append(graph.pdf_id_mapping is not None)
+        init_probs.append(graph.init_probs.cpu().numpy().astype(dtype))
+        final_probs.append(graph.final_probs.cpu().numpy().astype(dtype))
+        if graph.pdf_id_mapping is not None:
+            pdf_ids.append(np.asarray(graph.pdf_id_mapping, dtype=np.int64))
+        else:
+            pdf_ids.append(np.arange(graph.n_states, dtype=np.int64))
+        indices.append(trans_probs.indices().numpy().astype(np.int32).ravel())
+        weights.append(trans_probs.values().numpy().astype(dtype))
+        state_offsets.append(state_offsets[-1] + graph.n_states)
+        arc_offsets.append(arc_offsets[-1] + len(weights[-1]))
+    if dtype is None:
+        dtype = torch.zeros(0).numpy().dtype
+
+    def concat(arrays, array_dtype):
+        if not arrays:
+            return np.zeros(0, dtype=array_dtype)
+        return np.concatenate(arrays).astype(array_dtype, copy=False)
+
+    arrays = OrderedDict([
+        ('state_offsets', np.asarray(state_offsets, dtype=np.int64)),
+        ('arc_offsets', np.asarray(arc_offsets, dtype=np.int64)),
+        ('is_sparse', np.asarray(is_sparse, dtype=np.uint8)),
+        ('has_pdf_ids', np.asarray(has_pdf_ids, dtype=np.uint8)),
+        ('init_probs', concat(init_probs, dtype)),
+        ('final_probs', concat(final_probs, dtype)),
+        ('pdf_ids', concat(pdf_ids, np.int64)),
+        ('indices', concat(indices, np.int32)),
+        ('weights', concat(weights, dtype)),
+    ])
+
+    # Offsets of the arrays relative to the start of the data section.
+    layout, offset = OrderedDict(), 0
+    for name, array in arrays.items():
+        layout[name] = (offset, len(array), array.dtype.str)
+        offset += -(-array.nbytes // _ARCHIVE_ALIGNMENT) * _ARCHIVE_ALIGNMENT
+    header = json.dumps({'keys': keys, 'arrays': layout}).encode('utf-8')
+    data_start = len(_ARCHIVE_MAGIC) + 8 + len(header)
+    data_start = -(-data_start // _ARCHIVE_ALIGNMENT) * _ARCHIVE_ALIGNMENT
+    header = header.ljust(data_start - len(_ARCHIVE_MAGIC) - 8)
+
+    with open(path, 'wb') as fid:
+        fid.write(_ARCHIVE_MAGIC)
+        fid.write(np.uint64(len(header)).tobytes())
+        fid.write(header)
+        for name, array in arrays.items():
+            fid.seek(data_start + layout[name][0])
+            fid.write(array.tobytes())
+        fid.truncate(data_start + offset)
+
+
+class CompiledGraphArchive(Mapping):
+    '''Read-only mapping key -> :any:`CompiledGraph` stored in a file
+    created by :any:`save_compiled_graphs`.
+
+    The file is memory-mapped: loading a graph only reads the pages of
+    this graph and the probabilities share the memory of the mapping
+    (the pages are copied only if the tensors are modified).
+
+    '''
+
+    def __init__(self, path):
+        '''
+        Args:
+            path (str): Path of the archive.
+        '''
+        with open(path, 'rb') as fid:
+            magic = fid.read(len(_ARCHIVE_MAGIC))
+            if magic != _ARCHIVE_MAGIC:
+                raise ValueError('{} is not an archive of compiled graphs'
+                                 .format(path))
+            header_len = int(np.frombuffer(fid.read(8), dtype=np.uint64)[0])
+            header = json.loads(fid.read(header_len).decode('utf-8'))
+        data_start = len(_ARCHIVE_MAGIC) + 8 + header_len
+        data = np.memmap(path, dtype=np.uint8, mode='c', offset=data_start)
+        self._arrays = {}
+        for name, (offset, length, dtype) in header['arrays'].items():
+            dtype = np.dtype(dtype)
+            self._arrays[name] = \
+                data[offset:offset + length * dtype.itemsize].view(dtype)
+        self._keys = header['keys']
+        self._index = {key: i for i, key in enumerate(self._keys)}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __getitem__(self, key):
+        idx = self._index[key]
+        arrays = self._arrays
+        start, end = arrays['state_offsets'][idx:idx + 2]
+        arc_start, arc_end = arrays['arc_offsets'][idx:idx + 2]
+        n_states = int(end - start)
+        indices = arrays['indices'][2 * arc_start:2 * arc_end]
+        trans_probs = torch.sparse_coo_tensor(
+            torch.from_numpy(indices).view(2, -1).long(),
+            torch.from_numpy(arrays['weights'][arc_start:arc_end]),
+            (n_states, n_states)
+        )._coalesced_(True)
+        pdf_id_mapping = None
+        if arrays['has_pdf_ids'][idx]:
+            pdf_id_mapping = arrays['pdf_ids'][start:end].tolist()
+        return CompiledGraph(torch.from_numpy(arrays['init_probs'][start:end]),
+                             torch.from_numpy(arrays['final_probs'][start:end]),
+                             trans_probs, pdf_id_mapping,
+                             sparse=bool(arrays['is_sparse'][idx]))
 
 
 __all__ = ['Graph']
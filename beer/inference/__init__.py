@@ -1,2 +1,4 @@
 from .objectives import *
-from .optimizers import *
\ No newline at end of file
+from .optimizers import *
+from .parallel import *
+from .distributed import *
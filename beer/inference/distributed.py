@@ -0,0 +1,169 @@
+'''Distributed stochastic Variational Bayes training (several
+processes or nodes) with ``torch.distributed``.
+
+Each process evaluates the ELBO on its own shard of the data. Before
+each update, the accumulated statistics of the Bayesian parameters
+and the gradients of the standard pytorch parameters are averaged
+over the processes, so that all the processes apply the same update
+and keep the same model.
+
+'''
+
+import torch
+import torch.distributed as dist
+from .optimizers import BayesianModelOptimizer
+
+
+def shard(sequence, rank=None, world_size=None):
+    '''Elements of a sequence (list of batches, utterances, ...)
+    processed by one process.
+
+    The elements are distributed in a round-robin fashion. The last
+    ``len(sequence) % world_size`` elements are dropped so that all
+    the processes run the same number of training steps. If the
+    sequence is shuffled, all the processes should use the same
+    random seed.
+
+    Args:
+        sequence (sequence): Elements to distribute.
+        rank (int): Rank of the process. If None, use the rank of the
+            process in the default process group.
+        world_size (int): Number of processes. If None, use the size
+            of the default process group.
+
+    Returns:
+        sequence
+    '''
+    if rank is None:
+        rank = dist.get_rank()
+    if world_size is None:
+        world_size = dist.get_world_size()
+    end = world_size * (len(sequence) // world_size)
+    return sequence[rank:end:world_size]
+
+
+def _collective(tensors, func):
+    '''Apply a collective operation on a list of tensors with a single
+    call per data type: the tensors are flattened into one contiguous
+    buffer. Returns the list of the resulting tensors (views of the
+    buffers) in the same order as `tensors`.'''
+    by_dtype = {}
+    for idx, tensor in enumerate(tensors):
+        by_dtype.setdefault(tensor.dtype, []).append(idx)
+    retval = [None] * len(tensors)
+    for idxs in by_dtype.values():
+        buffer = torch.cat([tensors[idx].reshape(-1) for idx in idxs])
+        func(buffer)
+        offset = 0
+        for idx in idxs:
+            numel = tensors[idx].numel()
+            retval[idx] = buffer[offset:offset + numel].view_as(tensors[idx])
+            offset += numel
+    return retval
+
+
+class DistributedBayesianModelOptimizer(BayesianModelOptimizer):
+    '''Optimizer for the distributed training of :any:`BayesianModel`
+    subclasses.
+
+    The optimizer has to be created by all the processes after the
+    initialization of the process group: the parameters of the
+    process of rank 0 are copied to the other processes. At each
+    :any:`step`, the statistics of the Bayesian parameters and the
+    gradients of the standard pytorch parameters (of the `std_optim`
+    optimizer) are averaged over the processes with a single
+    all-reduce per data type before the update.
+
+    Note:
+        The average of the statistics is the statistics of the whole
+        minibatch (union of the shards) when the processes have
+        shards of the same size.
+
+    Example:
+        >>> torch.distributed.init_process_group('gloo')
+        >>> optim = beer.DistributedBayesianModelOptimizer(
+        ...     model.mean_field_factorization(), lrate=1.)
+        >>> for batch in beer.shard(batches):
+        ...     optim.init_step()
+        ...     elbo = beer.evidence_lower_bound(model, batch,
+        ...                                      datasize=tot_counts)
+        ...     elbo.backward()
+        ...     optim.step()
+
+    '''
+
+    def __init__(self, groups, lrate=1., std_optim=None, process_group=None):
+        '''
+        Args:
+            groups (list): List of groups of ``BayesianParameters``.
+            lrate (float): learning rate.
+            std_optim (``torch.optim.Optimizer``): Optimizer for
+                non-Bayesian parameters (i.e. standard ``pytorch``
+                parameters)
+            process_group (``torch.distributed.ProcessGroup``): Group
+                of processes. If None, use the default process group.
+        '''
+        super().__init__(groups, lrate, std_optim)
+        self._process_group = process_group
+        self.broadcast_parameters()
+
+    @property
+    def world_size(self):
+        'Number of processes.'
+        return dist.get_world_size(self._process_group)
+
+    def _std_parameters(self):
+        if self._std_optim is None:
+            return []
+        return [param for group in self._std_optim.param_groups
+                for param in group['params']]
+
+    def broadcast_parameters(self, src=0):
+        '''Copy the parameters (posteriors of the Bayesian parameters
+        and standard pytorch parameters) of one process to all the
+        other processes.
+
+        Args:
+            src (int): Rank of the process to copy from.
+        '''
+        std_params = self._std_parameters()
+        tensors = [param.posterior.natural_parameters
+                   for param in self._parameters]
+        tensors += [param.data for param in std_params]
+        values = _collective(tensors, lambda buffer: dist.broadcast(
+            buffer, src, group=self._process_group))
+        for param, value in zip(self._parameters, values):
+            param.posterior.natural_parameters = value
+            param._dispatch()
+        for param, value in zip(std_params, values[len(self._parameters):]):
+            param.data.copy_(value)
+
+    def _allreduce(self):
+        'Average the statistics and the gradients over the processes.'
+        std_params = self._std_parameters()
+        for param in std_params:
+            # All the processes need the same buffer layout.
+            if param.grad is None:
+                param.grad = torch.zeros_like(param)
+        tensors = [param.stats for param in self._parameters]
+        tensors += [param.grad for param in std_params]
+        world_size = self.world_size
+
+        def allreduce_mean(buffer):
+            dist.all_reduce(buffer, group=self._process_group)
+            buffer /= world_size
+
+        values = _collective(tensors, allreduce_mean)
+        for param, value in zip(self._parameters, values):
+            param.store_stats(value)
+        for param, value in zip(std_params, values[len(self._parameters):]):
+            param.grad.copy_(value)
+
+    def step(self):
+        '''Average the statistics/gradients over the processes and
+        update one group the standard/Bayesian parameters.'''
+        self._allreduce()
+        super().step()
+
+
+__all__ = ['shard', 'DistributedBayesianModelOptimizer']
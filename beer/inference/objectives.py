@@ -91,17 +91,116 @@ class EvidenceLowerBoundInstance:
             self._datasize
         )
 
+    def natural_backward(self):
+        'Store the statistics of the Bayesian parameters.'
+        scale = self._datasize / self._minibatchsize
+        for parameter in self._model_parameters:
+            # The models may accumulate statistics only for the
+            # parameters used by the minibatch (e.g. the pdfs of an
+            # alignment graph): the other parameters have null
+            # statistics.
+            acc_stats = self._acc_stats.get(parameter, None)
+            if acc_stats is None:
+                acc_stats = torch.zeros_like(parameter.stats)
+            parameter.store_stats(scale * acc_stats)
+
     def backward(self):
+        '''Compute the gradient of the standard pytorch parameters and
+        store the statistics of the Bayesian parameters.'''
         # Pytorch minimizes the loss ! We change the sign of the ELBO
         # just before to compute the gradient.
-        if self._elbo_value.requires_grad:
+        if torch.is_tensor(self._elbo_value) and \
+           self._elbo_value.requires_grad:
             (-self._elbo_value).backward()
+        self.natural_backward()
+
+
+class EvidenceLowerBoundAccumulator:
+    '''Sum of the Evidence Lower Bounds of several parts of a
+    minibatch (e.g. one ELBO per utterance).
+
+    Contrary to the sum of :any:`EvidenceLowerBoundInstance`, the
+    statistics are added in place to a buffer preallocated for each
+    Bayesian parameter of the model. The accumulator can be reused
+    for all the minibatches by calling :any:`reset`.
+
+    Example:
+        >>> elbo = beer.EvidenceLowerBoundAccumulator(model, tot_counts)
+        >>> for batch in batches:
+        ...     optimizer.init_step()
+        ...     elbo.reset()
+        ...     for utt in batch:
+        ...         elbo += beer.evidence_lower_bound(model, utt,
+        ...                                           datasize=tot_counts)
+        ...     elbo.backward()
+        ...     optimizer.step()
+
+    '''
+    __repr_str = '{classname}(value={value})'
+
+    def __init__(self, model, datasize):
+        '''
+        Args:
+            model (:any:`BayesianModel`): Model with which the ELBOs
+                are computed.
+            datasize (int): Number of data points of the total
+                training data.
+        '''
+        self._acc_stats = {param: torch.zeros_like(param.stats)
+                           for param in model.bayesian_parameters()}
+        self._datasize = datasize
+        self.reset()
+
+    def __repr__(self):
+        return self.__repr_str.format(
+            classname=self.__class__.__name__,
+            value=float(self._elbo_value)
+        )
 
+    def __str__(self):
+        return str(self._elbo_value)
+
+    def __float__(self):
+        return float(self._elbo_value)
+
+    def __iadd__(self, other):
+        if not isinstance(other, EvidenceLowerBoundInstance):
+            raise ValueError('EvidenceLowerBoundInstance')
+        if self._datasize != other._datasize:
+            raise ValueError('Cannot add ELBOs evaluated on different data set')
+        self._elbo_value += other._elbo_value
+        for parameter, acc_stats in other._acc_stats.items():
+            self._acc_stats[parameter].add_(acc_stats.detach())
+        self._minibatchsize += other._minibatchsize
+        return self
+
+    def reset(self):
+        'Set the ELBO value and the statistics to zero.'
+        param = next(iter(self._acc_stats), None)
+        if param is not None:
+            self._elbo_value = torch.zeros((), dtype=param.stats.dtype,
+                                           device=param.stats.device)
+        else:
+            self._elbo_value = torch.zeros(())
+        self._minibatchsize = 0
+        for acc_stats in self._acc_stats.values():
+            acc_stats.zero_()
+
+    def natural_backward(self):
+        'Store the statistics of the Bayesian parameters.'
         scale = self._datasize / self._minibatchsize
-        for parameter in self._model_parameters:
-            acc_stats = self._acc_stats[parameter]
+        for parameter, acc_stats in self._acc_stats.items():
             parameter.store_stats(scale * acc_stats)
 
+    def backward(self):
+        '''Compute the gradient of the standard pytorch parameters and
+        store the statistics of the Bayesian parameters.'''
+        # Pytorch minimizes the loss ! We change the sign of the ELBO
+        # just before to compute the gradient.
+        if self._elbo_value.requires_grad:
+            (-self._elbo_value).backward()
+        self.natural_backward()
+
 
 class CollapsedEvidenceLowerBoundInstance:
     '''Collapsed Evidence Lower Bound of a data set given a model.
@@ -184,6 +283,14 @@ class StochasticCollapsedEvidenceLowerBoundInstance:
         return self._acc_stats
     
 
+def _minibatch_size(minibatch_data, kwargs):
+    'Number of frames of a minibatch.'
+    if kwargs.get('lengths', None) is not None:
+        # Padded batch of sequences.
+        return int(torch.as_tensor(kwargs['lengths']).sum())
+    return len(minibatch_data)
+
+
 def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
                          fast_eval=False, **kwargs):
     '''Evidence Lower Bound objective function of Variational Bayes
@@ -206,7 +313,9 @@ def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
         fast_eval (boolean): If true, skip computing KL-divergence for the
             global parameters.
         kwargs (object): Model specific extra parameters to evalute the
-            ELBO.
+            ELBO. If a `lengths` argument is given, `minibatch_data`
+            is treated as a padded batch of sequences and only the
+            valid frames are counted in the size of the minibatch.
 
     Returns:
         ``EvidenceLowerBoundInstance``
@@ -242,7 +351,7 @@ def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
         raise ValueError('if datasize is not provided, need at least "model" '
                          'and "minibatch_data"')
 
-    mb_datasize = len(minibatch_data)
+    mb_datasize = _minibatch_size(minibatch_data, kwargs)
     if datasize <= 0:
         datasize = mb_datasize
     scale = datasize / float(mb_datasize)
@@ -336,6 +445,7 @@ def stochastic_collapsed_evidence_lower_bound(model, minibatch_data, datasize=-1
 
 
 
-__all__ = ['evidence_lower_bound', 'collapsed_evidence_lower_bound',
+__all__ = ['EvidenceLowerBoundAccumulator', 'evidence_lower_bound',
+           'collapsed_evidence_lower_bound',
            'stochastic_collapsed_evidence_lower_bound']
 
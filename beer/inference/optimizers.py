@@ -1,3 +1,5 @@
+from ..models.parameters import BayesianParameterArena
+
 
 class BayesianModelOptimizer:
     '''Generic optimizer for :any:`BayesianModel` subclasses.
@@ -9,7 +11,7 @@ class BayesianModelOptimizer:
 
     '''
 
-    def __init__(self, groups, lrate=1., std_optim=None):
+    def __init__(self, groups, lrate=1., std_optim=None, arena=False):
         '''
         Args:
             parameters (list): List of ``BayesianParameters``.
@@ -17,6 +19,10 @@ class BayesianModelOptimizer:
             std_optim (``torch.optim.Optimizer``): Optimizer for
                 non-Bayesian parameters (i.e. standard ``pytorch``
                 parameters)
+            arena (boolean): If true, the parameters of each group are
+                stored in a :any:`BayesianParameterArena` and updated
+                with a single operation (for models with many
+                parameters).
         '''
         parameters = []
         for group in groups:
@@ -25,12 +31,19 @@ class BayesianModelOptimizer:
         self._lrate = lrate
         self._std_optim = std_optim
         self._groups = groups
+        self._arenas = None
+        if arena:
+            self._arenas = [BayesianParameterArena(group) for group in groups]
         self._update_count = 0
 
     def init_step(self):
         'Set all the standard/Bayesian parameters gradient to zero.'
         if self._std_optim is not None:
             self._std_optim.zero_grad()
+        if self._arenas is not None:
+            for arena in self._arenas:
+                arena.zero_stats()
+            return
         for parameter in self._parameters:
             parameter.stats.zero_()
 
@@ -40,8 +53,11 @@ class BayesianModelOptimizer:
             self._std_optim.step()
         if self._update_count >= len(self._groups):
             self._update_count = 0
-        for parameter in self._groups[self._update_count]:
-            parameter.natural_grad_update(self._lrate)
+        if self._arenas is not None:
+            self._arenas[self._update_count].natural_grad_update(self._lrate)
+        else:
+            for parameter in self._groups[self._update_count]:
+                parameter.natural_grad_update(self._lrate)
 
         self._update_count += 1
 
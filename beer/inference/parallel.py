@@ -0,0 +1,297 @@
+'''Data-parallel evaluation of the Evidence Lower Bound (E-step).
+
+A pool of worker processes holds a copy of the model whose posterior
+distributions read their natural parameters from shared memory. Each
+worker computes the accumulated statistics of a slice of the
+minibatch and the statistics are reduced, per parameter, in the main
+process before the natural gradient step.
+
+'''
+
+import torch
+import torch.multiprocessing as mp
+from ..models.hmm import HMM
+from .objectives import EvidenceLowerBoundInstance
+from .objectives import _minibatch_size
+
+
+# State of a worker process (set by the initializer of the pool).
+_WORKER_STATE = {}
+
+
+def _init_worker(model, posteriors):
+    # Each worker runs on a single core: the parallelism comes from
+    # the number of workers.
+    torch.set_num_threads(1)
+    _WORKER_STATE['model'] = model
+    _WORKER_STATE['posteriors'] = [
+        (param, posteriors[param.uuid])
+        for param in model.bayesian_parameters()
+    ]
+    _WORKER_STATE['version'] = None
+
+
+def _sync_worker(version):
+    'Read the posteriors of the parameters from the shared memory.'
+    if version == _WORKER_STATE['version']:
+        return
+    for param, natural_parameters in _WORKER_STATE['posteriors']:
+        param.posterior.natural_parameters = natural_parameters
+        param._dispatch()
+    _WORKER_STATE['model'].clear_cache()
+    _WORKER_STATE['version'] = version
+
+
+def _reduce_stats(acc_stats, key, stats):
+    if key in acc_stats:
+        acc_stats[key] += stats
+    else:
+        acc_stats[key] = stats
+
+
+def _accumulate(task):
+    'E-step of a worker on a group of (data, kwargs) jobs.'
+    version, jobs = task
+    _sync_worker(version)
+    model = _WORKER_STATE['model']
+    exp_llh, mb_datasize, acc_stats = 0., 0, {}
+    with torch.no_grad():
+        for data, kwargs in jobs:
+            stats = model.sufficient_statistics(data)
+            exp_llh += model.expected_log_likelihood(stats, **kwargs).sum()
+            mb_datasize += _minibatch_size(data, kwargs)
+            for param, p_stats in model.accumulate(stats).items():
+                # The statistics are sent back to the main process:
+                # they are keyed by the uuid of the parameter as the
+                # parameters of the worker are copies.
+                _reduce_stats(acc_stats, param.uuid, p_stats.clone())
+            model.clear_cache()
+    return exp_llh, mb_datasize, acc_stats
+
+
+def _is_sequence_model(model):
+    # The frames of the sequence models (HMMs) are not independent:
+    # they cannot be split into several jobs.
+    if isinstance(model, HMM):
+        return True
+    return any(_is_sequence_model(submodel)
+               for submodel in model._submodels.values())
+
+
+def _split_minibatch(minibatch_data, kwargs, n_splits):
+    '''Split a minibatch into contiguous slices along the first
+    dimension. The tensor arguments with the same first dimension as
+    the data (e.g. the `lengths` of a padded batch) are split as
+    well.'''
+    jobs = []
+    for idxs in torch.arange(len(minibatch_data)).chunk(n_splits):
+        start, end = int(idxs[0]), int(idxs[-1]) + 1
+        s_data, s_kwargs = minibatch_data[start:end], {}
+        for key, value in kwargs.items():
+            value = torch.as_tensor(value) if key == 'lengths' else value
+            if torch.is_tensor(value) and value.dim() > 0 \
+               and len(value) == len(minibatch_data):
+                value = value[start:end]
+            s_kwargs[key] = value
+        if s_kwargs.get('lengths', None) is not None:
+            # Padded batch: remove the padding of the longer sequences
+            # of the other slices.
+            s_data = s_data[:, :int(s_kwargs['lengths'].max())]
+        jobs.append((s_data, s_kwargs))
+    return jobs
+
+
+def _balance_jobs(jobs, n_groups):
+    'Greedy partition of the jobs into groups of similar size.'
+    groups, loads = [[] for _ in range(n_groups)], [0] * n_groups
+    for job in sorted(jobs, key=lambda job: len(job[0]), reverse=True):
+        idx = loads.index(min(loads))
+        groups[idx].append(job)
+        loads[idx] += len(job[0])
+    return [group for group in groups if group]
+
+
+class ParallelEvidenceLowerBound:
+    '''Evidence Lower Bound objective function evaluated by a pool of
+    worker processes (data-parallel E-step).
+
+    The pool is created once and kept along the training: before each
+    evaluation the natural parameters of the posteriors are copied to
+    the shared memory read by the workers. The accumulated statistics
+    of the workers are summed in the main process and the returned
+    :any:`EvidenceLowerBoundInstance` is used as the one returned by
+    :any:`evidence_lower_bound`.
+
+    Note:
+        The minibatch of a sequence model (e.g. :any:`HMM`) is split
+        into sequences, never into frames: use either a padded batch
+        (with the `lengths` argument) or :any:`sequences`.
+
+        Only CPU models whose parameters are all Bayesian parameters
+        are supported (the workers do not compute the gradients of
+        the standard pytorch parameters). The type (float/double) of
+        the model should not be changed once the pool is created.
+
+    Example:
+        >>> with beer.ParallelEvidenceLowerBound(model, 4) as elbo_fn:
+        ...     for batch in batches:
+        ...         optimizer.init_step()
+        ...         elbo = elbo_fn(batch, datasize=tot_counts)
+        ...         elbo.backward()
+        ...         optimizer.step()
+
+    '''
+
+    def __init__(self, model, n_workers=None, start_method=None):
+        '''
+        Args:
+            model (:any:`BayesianModel`): The Bayesian model with which
+                to compute the ELBO.
+            n_workers (int): Number of worker processes. If None, use
+                one worker per core.
+            start_method (str): Method to start the workers ('fork',
+                'spawn' or 'forkserver'). If None, use the default of
+                the platform.
+        '''
+        if isinstance(model, torch.nn.Module) and \
+           any(param.requires_grad for param in model.parameters()):
+            raise ValueError('the parallel E-step does not support models '
+                             'with standard pytorch parameters')
+        self.model = model
+        self.n_workers = n_workers if n_workers is not None \
+            else mp.cpu_count()
+        self._parameters = {param.uuid: param
+                            for param in model.bayesian_parameters()}
+        self._posteriors = {}
+        for uuid, param in self._parameters.items():
+            natural_parameters = param.posterior.natural_parameters
+            if natural_parameters.device.type != 'cpu':
+                raise ValueError('the parallel E-step only supports CPU '
+                                 'models')
+            self._posteriors[uuid] = natural_parameters.clone().share_memory_()
+        # Version of the posteriors copied to the shared memory. The
+        # version (and not the tensor) is checked as the posteriors
+        # can be updated in place (see :any:`BayesianParameterArena`).
+        self._synced = {uuid: param.posterior.version
+                        for uuid, param in self._parameters.items()}
+        self._version = 0
+        context = mp.get_context(start_method)
+        self._pool = context.Pool(self.n_workers, initializer=_init_worker,
+                                  initargs=(model, self._posteriors))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        'Terminate the worker processes.'
+        self._pool.close()
+        self._pool.join()
+
+    def _share_posteriors(self):
+        'Copy the updated posteriors to the shared memory.'
+        updated = False
+        for uuid, param in self._parameters.items():
+            version = param.posterior.version
+            if version == self._synced[uuid]:
+                continue
+            natural_parameters = param.posterior.natural_parameters
+            buffer = self._posteriors[uuid]
+            if natural_parameters.shape != buffer.shape or \
+               natural_parameters.dtype != buffer.dtype:
+                raise ValueError('the parameters of the model have changed '
+                                 'type or shape')
+            buffer.copy_(natural_parameters)
+            self._synced[uuid] = version
+            updated = True
+        if updated:
+            self._version += 1
+
+    def _evaluate(self, groups, datasize, fast_eval):
+        self._share_posteriors()
+        exp_llh, mb_datasize, acc_stats = 0., 0, {}
+        tasks = [(self._version, group) for group in groups]
+        for w_exp_llh, w_mb_datasize, w_acc_stats in \
+                self._pool.imap(_accumulate, tasks):
+            exp_llh += w_exp_llh
+            mb_datasize += w_mb_datasize
+            for uuid, stats in w_acc_stats.items():
+                _reduce_stats(acc_stats, uuid, stats)
+
+        if datasize <= 0:
+            datasize = mb_datasize
+        scale = datasize / float(mb_datasize)
+        if not fast_eval:
+            kl_div = self.model.kl_div_posterior_prior().sum()
+        else:
+            kl_div = 0.
+        elbo_value = float(scale) * exp_llh - kl_div
+        acc_stats = {self._parameters[uuid]: stats
+                     for uuid, stats in acc_stats.items()}
+        self.model.clear_cache()
+        return EvidenceLowerBoundInstance(elbo_value, acc_stats,
+                                          self._parameters.values(),
+                                          mb_datasize, datasize)
+
+    def __call__(self, minibatch_data, datasize=-1, fast_eval=False,
+                 **kwargs):
+        '''Evaluate the ELBO of a minibatch. The minibatch is split
+        along its first dimension (frames or sequences of a padded
+        batch) into one slice per worker. For sequence models (e.g.
+        :any:`HMM`), the minibatch has to be a padded batch: to
+        evaluate sequences of different lengths or with their own
+        inference graph, use :any:`sequences`.
+
+        Args:
+            minibatch_data (``torch.Tensor``): Data of the minibatch on
+                which to evaluate the ELBO.
+            datasize (int): Number of data points of the total training
+                data. If set to 0 or negative values, the size of the
+                provided `minibatch_data` will be used instead.
+            fast_eval (boolean): If true, skip computing KL-divergence
+                for the global parameters.
+            kwargs (object): Model specific extra parameters to evalute
+                the ELBO (see :any:`evidence_lower_bound`).
+
+        Returns:
+            ``EvidenceLowerBoundInstance``
+        '''
+        if kwargs.get('lengths', None) is None and \
+           _is_sequence_model(self.model):
+            raise ValueError('the frames of a sequence model cannot be '
+                             'split: provide the "lengths" of a padded batch '
+                             'or use "sequences()"')
+        groups = [[job] for job in _split_minibatch(minibatch_data, kwargs,
+                                                    self.n_workers)]
+        return self._evaluate(groups, datasize, fast_eval)
+
+    def sequences(self, sequences, datasize=-1, fast_eval=False, **kwargs):
+        '''Evaluate the ELBO of a minibatch of sequences processed one
+        at a time (e.g. utterances with their own alignment graph).
+        The sequences are distributed over the workers so that each
+        worker processes about the same number of frames.
+
+        Args:
+            sequences (list): List of ``(data, seq_kwargs)`` tuples
+                where `seq_kwargs` (dict) are the extra parameters
+                specific to the sequence.
+            datasize (int): Number of data points of the total training
+                data. If set to 0 or negative values, the number of
+                frames of the minibatch will be used instead.
+            fast_eval (boolean): If true, skip computing KL-divergence
+                for the global parameters.
+            kwargs (object): Extra parameters shared by all the
+                sequences.
+
+        Returns:
+            ``EvidenceLowerBoundInstance``
+        '''
+        jobs = [(data, {**kwargs, **seq_kwargs})
+                for data, seq_kwargs in sequences]
+        return self._evaluate(_balance_jobs(jobs, self.n_workers), datasize,
+                              fast_eval)
+
+
+__all__ = ['ParallelEvidenceLowerBound']
@@ -7,6 +7,7 @@ import torch
 from .parameters import ConstantParameter
 from .parameters import BayesianParameter
 from .parameters import BayesianParameterSet
+from .parameters import VersionedCache
 
 
 
@@ -122,6 +123,39 @@ class BayesianModel(metaclass=abc.ABCMeta):
         '''
         return self._cache
 
+    @property
+    def derived_cache(self):
+        ''':any:`VersionedCache` of the quantities derived from the
+        parameters of the model. Contrary to :any:`cache`, it is kept
+        between the evaluations of the ELBO and its values are
+        recomputed only when the parameters are updated.
+
+        '''
+        try:
+            return self._derived_cache
+        except AttributeError:
+            # Models pickled before the cache was added.
+            self._derived_cache = VersionedCache()
+            return self._derived_cache
+
+    def derived_cache_counters(self):
+        '''Number of hits/misses of the caches of derived quantities
+        of the model, its sub-models and its sets of parameters.
+
+        Returns:
+            tuple: (hits, misses)
+        '''
+        caches = [self.derived_cache]
+        caches += [param.derived_cache
+                   for param in self._bayesian_parameters.values()
+                   if isinstance(param, BayesianParameterSet)]
+        hits = sum(cache.hits for cache in caches)
+        misses = sum(cache.misses for cache in caches)
+        for submodel in self._submodels.values():
+            s_hits, s_misses = submodel.derived_cache_counters()
+            hits, misses = hits + s_hits, misses + s_misses
+        return hits, misses
+
     def modules_parameters(self):
         for module in self._modules.values():
             for param in module.parameters():
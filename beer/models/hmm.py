@@ -6,7 +6,8 @@ import torch
 import numpy as np
 from .bayesmodel import DiscreteLatentBayesianModel, BayesianModelSet
 from .parameters import ConstantParameter
-from ..utils import onehot, logsumexp
+from ..decoders import OnlineViterbiDecoder
+from ..utils import is_hard_assignment, logsumexp
 
 
 class HMM(DiscreteLatentBayesianModel):
@@ -42,28 +43,117 @@ class HMM(DiscreteLatentBayesianModel):
         super().__init__(modelset)
         self.graph = ConstantParameter(graph)
 
-    def decode(self, data, inference_graph=None):
+    def decode(self, data, inference_graph=None, lengths=None, decoder=None,
+               scorer=None):
+        '''Most likely sequence of pdf ids.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features of the
+                utterance or, along with `lengths`, padded features
+                ``torch.Tensor[batch_size, max_frames, dim]`` of a
+                batch of utterances.
+            inference_graph (:any:`CompiledGraph`): Decoding graph.
+                Default to the HMM's graph.
+            lengths (``torch.LongTensor[batch_size]``): Number of
+                frames of each utterance of the batch.
+            decoder (:any:`BeamSearchDecoder`): Beam search decoder.
+                If provided, the utterance is decoded with the
+                decoder's graph and only the emissions of the active
+                states are evaluated (faster for large graphs only).
+                Otherwise, exhaustive Viterbi decoding is used.
+            scorer: Frozen scorer of the emissions (see the
+                ``scorer()`` method of the model sets). If provided,
+                the emissions are evaluated with the scorer rather than
+                with the posterior distributions of the model. When
+                decoding several utterances, the scorer should be
+                exported once and reused.
+
+        Returns:
+            ``torch.LongTensor[n_frames]`` or, for a batch, a list of
+            ``torch.LongTensor``.
+        '''
+        if decoder is not None:
+            if scorer is not None:
+                def llh_fn(frames, pdf_ids):
+                    return scorer.log_likelihood(data[frames], pdf_ids)
+            else:
+                stats = self.sufficient_statistics(data)
+                def llh_fn(frames, pdf_ids):
+                    return self.modelset.expected_log_likelihood(
+                        stats[frames], pdf_ids)
+            best_path = decoder.decode(llh_fn, len(data))
+            self.clear_cache()
+            return self._map_path(best_path, decoder.graph)
+
         # Prepare the inference graph.
         if inference_graph is None:
             inference_graph = self.graph.value
 
-        # Eventual re-mapping of the pdfs.
-        if inference_graph.pdf_id_mapping is not None:
-            emissions = AlignModelSet(self.modelset,
-                                      inference_graph.pdf_id_mapping)
+        llh_fn, inputs = self._emissions_log_likelihood(data, inference_graph,
+                                                        scorer)
+        if lengths is not None:
+            pc_llhs, _ = _batch_log_likelihood(llh_fn, inputs, lengths)
+            best_paths = inference_graph.best_path(pc_llhs, lengths=lengths)
+            return [self._map_path(path, inference_graph)
+                    for path in best_paths]
+
+        best_path = inference_graph.best_path(llh_fn(inputs))
+        return self._map_path(best_path, inference_graph)
+
+    def decode_stream(self, chunks, inference_graph=None, max_delay=None,
+                      scorer=None):
+        '''Online decoding of a stream of features.
+
+        Args:
+            chunks (iterable): Chunks (``torch.Tensor[n_frames, dim]``)
+                of features of the stream.
+            inference_graph (:any:`CompiledGraph`): Decoding graph.
+                Default to the HMM's graph.
+            max_delay (int): Maximum number of frames buffered by the
+                decoder (see :any:`OnlineViterbiDecoder`).
+            scorer: Frozen scorer of the emissions (see
+                :any:`HMM.decode`).
+
+        Yields:
+            ``torch.LongTensor``: Newly decided pdf ids of the best
+            path after each chunk and, finally, the remaining pdf ids at
+            the end of the stream.
+        '''
+        if inference_graph is None:
+            inference_graph = self.graph.value
+        decoder = OnlineViterbiDecoder(inference_graph, max_delay=max_delay)
+        for chunk in chunks:
+            llh_fn, inputs = self._emissions_log_likelihood(chunk,
+                                                            inference_graph,
+                                                            scorer)
+            pc_llhs = llh_fn(inputs)
+            yield self._map_path(decoder.push(pc_llhs), inference_graph)
+        yield self._map_path(decoder.finalize(), inference_graph)
+
+    def _emissions_log_likelihood(self, data, inference_graph, scorer):
+        # Function computing the per-state log-likelihood of the
+        # inference graph and its input (features for the scorer,
+        # sufficient statistics otherwise).
+        pdf_id_mapping = inference_graph.pdf_id_mapping
+        if scorer is not None:
+            if pdf_id_mapping is not None:
+                scorer = _AlignScorer(scorer, pdf_id_mapping)
+            return scorer.log_likelihood, data
+        if pdf_id_mapping is not None:
+            emissions = AlignModelSet(self.modelset, pdf_id_mapping)
         else:
             emissions = self.modelset
+        return emissions.expected_log_likelihood, \
+            self.sufficient_statistics(data)
 
-        stats = self.sufficient_statistics(data)
-        pc_llhs = emissions.expected_log_likelihood(stats)
-        best_path = inference_graph.best_path(pc_llhs)
+    @staticmethod
+    def _map_path(best_path, inference_graph):
         if inference_graph.pdf_id_mapping is not None:
             best_path = [inference_graph.pdf_id_mapping[state]
                          for state in best_path]
             best_path = torch.LongTensor(best_path)
         return best_path
 
-
     ####################################################################
     # BayesianModel interface.
     ####################################################################
@@ -72,27 +162,44 @@ class HMM(DiscreteLatentBayesianModel):
         return self.modelset.mean_field_factorization()
 
     def sufficient_statistics(self, data):
+        if len(data.shape) == 3:
+            # Padded batch of utterances.
+            batch_size, max_frames, dim = data.shape
+            stats = self.modelset.sufficient_statistics(data.reshape(-1, dim))
+            return stats.reshape(batch_size, max_frames, -1)
         return self.modelset.sufficient_statistics(data)
 
     def expected_log_likelihood(self, stats, inference_graph=None,
-                                inference_type='viterbi', state_path=None):
+                                inference_type='viterbi', state_path=None,
+                                lengths=None, checkpoint=False):
         if inference_graph is None:
             inference_graph = self.graph.value
         emissions = AlignModelSet(self.modelset, inference_graph.pdf_id_mapping)
+        if lengths is not None:
+            return self._batch_expected_log_likelihood(
+                emissions, stats, inference_graph, inference_type,
+                state_path, lengths, checkpoint
+            )
         pc_llhs = emissions.expected_log_likelihood(stats)
+
+        # The Viterbi path and the given alignments are kept as hard
+        # assignments (index of the state of each frame).
         if state_path is not None:
-            resps = onehot(state_path, inference_graph.n_states,
-                           dtype=pc_llhs.dtype, device=pc_llhs.device)
+            resps = torch.as_tensor(state_path, dtype=torch.long,
+                                    device=pc_llhs.device)
         elif inference_type == 'baum_welch':
-            resps = inference_graph.posteriors(pc_llhs)
+            # Optionally, checkpointed forward-backward to reduce the
+            # memory on long utterances.
+            resps = inference_graph.posteriors(pc_llhs, checkpoint=checkpoint)
         elif inference_type == 'viterbi':
-            resps = onehot(inference_graph.best_path(pc_llhs),
-                           inference_graph.n_states,
-                           dtype=pc_llhs.dtype, device=pc_llhs.device)
+            resps = inference_graph.best_path(pc_llhs).to(pc_llhs.device)
         else:
             raise ValueError('Unknown inference type {} for the ' \
                              'HMM'.format(inference_type))
-        exp_llh = (pc_llhs * resps).sum(dim=-1)
+        if is_hard_assignment(resps):
+            exp_llh = pc_llhs.gather(1, resps[:, None])[:, 0]
+        else:
+            exp_llh = (pc_llhs * resps).sum(dim=-1)
 
         # Needed to accumulate the statistics.
         self.cache['emissions'] = emissions
@@ -103,7 +210,45 @@ class HMM(DiscreteLatentBayesianModel):
         # the value of the parameters.
         return exp_llh
 
+    def _batch_expected_log_likelihood(self, emissions, stats,
+                                       inference_graph, inference_type,
+                                       state_path, lengths, checkpoint):
+        pc_llhs, valid_frames = _batch_log_likelihood(
+            emissions.expected_log_likelihood, stats, lengths)
+        mask = valid_frames.reshape(pc_llhs.shape[:2]).type(pc_llhs.dtype)
+        if state_path is not None:
+            resps = torch.as_tensor(state_path, dtype=torch.long,
+                                    device=pc_llhs.device)
+        elif inference_type == 'baum_welch':
+            resps = inference_graph.posteriors(pc_llhs, lengths=lengths,
+                                               checkpoint=checkpoint)
+        elif inference_type == 'viterbi':
+            paths = inference_graph.best_path(pc_llhs, lengths=lengths)
+            resps = torch.nn.utils.rnn.pad_sequence(paths, batch_first=True)
+            resps = resps.to(pc_llhs.device)
+        else:
+            raise ValueError('Unknown inference type {} for the ' \
+                             'HMM'.format(inference_type))
+        if is_hard_assignment(resps):
+            exp_llh = pc_llhs.gather(2, resps[:, :, None])[:, :, 0] * mask
+            resps = resps.reshape(-1)
+        else:
+            exp_llh = (pc_llhs * resps).sum(dim=-1)
+            resps = resps.reshape(-1, inference_graph.n_states)
+
+        # Needed to accumulate the statistics. The emissions were
+        # evaluated on the valid frames only, the padding frames are
+        # removed from the statistics before the accumulation.
+        self.cache['emissions'] = emissions
+        self.cache['resps'] = resps[valid_frames]
+        self.cache['valid_frames'] = valid_frames
+
+        return exp_llh
+
     def accumulate(self, stats, parent_msg=None):
+        if len(stats.shape) == 3:
+            stats = stats.reshape(-1, stats.shape[-1])
+            stats = stats[self.cache['valid_frames']]
         retval = {
             **self.cache['emissions'].accumulate(stats, self.cache['resps'])
         }
@@ -113,15 +258,55 @@ class HMM(DiscreteLatentBayesianModel):
     # DiscreteLatentBayesianModel interface.
     ####################################################################
 
-    def posteriors(self, data, inference_graph=None):
+    def posteriors(self, data, inference_graph=None, lengths=None):
         if inference_graph is None:
             inference_graph = self.graph.value
-        stats = self.modelset.sufficient_statistics(data)
         emissions = AlignModelSet(self.modelset, inference_graph.pdf_id_mapping)
+        if lengths is not None:
+            stats = self.sufficient_statistics(data)
+            pc_exp_llh, _ = _batch_log_likelihood(
+                emissions.expected_log_likelihood, stats, lengths)
+            return inference_graph.posteriors(pc_exp_llh, lengths=lengths)
+        stats = self.modelset.sufficient_statistics(data)
         pc_exp_llh = emissions.expected_log_likelihood(stats)
         return inference_graph.posteriors(pc_exp_llh)
 
 
+def _batch_log_likelihood(llh_fn, data, lengths):
+    # Per-frame/per-component log-likelihood of a padded batch of
+    # statistics (or features). The emissions are evaluated on the
+    # valid frames only, the log-likelihood of the padding frames is
+    # set to 0.
+    batch_size, max_frames, dim = data.shape
+    lengths = torch.as_tensor(lengths, device=data.device)
+    frames = torch.arange(max_frames, device=data.device)
+    valid_frames = (frames[None, :] < lengths[:, None]).reshape(-1)
+    valid_llhs = llh_fn(data.reshape(-1, dim)[valid_frames])
+    pc_llhs = torch.zeros(batch_size * max_frames, valid_llhs.shape[-1],
+                          dtype=valid_llhs.dtype, device=valid_llhs.device)
+    pc_llhs[valid_frames] = valid_llhs
+    return pc_llhs.reshape(batch_size, max_frames, -1), valid_frames
+
+
+class _AlignScorer:
+    # Frozen counterpart of :any:`AlignModelSet`: map the states of the
+    # inference graph onto the output of the scorer.
+
+    def __init__(self, scorer, state_ids):
+        self.scorer = scorer
+        self._pdf_ids, self._state_pdf_idxs = torch.unique(
+            torch.as_tensor(state_ids), return_inverse=True)
+
+    def __len__(self):
+        return len(self._state_pdf_idxs)
+
+    def log_likelihood(self, data):
+        pdf_ids = self._pdf_ids.to(data.device)
+        state_pdf_idxs = self._state_pdf_idxs.to(data.device)
+        llhs = self.scorer.log_likelihood(data, pdf_ids)
+        return llhs.index_select(-1, state_pdf_idxs)
+
+
 class AlignModelSet(BayesianModelSet):
 
     def __init__(self, modelset, state_ids):
@@ -134,6 +319,27 @@ class AlignModelSet(BayesianModelSet):
         self.modelset = modelset
         self.state_ids = state_ids
 
+        # Index tensors of the mapping state -> pdf. Only the pdfs
+        # used by the states are evaluated and accumulated (unless all
+        # of them are used).
+        self._state_ids = torch.as_tensor(state_ids, dtype=torch.long)
+        self._pdf_ids, self._state_pdf_idxs = \
+            torch.unique(self._state_ids, return_inverse=True)
+        if len(self._pdf_ids) == len(modelset):
+            self._pdf_ids, self._state_pdf_idxs = None, self._state_ids
+
+    def _to(self, device):
+        if self._state_ids.device != device:
+            self._state_ids = self._state_ids.to(device)
+            self._state_pdf_idxs = self._state_pdf_idxs.to(device)
+            if self._pdf_ids is not None:
+                self._pdf_ids = self._pdf_ids.to(device)
+
+    def _n_pdfs(self):
+        if self._pdf_ids is None:
+            return len(self.modelset)
+        return len(self._pdf_ids)
+
     ####################################################################
     # BayesianModel interface.
     ####################################################################
@@ -144,22 +350,32 @@ class AlignModelSet(BayesianModelSet):
     def sufficient_statistics(self, data):
         return self.modelset.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
-        state_ids = self.state_ids
-        dtype, device = stats.dtype, stats.device
-        pc_exp_llh = self.modelset.expected_log_likelihood(stats)
-        new_pc_exp_llh = torch.zeros((len(stats), len(state_ids)),
-                                     dtype=dtype, device=device)
-        new_pc_exp_llh[:, :] = pc_exp_llh[:, state_ids]
-        return new_pc_exp_llh
+    def expected_log_likelihood(self, stats, idxs=None):
+        self._to(stats.device)
+        if idxs is not None:
+            return self.modelset.expected_log_likelihood(
+                stats, self._state_ids[idxs.to(stats.device)])
+        if self._pdf_ids is None:
+            pdf_exp_llh = self.modelset.expected_log_likelihood(stats)
+        else:
+            pdf_exp_llh = self.modelset.expected_log_likelihood(stats,
+                                                                self._pdf_ids)
+        return pdf_exp_llh.index_select(-1, self._state_pdf_idxs)
 
     def accumulate(self, stats, resps):
-        state_ids = self.state_ids
-        new_resps = torch.zeros((len(stats), len(self.modelset)),
-                                 dtype=resps.dtype, device=resps.device)
-        for key, val in enumerate(resps.t()):
-            new_resps[:, state_ids[key]] += val
-        return self.modelset.accumulate(stats, new_resps)
+        self._to(resps.device)
+        if is_hard_assignment(resps):
+            pdf_resps = self._state_pdf_idxs[resps]
+        else:
+            pdf_resps = self._state_pdf_resps(resps)
+        if self._pdf_ids is None:
+            return self.modelset.accumulate(stats, pdf_resps)
+        return self.modelset.accumulate(stats, pdf_resps, self._pdf_ids)
+
+    def _state_pdf_resps(self, resps):
+        pdf_resps = torch.zeros((*resps.shape[:-1], self._n_pdfs()),
+                                dtype=resps.dtype, device=resps.device)
+        return pdf_resps.index_add_(-1, self._state_pdf_idxs, resps)
 
     ####################################################################
     # BayesianModelSet interface.
@@ -6,7 +6,7 @@ from .bayesmodel import BayesianParameter
 from .bayesmodel import BayesianModel, BayesianModelSet
 from ..priors import GammaPrior
 from ..priors import MatrixNormalPrior
-from ..utils import make_symposdef
+from ..utils import is_hard_assignment, make_symposdef, onehot
 
 
 class LinearRegression(BayesianModel):
@@ -175,6 +175,9 @@ class LinearRegressionSet(BayesianModelSet):
         return llhs
 
     def accumulate(self, stats, resps):
+        if is_hard_assignment(resps):
+            resps = onehot(resps, len(self), dtype=stats.dtype,
+                           device=stats.device)
         acc_stats = {}
         for i, model in enumerate(self.lregs):
             m_acc_stats = model.accumulate(resps[:, i, None] * stats)
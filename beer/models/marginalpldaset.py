@@ -11,7 +11,7 @@ from .normal import Normal
 from .normalset import NormalSetElement
 from ..priors import NormalFullCovariancePrior
 from ..priors import WishartPrior
-from ..utils import make_symposdef
+from ..utils import is_hard_assignment, make_symposdef, onehot
 
 
 class MarginalPLDASet(BayesianModelSet):
@@ -149,6 +149,9 @@ class MarginalPLDASet(BayesianModelSet):
         return exp_llh
 
     def accumulate(self, s_stats, resps):
+        if is_hard_assignment(resps):
+            resps = onehot(resps, len(self), dtype=s_stats.dtype,
+                           device=s_stats.device)
         dtype = resps.dtype
         device = resps.device
         data = self.cache['data']
@@ -5,7 +5,7 @@ import torch
 from .bayesmodel import DiscreteLatentBayesianModel
 from .bayesmodel import BayesianParameter
 from ..priors import DirichletPrior
-from ..utils import onehot
+from ..utils import is_hard_assignment
 from ..utils import logsumexp
 
 
@@ -82,20 +82,30 @@ class Mixture(DiscreteLatentBayesianModel):
             log_resps = w_per_component_exp_llh.detach() - w_exp_llh.view(-1, 1)
             local_kl_div = self._local_kl_divergence(log_resps, log_weights)
             resps = log_resps.exp()
+            exp_llh = (per_component_exp_llh * resps).sum(dim=-1)
         else:
+            # Hard assignments: the labels are kept as indices.
             local_kl_div = 0
-            resps = onehot(labels, len(self.modelset),
-                            dtype=log_weights.dtype, device=log_weights.device)
-        exp_llh = (per_component_exp_llh * resps).sum(dim=-1)
+            resps = torch.as_tensor(labels, dtype=torch.long,
+                                    device=log_weights.device)
+            exp_llh = per_component_exp_llh.gather(1, resps[:, None])[:, 0]
 
         # Store the responsibilites to accumulate the statistics.
         self.cache['resps'] = resps
 
         return exp_llh - local_kl_div
 
+    def _marginal_log_weights(self):
+        # Logarithm of the expected weights (reused until the weights
+        # are updated).
+        return self.derived_cache.get(
+            'log_weights', [self.weights],
+            lambda: self.weights.expected_value().view(1, -1).log()
+        )
+
     def marginal_log_likelihood(self, stats, labels=None, **kwargs):
         # Per-components weighted log-likelihood.
-        log_weights = self.weights.expected_value().view(1, -1).log()
+        log_weights = self._marginal_log_weights()
         pc_llh = self.modelset.marginal_log_likelihood(stats, **kwargs)
 
         # Responsibilities and expected llh.
@@ -105,11 +115,13 @@ class Mixture(DiscreteLatentBayesianModel):
             log_resps = w_per_component_exp_llh.detach() - w_exp_llh.view(-1, 1)
             local_kl_div = self._local_kl_divergence(log_resps, log_weights)
             resps = log_resps.exp()
+            m_llh = (pc_llh * resps).sum(dim=-1)
         else:
+            # Hard assignments: the labels are kept as indices.
             local_kl_div = 0
-            resps = onehot(labels, len(self.modelset), dtype=log_weights.dtype,
-                           device=log_weights.device)
-        m_llh = (pc_llh * resps).sum(dim=-1)
+            resps = torch.as_tensor(labels, dtype=torch.long,
+                                    device=log_weights.device)
+            m_llh = pc_llh.gather(1, resps[:, None])[:, 0]
 
         # Store the responsibilites to accumulate the statistics.
         self.cache['resps'] = resps
@@ -118,8 +130,13 @@ class Mixture(DiscreteLatentBayesianModel):
 
     def accumulate(self, stats):
         resps = self.cache['resps']
+        if is_hard_assignment(resps):
+            counts = torch.bincount(resps, minlength=len(self.modelset))
+            counts = counts.type(stats.dtype)
+        else:
+            counts = resps.sum(dim=0)
         retval = {
-            self.weights: torch.tensor(resps.sum(dim=0)),
+            self.weights: torch.tensor(counts),
             **self.modelset.accumulate(stats, resps)
         }
         return retval
@@ -141,7 +158,7 @@ class Mixture(DiscreteLatentBayesianModel):
     def marginal_posteriors(self, data):
         stats = self.modelset.sufficient_statistics(data)
         per_component_exp_llh = self.modelset.marginal_log_likelihood(stats)
-        per_component_exp_llh += self.weights.expected_value().view(1, -1).log()
+        per_component_exp_llh += self._marginal_log_weights()
         lognorm = logsumexp(per_component_exp_llh, dim=1).view(-1)
         return torch.exp(per_component_exp_llh - lognorm.view(-1, 1))
 
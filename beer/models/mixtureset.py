@@ -1,10 +1,12 @@
 
 from collections import namedtuple
 import torch
-from .bayesmodel import BayesianParameterSet, BayesianParameter
 from .bayesmodel import BayesianModelSet
+from .parameters import StackedBayesianParameterSet
+from .parameters import _stack_pickled_set
 from ..priors import DirichletPrior
-from ..utils import logsumexp
+from ..scorers import GaussianSelector, MixtureSetScorer
+from ..utils import is_hard_assignment, logsumexp
 
 
 MixtureSetElement = namedtuple('MixtureSetElement', ['weights', 'modelset'])
@@ -53,11 +55,14 @@ class MixtureSet(BayesianModelSet):
 
         '''
         super().__init__()
-        self.weights = BayesianParameterSet([
-            BayesianParameter(prior, posterior)
-            for prior, posterior in zip(prior_weights, posterior_weights)])
+        self.weights = StackedBayesianParameterSet(prior_weights,
+                                                   posterior_weights)
         self.modelset = modelset
 
+    def __setstate__(self, state):
+        # Sets pickled before the weights were stacked.
+        self.__dict__.update(_stack_pickled_set(state, 'weights'))
+
     def __getitem__(self, key):
         weights = self.weights[key]
         mdlset = [self.modelset[i] for i in range(key * self.n_comp_per_mixture,
@@ -77,15 +82,21 @@ class MixtureSet(BayesianModelSet):
     ####################################################################
 
     def mean_field_factorization(self):
-        return [self.modelset.mean_field_factorization()[0] + [*self.weights]]
+        return [self.modelset.mean_field_factorization()[0] + [self.weights]]
 
     def sufficient_statistics(self, data):
         return self.modelset.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
-        log_weights = self.weights.expected_natural_parameters()
-        pc_exp_llhs = self.modelset.expected_log_likelihood(stats)
-        pc_exp_llhs = pc_exp_llhs.reshape(-1, len(self), self.n_comp_per_mixture)
+    def expected_log_likelihood(self, stats, idxs=None):
+        log_weights = self.weights.expected_natural_parameters(idxs)
+        if idxs is not None:
+            # Evaluate only the components of the selected mixtures.
+            pc_exp_llhs = self.modelset.expected_log_likelihood(
+                stats, self._component_idxs(idxs))
+        else:
+            pc_exp_llhs = self.modelset.expected_log_likelihood(stats)
+        pc_exp_llhs = pc_exp_llhs.reshape(len(stats), len(log_weights),
+                                          self.n_comp_per_mixture)
         w_pc_exp_llhs = pc_exp_llhs + log_weights[None]
 
         # Responsibilities.
@@ -102,15 +113,79 @@ class MixtureSet(BayesianModelSet):
 
         return exp_llh - local_kl_div
 
-    def accumulate(self, stats, resps):
-        ret_val = {}
+    def accumulate(self, stats, resps, idxs=None):
+        if is_hard_assignment(resps):
+            return self._accumulate_hard(stats, resps, idxs)
         joint_resps = self.cache['resps'] * resps[:,:, None]
         sum_joint_resps = joint_resps.sum(dim=0)
-        ret_val = dict(zip(self.weights, torch.tensor(sum_joint_resps)))
-        acc_stats = self.modelset.accumulate(stats,
-            joint_resps.reshape(-1, len(self) * self.n_comp_per_mixture))
-        ret_val = {**ret_val, **acc_stats}
-        return ret_val
+        if idxs is not None:
+            acc_stats = self.modelset.accumulate(
+                stats, joint_resps.reshape(len(stats), -1),
+                self._component_idxs(idxs)
+            )
+        else:
+            acc_stats = self.modelset.accumulate(stats,
+                joint_resps.reshape(-1, len(self) * self.n_comp_per_mixture))
+        w_stats = self._weights_stats(sum_joint_resps.detach(), idxs)
+        return {self.weights: w_stats, **acc_stats}
+
+    def _accumulate_hard(self, stats, resps, idxs):
+        # Each frame is assigned to a single mixture: only the
+        # components of the mixtures actually assigned are accumulated.
+        mixture_idxs, inverse = torch.unique(resps, return_inverse=True)
+        frames = torch.arange(len(stats), device=stats.device)
+        comp_resps = self.cache['resps'][frames, resps]
+        joint_resps = torch.zeros(len(stats), len(mixture_idxs),
+                                  self.n_comp_per_mixture,
+                                  dtype=comp_resps.dtype,
+                                  device=comp_resps.device)
+        joint_resps[frames, inverse] = comp_resps
+        sum_joint_resps = joint_resps.sum(dim=0)
+        if idxs is not None:
+            mixture_idxs = idxs[mixture_idxs]
+        acc_stats = self.modelset.accumulate(
+            stats, joint_resps.reshape(len(stats), -1),
+            self._component_idxs(mixture_idxs)
+        )
+        w_stats = self._weights_stats(sum_joint_resps, mixture_idxs)
+        return {self.weights: w_stats, **acc_stats}
+
+    def _weights_stats(self, sum_joint_resps, idxs):
+        # Statistics of the weights of all the mixtures (zero for the
+        # mixtures that are not selected).
+        if idxs is None:
+            return sum_joint_resps
+        w_stats = sum_joint_resps.new_zeros(len(self),
+                                            self.n_comp_per_mixture)
+        return w_stats.index_add_(0, idxs, sum_joint_resps)
+
+    def scorer(self, n_clusters=None, n_best=1, floor=None):
+        '''Frozen scorer of the set (for decoding).
+
+        Args:
+            n_clusters (int): Number of clusters of the Gaussian
+                selection (see :any:`GaussianSelector`). If None, all
+                the components are evaluated.
+            n_best (int): Number of selected clusters per frame.
+            floor (float): Log-likelihood of the components that are
+                not selected (see :any:`MixtureSetScorer`).
+
+        Returns:
+            :any:`MixtureSetScorer`
+
+        '''
+        log_weights = self.weights.expected_natural_parameters()
+        scorer = self.modelset.scorer()
+        selector = None
+        if n_clusters is not None:
+            selector = GaussianSelector.create(scorer, n_clusters, n_best)
+        return MixtureSetScorer(log_weights, scorer, selector, floor)
+
+    def _component_idxs(self, idxs):
+        # Indices of the components of the given mixtures.
+        comp_idxs = torch.arange(self.n_comp_per_mixture, device=idxs.device)
+        comp_idxs = idxs[:, None] * self.n_comp_per_mixture + comp_idxs
+        return comp_idxs.view(-1)
 
 
 __all__ = ['MixtureSet']
@@ -2,6 +2,8 @@
 
 import torch
 from .bayesmodel import BayesianModelSet
+from ..scorers import JointScorer, RepeatedScorer
+from ..utils import is_hard_assignment
 
 
 class JointModelSet(BayesianModelSet):
@@ -34,19 +36,55 @@ class JointModelSet(BayesianModelSet):
     def sufficient_statistics(self, data):
         return self.modelsets[0].sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
-        return torch.cat([
-            modelset.expected_log_likelihood(stats)
-            for modelset in self.modelsets
-        ], dim=-1)
+    def expected_log_likelihood(self, stats, idxs=None):
+        if idxs is None:
+            return torch.cat([
+                modelset.expected_log_likelihood(stats)
+                for modelset in self.modelsets
+            ], dim=-1)
 
-    def accumulate(self, stats, resps):
+        exp_llhs = torch.zeros(len(stats), len(idxs), dtype=stats.dtype,
+                               device=stats.device)
+        start_idx = 0
+        for modelset in self.modelsets:
+            length = len(modelset)
+            selected = (idxs >= start_idx) & (idxs < start_idx + length)
+            if selected.any():
+                exp_llhs[:, selected] = modelset.expected_log_likelihood(
+                    stats, idxs[selected] - start_idx)
+            start_idx += length
+        return exp_llhs
+
+    def accumulate(self, stats, resps, idxs=None):
+        if is_hard_assignment(resps):
+            return self._accumulate_hard(stats, resps, idxs)
+        acc_stats = {}
+        start_idx = 0
+        for modelset in self.modelsets:
+            length = len(modelset)
+            if idxs is None:
+                modelset_resps = resps[:, start_idx: start_idx + length]
+                acc_stats.update(modelset.accumulate(stats, modelset_resps))
+            else:
+                selected = (idxs >= start_idx) & (idxs < start_idx + length)
+                if selected.any():
+                    acc_stats.update(modelset.accumulate(
+                        stats, resps[:, selected], idxs[selected] - start_idx))
+            start_idx += length
+        return acc_stats
+
+    def _accumulate_hard(self, stats, resps, idxs):
+        # Each model set accumulates the frames assigned to one of its
+        # elements.
+        elements = resps if idxs is None else idxs[resps]
         acc_stats = {}
         start_idx = 0
         for modelset in self.modelsets:
             length = len(modelset)
-            modelset_resps = resps[:, start_idx: start_idx + length]
-            acc_stats.update(modelset.accumulate(stats, modelset_resps))
+            frames = (elements >= start_idx) & (elements < start_idx + length)
+            if frames.any():
+                acc_stats.update(modelset.accumulate(
+                    stats[frames], elements[frames] - start_idx))
             start_idx += length
         return acc_stats
 
@@ -74,6 +112,15 @@ class JointModelSet(BayesianModelSet):
             length += len(model)
         return length
 
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`JointScorer`
+
+        '''
+        return JointScorer([modelset.scorer() for modelset in self.modelsets])
+
 
 class RepeatedModelSet(BayesianModelSet):
     '''Model set where an internal model set is repeated K times. This
@@ -102,12 +149,28 @@ class RepeatedModelSet(BayesianModelSet):
     def sufficient_statistics(self, data):
         return self.modelset.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
+    def expected_log_likelihood(self, stats, idxs=None):
+        if idxs is not None:
+            return self.modelset.expected_log_likelihood(
+                stats, idxs % len(self.modelset))
         llhs = self.modelset.expected_log_likelihood(stats)
         rep_llhs = llhs[:, None, :].repeat(1, self.repeat, 1)
         return rep_llhs.view(len(stats), -1)
 
-    def accumulate(self, stats, resps):
+    def accumulate(self, stats, resps, idxs=None):
+        if is_hard_assignment(resps):
+            elements = resps if idxs is None else idxs[resps]
+            return self.modelset.accumulate(stats,
+                                            elements % len(self.modelset))
+        if idxs is not None:
+            # Several of the selected indices may correspond to the same
+            # element of the internal model set.
+            idxs, inverse = torch.unique(idxs % len(self.modelset),
+                                         return_inverse=True)
+            new_resps = torch.zeros(len(stats), len(idxs), dtype=resps.dtype,
+                                    device=resps.device)
+            new_resps.index_add_(1, inverse, resps)
+            return self.modelset.accumulate(stats, new_resps, idxs)
         new_resps = resps.reshape(len(stats), self.repeat, -1).sum(dim=1)
         return self.modelset.accumulate(stats, new_resps)
 
@@ -121,5 +184,14 @@ class RepeatedModelSet(BayesianModelSet):
     def __len__(self):
         return len(self.modelset) * self.repeat
 
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`RepeatedScorer`
+
+        '''
+        return RepeatedScorer(self.modelset.scorer(), self.repeat)
+
 
 __all__ = ['RepeatedModelSet', 'JointModelSet']
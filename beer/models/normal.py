@@ -228,7 +228,7 @@ class NormalFullCovariance(Normal):
         mean, k, W, dof = mean.view(-1), k.view(-1), W.view(dim, dim), dof.view(-1)
         alpha = 1 + 1/k
 
-        lnorm = .5 * _logdet(W)
+        lnorm = .5 * _logdet(W).view(1)
         lnorm += torch.lgamma(.5 * (dof + 1))
         lnorm -= torch.lgamma(.5 * (dof - dim + 1))
         lnorm -= .5 * dim * torch.log(alpha * math.pi)
@@ -236,7 +236,7 @@ class NormalFullCovariance(Normal):
         quad_mean = (torch.ger(mean, mean).view(-1) * W.view(-1)).sum()
         vec_params = torch.cat([
             2 * W.view(-1),
-            W @ mean,
+            2 * W @ mean,
             2 * quad_mean.view(1)
         ])
         kernel = 1 + stats[:, :-1] @ (-vec_params) / alpha
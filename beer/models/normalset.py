@@ -10,8 +10,9 @@ import math
 import torch
 
 from .bayesmodel import BayesianParameter
-from .bayesmodel import BayesianParameterSet
 from .bayesmodel import BayesianModelSet
+from .parameters import StackedBayesianParameterSet
+from .parameters import _stack_pickled_set
 from .normal import Normal
 from .normal import NormalIsotropicCovariance
 from .normal import NormalDiagonalCovariance
@@ -22,25 +23,77 @@ from ..priors import NormalGammaPrior
 from ..priors import JointNormalGammaPrior
 from ..priors import NormalWishartPrior
 from ..priors import JointNormalWishartPrior
+from ..priors.normalwishart import _logdet
+from ..scorers import normal_set_scorer
+from ..utils import is_hard_assignment, weighted_sum, weighted_outer_sum
 
 
 NormalSetElement = namedtuple('NormalSetElement', ['mean', 'cov'])
 
 
+# Maximum number of precision matrices applied at once by the
+# low-memory full covariance sets (to bound the memory).
+_BLOCK_SIZE = 16
+
+
+def _low_memory_statistics(data):
+    # Sufficient statistics of the full covariance Normal without the
+    # second order terms: [x, -1/2, 1/2]. The quadratic terms are
+    # computed from the data when needed.
+    dtype, device = data.dtype, data.device
+    return torch.cat([
+        data,
+        -.5 * torch.ones(len(data), 1, dtype=dtype, device=device),
+        .5 * torch.ones(len(data), 1, dtype=dtype, device=device),
+    ], dim=-1)
+
+
+def _full_statistics(stats):
+    # Expand the low-memory statistics into the statistics of the
+    # full covariance Normal.
+    data = stats[:, :-2]
+    outer = -.5 * data[:, :, None] * data[:, None, :]
+    return torch.cat([outer.reshape(len(data), -1), stats], dim=-1)
+
+
+def _quadratic_forms(data, precisions):
+    # x_n^T P_k x_n for each frame and each precision matrix.
+    dim = data.shape[1]
+    retval = []
+    for start in range(0, len(precisions), _BLOCK_SIZE):
+        block = precisions[start:start + _BLOCK_SIZE]
+        proj = data @ block.transpose(0, 1).reshape(dim, -1)
+        proj = proj.view(len(data), len(block), dim)
+        retval.append((proj * data[:, None, :]).sum(dim=-1))
+    return torch.cat(retval, dim=-1)
+
+
 class NormalSet(BayesianModelSet, metaclass=abc.ABCMeta):
-    '''Set of Normal models.'''
+    '''Set of Normal models.
+
+    With ``low_memory=True``, the sets with full covariance matrices
+    do not expand the frames into their D x D outer products: the
+    expected log-likelihood is computed with quadratic forms on the
+    data and the second order statistics are accumulated per component
+    as :math:`X^T \\text{diag}(r_k) X`. The memory drops from
+    O(N x D^2) to O(N x D + K x D^2). The option has no effect for the
+    diagonal and isotropic covariance matrices.
+
+    '''
 
     @staticmethod
     def create(mean, cov, size, prior_strength=1, noise_std=1.,
-               cov_type='full', shared_cov=False):
+               cov_type='full', shared_cov=False, low_memory=False):
         if shared_cov:
             return NormalSetSharedCovariance.create(mean, cov, size,
                                                     prior_strength,
-                                                    noise_std, cov_type)
+                                                    noise_std, cov_type,
+                                                    low_memory)
         else:
             return NormalSetNonSharedCovariance.create(mean, cov, size,
                                                        prior_strength,
-                                                       noise_std,cov_type)
+                                                       noise_std, cov_type,
+                                                       low_memory)
 
     @property
     @abc.abstractmethod
@@ -55,6 +108,19 @@ class NormalSet(BayesianModelSet, metaclass=abc.ABCMeta):
     def __len__(self):
         pass
 
+    def _weighted_stats(self, stats, resps, idxs, sum_fn=weighted_sum):
+        # Per-component weighted statistics. When only a subset of the
+        # components is given, the other components have null
+        # statistics.
+        if idxs is not None and is_hard_assignment(resps):
+            resps, idxs = idxs[resps], None
+        w_stats = sum_fn(resps, stats,
+                         len(self) if idxs is None else len(idxs))
+        if idxs is not None:
+            all_w_stats = w_stats.new_zeros(len(self), *w_stats.shape[1:])
+            w_stats = all_w_stats.index_add_(0, idxs, w_stats)
+        return w_stats
+
 
 ########################################################################
 # Normal set with no shared covariance matrix.
@@ -63,7 +129,8 @@ class NormalSet(BayesianModelSet, metaclass=abc.ABCMeta):
 class NormalSetNonSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
 
     @staticmethod
-    def create(mean, cov, size, prior_strength=1, noise_std=1., cov_type='full'):
+    def create(mean, cov, size, prior_strength=1, noise_std=1., cov_type='full',
+               low_memory=False):
         normal = Normal.create(mean, cov, prior_strength, cov_type)
         prior = normal.mean_precision.prior
         posteriors = []
@@ -75,7 +142,7 @@ class NormalSetNonSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
 
         # At this point, we are sure that the cov_type is valid.
         if cov_type == 'full':
-            cls = NormalSetFullCovariance
+            return NormalSetFullCovariance(prior, posteriors, low_memory)
         elif cov_type == 'diagonal':
             cls = NormalSetDiagonalCovariance
         else:
@@ -85,99 +152,230 @@ class NormalSetNonSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
 
     def __init__(self, prior, posteriors):
         super().__init__()
-        self.means_precisions = BayesianParameterSet([
-            BayesianParameter(prior, post)
-            for post in posteriors
-        ])
+        self.means_precisions = StackedBayesianParameterSet(prior, posteriors)
+
+    def __setstate__(self, state):
+        # Sets pickled before the posteriors were stacked.
+        self.__dict__.update(_stack_pickled_set(state, 'means_precisions'))
 
     def __len__(self):
         return len(self.means_precisions)
 
     @property
     def dim(self):
-        return len(self.means_precisions[0].expected_value()[0])
+        means = self.means_precisions.posterior.to_std_parameters()[0]
+        return means.shape[-1]
 
     def mean_field_factorization(self):
-        return [[*self.means_precisions]]
+        return [[self.means_precisions]]
 
-    def expected_log_likelihood(self, stats):
-        nparams = self.means_precisions.expected_natural_parameters()
+    def expected_log_likelihood(self, stats, idxs=None):
+        nparams = self.means_precisions.expected_natural_parameters(idxs)
         return stats @ nparams.t() - .5 * self.dim * math.log(2 * math.pi)
 
-    def marginal_log_likelihood(self, stats):
-        m_llhs = []
-        for model in self.means_precisions:
-            post = mean_precision.posterior
-            m_llhs.append(post.log_norm(post.natural_parameters + stats) \
-                         - post.log_norm())
-        return torch.cat(m_llhs, dim=-1)
+    def _posteriors_std_parameters(self):
+        # Standard parameters of all the posteriors at once (stacked
+        # along the first dimension).
+        return self.means_precisions.posterior.to_std_parameters()
 
-    def accumulate(self, stats, weights):
-        return dict(zip(self.means_precisions, torch.tensor(weights.t() @ stats)))
+    def _marginal_constants(self):
+        # Terms of the marginal log-likelihood which do not depend on
+        # the data. They are reused until the posteriors are updated.
+        return self.derived_cache.get('marginal_constants',
+                                      [self.means_precisions],
+                                      self._compute_marginal_constants)
+
+    def accumulate(self, stats, weights, idxs=None):
+        w_stats = self._weighted_stats(stats, weights, idxs)
+        return {self.means_precisions: torch.tensor(w_stats)}
 
 
 class NormalSetIsotropicCovariance(NormalSetNonSharedCovariance):
     '''Set of Normal models with isotropic covariance matrix.'''
 
     def __getitem__(self, key):
-        mean, precision = self.means_precisions[key].expected_value()
-        dtype, device = precision.dtype, precision.device
-        cov = torch.eye(self.dim, dtype=dtype, device=device) / precision
-        return NormalSetElement(mean=mean, cov=cov)
+        means, precisions = self.means_precisions.expected_value()
+        dtype, device = precisions.dtype, precisions.device
+        cov = torch.eye(self.dim, dtype=dtype, device=device) / precisions[key]
+        return NormalSetElement(mean=means[key], cov=cov)
 
     @staticmethod
     def sufficient_statistics(data):
         return NormalIsotropicCovariance.sufficient_statistics(data)
 
+    def _compute_marginal_constants(self):
+        means, scales, shapes, rates = self._posteriors_std_parameters()
+        scales, shapes, rates = scales.view(-1), shapes.view(-1), \
+                                rates.view(-1)
+        dim = self.dim
+        alphas = 1 + 1 / scales
+        lnorms = torch.lgamma(shapes + .5 * dim) - torch.lgamma(shapes)
+        lnorms -= .5 * dim * (alphas.log() + math.log(2 * math.pi))
+        lnorms -= .5 * dim * rates.log()
+        return means, (means * means).sum(dim=-1), 2 * alphas * rates, \
+               shapes, lnorms
+
     def marginal_log_likelihood(self, stats):
-        m_llhs = []
-        for param in self.means_precisions:
-            cls = NormalIsotropicCovariance
-            c_m_llhs = cls._marginal_log_likelihood(param.posterior, stats)
-            m_llhs.append(c_m_llhs.view(-1, 1))
-        return torch.cat(m_llhs, dim=-1)
+        means, sq_norms, denoms, shapes, lnorms = self._marginal_constants()
+        dim = self.dim
+
+        # Squared distances to the means from the statistics
+        # (-.5 * ||x||^2 is the first statistic).
+        data = stats[:, 1:1 + dim]
+        sq_dists = -2 * stats[:, :1] - 2 * data @ means.t() + sq_norms
+        kernels = 1 + sq_dists.clamp(min=0) / denoms
+        return -(shapes + .5 * dim) * kernels.log() + lnorms
+
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`DiagonalNormalSetScorer`
+
+        '''
+        nparams = self.means_precisions.expected_natural_parameters()
+        consts = -.5 * nparams[:, -2] + .5 * self.dim * nparams[:, -1]
+        return normal_set_scorer(nparams[:, :1], nparams[:, 1:-2], consts,
+                                 diagonal=True)
 
 
 class NormalSetDiagonalCovariance(NormalSetNonSharedCovariance):
     '''Set of Normal models with diagonal covariance matrix.'''
 
     def __getitem__(self, key):
-        mean, precision = self.means_precisions[key].expected_value()
-        cov =  (1. / precision).diag()
-        return NormalSetElement(mean=mean, cov=cov)
+        means, precisions = self.means_precisions.expected_value()
+        cov =  (1. / precisions[key]).diag()
+        return NormalSetElement(mean=means[key], cov=cov)
 
     @staticmethod
     def sufficient_statistics(data):
         return NormalDiagonalCovariance.sufficient_statistics(data)
     
+    def _compute_marginal_constants(self):
+        means, scales, shapes, rates = self._posteriors_std_parameters()
+        scales, shapes = scales.view(-1), shapes.view(-1)
+        dim = self.dim
+        alphas = 1 + 1 / scales
+        lnorms = dim * (torch.lgamma(shapes + .5) - torch.lgamma(shapes))
+        lnorms -= .5 * dim * (alphas.log() + math.log(2 * math.pi))
+        lnorms -= .5 * rates.log().sum(dim=-1)
+        return means, 1 / (2 * alphas[:, None] * rates), shapes, lnorms
+
     def marginal_log_likelihood(self, stats):
-        m_llhs = []
-        for param in self.means_precisions:
-            cls = NormalDiagonalCovariance
-            c_m_llhs = cls._marginal_log_likelihood(param.posterior, stats)
-            m_llhs.append(c_m_llhs.view(-1, 1))
-        return torch.cat(m_llhs, dim=-1)
+        means, inv_denoms, shapes, lnorms = self._marginal_constants()
+        dim = self.dim
+
+        # The kernel does not factorize over the dimensions: the
+        # components are processed by blocks to bound the memory.
+        data = stats[:, dim: 2 * dim]
+        log_kernels = []
+        for start in range(0, len(means), _BLOCK_SIZE):
+            end = start + _BLOCK_SIZE
+            kernels = (data[:, None, :] - means[start:end]).pow_(2)
+            kernels.mul_(inv_denoms[start:end]).log1p_()
+            log_kernels.append(kernels.sum(dim=-1))
+        return -(shapes + .5) * torch.cat(log_kernels, dim=-1) + lnorms
+
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`DiagonalNormalSetScorer`
+
+        '''
+        nparams = self.means_precisions.expected_natural_parameters()
+        consts = -.5 * nparams[:, -2] + .5 * nparams[:, -1]
+        return normal_set_scorer(nparams[:, :self.dim],
+                                 nparams[:, self.dim:-2], consts,
+                                 diagonal=True)
 
 
 class NormalSetFullCovariance(NormalSetNonSharedCovariance):
     '''Set of Normal models with full covariance matrix.'''
 
+    def __init__(self, prior, posteriors, low_memory=False):
+        super().__init__(prior, posteriors)
+        self.low_memory = low_memory
+
+    def __setstate__(self, state):
+        # Sets pickled before the low-memory option was added.
+        state.setdefault('low_memory', False)
+        super().__setstate__(state)
+
     def __getitem__(self, key):
-        mean, precision = self.means_precisions[key].expected_value()
-        cov =  precision.inverse()
-        return NormalSetElement(mean=mean, cov=cov)
+        means, precisions = self.means_precisions.expected_value()
+        cov =  precisions[key].inverse()
+        return NormalSetElement(mean=means[key], cov=cov)
 
-    @staticmethod
-    def sufficient_statistics(data):
+    def sufficient_statistics(self, data):
+        if self.low_memory:
+            return _low_memory_statistics(data)
         return NormalFullCovariance.sufficient_statistics(data)
 
+    def expected_log_likelihood(self, stats, idxs=None):
+        if not self.low_memory:
+            return super().expected_log_likelihood(stats, idxs)
+        nparams = self.means_precisions.expected_natural_parameters(idxs)
+        precisions = nparams[:, :self.dim ** 2].reshape(-1, self.dim,
+                                                         self.dim)
+        exp_llhs = -.5 * _quadratic_forms(stats[:, :-2], precisions)
+        exp_llhs += stats @ nparams[:, self.dim ** 2:].t()
+        return exp_llhs - .5 * self.dim * math.log(2 * math.pi)
+
+    def _compute_marginal_constants(self):
+        means, scales, mean_precisions, dofs = \
+            self._posteriors_std_parameters()
+        scales, dofs = scales.view(-1), dofs.view(-1)
+        dim = self.dim
+        alphas = 1 + 1 / scales
+        lnorms = .5 * _logdet(mean_precisions).view(-1)
+        lnorms += torch.lgamma(.5 * (dofs + 1))
+        lnorms -= torch.lgamma(.5 * (dofs - dim + 1))
+        lnorms -= .5 * dim * torch.log(alphas * math.pi)
+        prec_means = (mean_precisions @ means[:, :, None])[:, :, 0]
+        quad_means = (prec_means * means).sum(dim=-1)
+        return mean_precisions, prec_means, quad_means, alphas, dofs, lnorms
+
     def marginal_log_likelihood(self, stats):
-        m_llhs = []
-        for param in self.means_precisions:
-            cls = NormalFullCovariance
-            c_m_llhs = cls._marginal_log_likelihood(param.posterior, stats)
-            m_llhs.append(c_m_llhs.view(-1, 1))
-        return torch.cat(m_llhs, dim=-1)
+        mean_precisions, prec_means, quad_means, alphas, dofs, lnorms = \
+            self._marginal_constants()
+        dim = self.dim
+
+        # (x - m_k)^T W_k (x - m_k) for all the frames and components.
+        if self.low_memory:
+            data = stats[:, :-2]
+            quad_data = _quadratic_forms(data, mean_precisions)
+        else:
+            data = stats[:, dim ** 2: dim ** 2 + dim]
+            quad_data = -2 * stats[:, :dim ** 2] \
+                        @ mean_precisions.reshape(len(self), -1).t()
+        quad = quad_data - 2 * data @ prec_means.t() + quad_means
+        kernels = 1 + quad.clamp(min=0) / alphas
+        return -.5 * (dofs + 1) * kernels.log() + lnorms
+
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`FullNormalSetScorer`
+
+        '''
+        nparams = self.means_precisions.expected_natural_parameters()
+        precisions = nparams[:, :self.dim ** 2].reshape(-1, self.dim,
+                                                         self.dim)
+        consts = -.5 * nparams[:, -2] + .5 * nparams[:, -1]
+        return normal_set_scorer(precisions, nparams[:, self.dim ** 2:-2],
+                                 consts, diagonal=False)
+
+    def accumulate(self, stats, weights, idxs=None):
+        if not self.low_memory:
+            return super().accumulate(stats, weights, idxs)
+        w_stats = self._weighted_stats(stats, weights, idxs)
+        w_outer = self._weighted_stats(stats[:, :-2], weights, idxs,
+                                       weighted_outer_sum)
+        w_stats = torch.cat([-.5 * w_outer.reshape(len(self), -1),
+                             w_stats], dim=-1)
+        return {self.means_precisions: torch.tensor(w_stats)}
 
 
 ########################################################################
@@ -187,7 +385,8 @@ class NormalSetFullCovariance(NormalSetNonSharedCovariance):
 class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
 
     @staticmethod
-    def create(mean, cov, size, prior_strength=1, noise_std=1., cov_type='full'):
+    def create(mean, cov, size, prior_strength=1, noise_std=1., cov_type='full',
+               low_memory=False):
         # Ensure the covariance is full.
         if len(cov.shape) == 1:
             if cov.shape[0] == 1:
@@ -201,7 +400,7 @@ class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
         if cov_type == 'full':
             return NormalSetSharedFullCovariance.create(mean, full_cov, size,
                                                         prior_strength,
-                                                        noise_std)
+                                                        noise_std, low_memory)
         elif cov_type == 'diagonal':
             return NormalSetSharedDiagonalCovariance.create(mean, full_cov, size,
                                                             prior_strength,
@@ -230,7 +429,17 @@ class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
     def mean_field_factorization(self):
         return [[self.means_precision]]
 
-    def marginal_log_likelihood(self, stats):
+    def _expected_natural_parameters(self):
+        # Expected natural parameters split into the shared and the
+        # per-component parts. They are reused until the posterior is
+        # updated.
+        return self.derived_cache.get(
+            'nparams', [self.means_precision],
+            lambda: self._split_natural_parameters(
+                self.means_precision.expected_natural_parameters())
+        )
+
+    def _compute_marginal_constants(self):
         joint_nparams = self.means_precision.posterior.natural_parameters
         np1, np2 = self._split_natural_parameters(joint_nparams)
         np1 = torch.ones(len(np2), 1, dtype=np1.dtype,
@@ -240,6 +449,13 @@ class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
             np2,
             np1[:, -1].view(-1, 1)
         ], dim=1)[None]
+        post = self.means_precision.posterior
+        return nparams1, post.joint_log_norm(nparams1)
+
+    def marginal_log_likelihood(self, stats):
+        nparams1, log_norms1 = self.derived_cache.get(
+            'marginal_constants', [self.means_precision],
+            self._compute_marginal_constants)
 
         new_stats = torch.cat([
             stats[:, :int(self.dim ** 2)],
@@ -248,7 +464,7 @@ class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
         ], dim=-1)
         nparams2 = new_stats[:, None, :] + nparams1
         post = self.means_precision.posterior
-        return post.joint_log_norm(nparams2) - post.joint_log_norm(nparams1)
+        return post.joint_log_norm(nparams2) - log_norms1
 
 
 class NormalSetSharedIsotropicCovariance(NormalSetSharedCovariance):
@@ -290,10 +506,11 @@ class NormalSetSharedIsotropicCovariance(NormalSetSharedCovariance):
     def sufficient_statistics(data):
         return NormalIsotropicCovariance.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
+    def expected_log_likelihood(self, stats, idxs=None):
         stats1, stats2 = stats[:, (0, -1)], stats[:, 1:-1]
-        nparams = self.means_precision.expected_natural_parameters()
-        nparams1, nparams2 = self._split_natural_parameters(nparams)
+        nparams1, nparams2 = self._expected_natural_parameters()
+        if idxs is not None:
+            nparams2 = nparams2[idxs]
         exp_llhs = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
         exp_llhs -= .5 * self.dim * math.log(2 * math.pi)
         return exp_llhs
@@ -306,9 +523,20 @@ class NormalSetSharedIsotropicCovariance(NormalSetSharedCovariance):
                          - post.log_norm())
         return torch.cat(m_llhs, dim=-1)
 
-    def accumulate(self, stats, resps):
-        dtype, device = stats.dtype, stats.device
-        w_stats = resps.t() @ stats
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`DiagonalNormalSetScorer`
+
+        '''
+        nparams1, nparams2 = self._expected_natural_parameters()
+        consts = -.5 * nparams2[:, -1] + .5 * self.dim * nparams1[-1]
+        return normal_set_scorer(nparams1[:1], nparams2[:, :-1], consts,
+                                 diagonal=True)
+
+    def accumulate(self, stats, resps, idxs=None):
+        w_stats = self._weighted_stats(stats, resps, idxs)
         acc_stats = torch.cat([
             w_stats[:, 0].sum().view(1),
             w_stats[:, 1: 1 + self.dim].contiguous().view(-1),
@@ -360,16 +588,29 @@ class NormalSetSharedDiagonalCovariance(NormalSetSharedCovariance):
     def sufficient_statistics(data):
         return NormalDiagonalCovariance.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
+    def expected_log_likelihood(self, stats, idxs=None):
         stats1, stats2 = self._split_stats(stats)
-        nparams = self.means_precision.expected_natural_parameters()
-        nparams1, nparams2 = self._split_natural_parameters(nparams)
+        nparams1, nparams2 = self._expected_natural_parameters()
+        if idxs is not None:
+            nparams2 = nparams2[idxs]
         exp_llhs = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
         exp_llhs -= .5 * self.dim * math.log(2 * math.pi)
         return exp_llhs
 
-    def accumulate(self, stats, resps):
-        w_stats = resps.t() @ stats
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`DiagonalNormalSetScorer`
+
+        '''
+        nparams1, nparams2 = self._expected_natural_parameters()
+        consts = -.5 * nparams2[:, -1] + .5 * nparams1[-1]
+        return normal_set_scorer(nparams1[:-1], nparams2[:, :-1], consts,
+                                 diagonal=True)
+
+    def accumulate(self, stats, resps, idxs=None):
+        w_stats = self._weighted_stats(stats, resps, idxs)
         acc_stats = torch.cat([
             w_stats[:, :self.dim].sum(dim=0),
             w_stats[:, self.dim: 2 * self.dim].contiguous().view(-1),
@@ -383,7 +624,8 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
     '''Set of Normal density models with a  shared covariance matrix.'''
 
     @classmethod
-    def create(cls, mean, cov, size, prior_strength=1, noise_std=1.):
+    def create(cls, mean, cov, size, prior_strength=1, noise_std=1.,
+               low_memory=False):
         dtype, device = mean.dtype, mean.device
         scales = torch.ones(size, dtype=dtype, device=device)
         scales *= prior_strength
@@ -397,7 +639,16 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
                                                 device=device)
         prior = JointNormalWishartPrior(p_means, scales, scale_matrix, dof)
         posterior = JointNormalWishartPrior(means, scales, scale_matrix, dof)
-        return cls(prior, posterior)
+        return cls(prior, posterior, low_memory)
+
+    def __init__(self, prior, posterior, low_memory=False):
+        super().__init__(prior, posterior)
+        self.low_memory = low_memory
+
+    def __setstate__(self, state):
+        # Sets pickled before the low-memory option was added.
+        state.setdefault('low_memory', False)
+        self.__dict__.update(state)
 
     def __getitem__(self, key):
         means, precision = self.means_precision.expected_value()
@@ -419,20 +670,49 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
         ], dim=-1)
         return nparams1, nparams2
 
-    @staticmethod
-    def sufficient_statistics(data):
+    def sufficient_statistics(self, data):
+        if self.low_memory:
+            return _low_memory_statistics(data)
         return NormalFullCovariance.sufficient_statistics(data)
 
-    def expected_log_likelihood(self, stats):
-        stats1, stats2 = self._split_stats(stats)
-        nparams = self.means_precision.expected_natural_parameters()
-        nparams1, nparams2 = self._split_natural_parameters(nparams)
-        exp_llhs = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
+    def expected_log_likelihood(self, stats, idxs=None):
+        nparams1, nparams2 = self._expected_natural_parameters()
+        if idxs is not None:
+            nparams2 = nparams2[idxs]
+        if self.low_memory:
+            precision = nparams1[:-1].reshape(self.dim, self.dim)
+            data = stats[:, :-2]
+            llhs1 = -.5 * ((data @ precision) * data).sum(dim=-1)
+            llhs1 += stats[:, -1] * nparams1[-1]
+            exp_llhs = llhs1[:, None] + stats[:, :-1] @ nparams2.t()
+        else:
+            stats1, stats2 = self._split_stats(stats)
+            exp_llhs = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
         exp_llhs -= .5 * self.dim * math.log(2 * math.pi)
         return exp_llhs
 
-    def accumulate(self, stats, resps):
-        w_stats = resps.t() @ stats
+    def marginal_log_likelihood(self, stats):
+        if self.low_memory:
+            stats = _full_statistics(stats)
+        return super().marginal_log_likelihood(stats)
+
+    def scorer(self):
+        '''Frozen scorer of the set (for decoding).
+
+        Returns:
+            :any:`FullNormalSetScorer`
+
+        '''
+        nparams1, nparams2 = self._expected_natural_parameters()
+        precisions = nparams1[:-1].reshape(self.dim, self.dim)
+        consts = -.5 * nparams2[:, -1] + .5 * nparams1[-1]
+        return normal_set_scorer(precisions, nparams2[:, :-1], consts,
+                                 diagonal=False)
+
+    def accumulate(self, stats, resps, idxs=None):
+        if self.low_memory:
+            return self._accumulate_low_memory(stats, resps, idxs)
+        w_stats = self._weighted_stats(stats, resps, idxs)
         acc_stats = torch.cat([
             w_stats[:, :self.dim**2].sum(dim=0),
             w_stats[:, self.dim**2: self.dim + (self.dim**2)].contiguous().view(-1),
@@ -441,5 +721,21 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
         ], dim=0)
         return {self.means_precision: torch.tensor(acc_stats)}
 
+    def _accumulate_low_memory(self, stats, resps, idxs):
+        w_stats = self._weighted_stats(stats, resps, idxs)
+
+        # The second order statistics of the shared precision matrix
+        # are weighted by the total responsibility of each frame.
+        data = stats[:, :-2]
+        if not is_hard_assignment(resps):
+            data = data * resps.sum(dim=-1)[:, None]
+        acc_stats = torch.cat([
+            -.5 * (data.t() @ stats[:, :-2]).view(-1),
+            w_stats[:, :self.dim].contiguous().view(-1),
+            w_stats[:, -2].view(-1),
+            w_stats[:, -1].sum().view(1)
+        ], dim=0)
+        return {self.means_precision: torch.tensor(acc_stats)}
+
 
 __all__ = ['NormalSet']
@@ -1,6 +1,7 @@
 
 '''Implementation of the models\' parameters.'''
 
+import copy
 import uuid
 import torch
 from ..priors import ExpFamilyPrior
@@ -86,6 +87,12 @@ class BayesianParameter:
     def __eq__(self, other):
         return hash(self) == hash(other)
 
+    @property
+    def version(self):
+        '''tuple: Version of the parameter. It changes every time the
+        prior or the posterior of the parameter is updated.'''
+        return (self.prior.version, self.posterior.version)
+
     def _dispatch(self):
         for callback in self._callbacks:
             callback()
@@ -173,6 +180,62 @@ class BayesianParameter:
         self.stats = self.stats.to(device)
 
 
+class VersionedCache:
+    '''Cache of quantities derived from Bayesian parameters (stacked
+    natural parameters, log-weights, constants of the
+    log-likelihood, ...). An entry is reused as long as the versions
+    of the parameters it was computed from are unchanged, i.e. until
+    the next update of the parameters.
+
+    Attributes:
+        hits (int): Number of values found in the cache.
+        misses (int): Number of values (re-)computed.
+
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # The cached values are not pickled.
+        return {'_entries': {}, 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, key, parameters, func):
+        '''Value of the cache or computed value.
+
+        Args:
+            key (object): Name of the quantity.
+            parameters (list): :any:`BayesianParameter` from which the
+                quantity is derived.
+            func (function): Function (without argument) to compute
+                the quantity.
+
+        Returns:
+            object: Value of the quantity.
+        '''
+        versions = tuple(param.version for param in parameters)
+        entry = self._entries.get(key, None)
+        if entry is not None and entry[0] == versions:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = func()
+        self._entries[key] = (versions, value)
+        return value
+
+    def clear(self):
+        'Remove all the values of the cache.'
+        self._entries = {}
+
+    def reset_counters(self):
+        'Set the number of hits/misses to zero.'
+        self.hits, self.misses = 0, 0
+
+
 class BayesianParameterSet:
     '''Set of Bayesian parameters.'''
 
@@ -185,16 +248,41 @@ class BayesianParameterSet:
     def __getitem__(self, key):
         return self.__parameters[key]
 
-    def expected_natural_parameters(self):
+    @property
+    def version(self):
+        'tuple: Versions of the parameters of the set.'
+        return tuple(param.version for param in self.__parameters)
+
+    @property
+    def derived_cache(self):
+        ':any:`VersionedCache` of the stacked natural parameters.'
+        try:
+            return self._derived_cache
+        except AttributeError:
+            # Sets pickled before the cache was added.
+            self._derived_cache = VersionedCache()
+            return self._derived_cache
+
+    def expected_natural_parameters(self, idxs=None):
         '''Expected value of the natural form of the parameters w.r.t.
         their posterior distribution.
 
+        Args:
+            idxs (``torch.LongTensor``): Indices of the parameters to
+                select. If None, all the parameters are selected.
+
         Returns:
             ``torch.Tensor[k,dim`` where k is the number of elements of
-                the set.
+                the set (or of selected parameters).
         '''
-        return torch.cat([param.expected_natural_parameters().view(1, -1)
-                          for param in self.__parameters], dim=0)
+        nparams = self.derived_cache.get(
+            'nparams', [self],
+            lambda: torch.cat([param.expected_natural_parameters().view(1, -1)
+                               for param in self.__parameters], dim=0)
+        )
+        if idxs is not None:
+            nparams = nparams[idxs]
+        return nparams
 
     def float_(self):
         '''Convert value of the parameter to float precision in-place.'''
@@ -219,8 +307,273 @@ class BayesianParameterSet:
             param.to_(device)
 
 
+class _StackedElement(BayesianParameter):
+    # Read-only element of a StackedBayesianParameterSet: the natural
+    # parameters of its prior and posterior are views of the ones of
+    # the set.
+
+    def __init__(self, prior, posterior):
+        super().__init__(prior, posterior)
+        prior._read_only = posterior._read_only = True
+        self._read_only = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_read_only', False):
+            raise AttributeError('element of a stacked set of parameters '
+                                 'is read-only')
+        super().__setattr__(name, value)
+
+
+def _stack_pickled_set(state, name):
+    # State of a model pickled before the parameter set "name" was
+    # stored as a StackedBayesianParameterSet.
+    paramset = state.get(name, None)
+    if isinstance(paramset, BayesianParameterSet):
+        stacked = StackedBayesianParameterSet.from_parameters(paramset)
+        state[name] = stacked
+        state['_bayesian_parameters'][name] = stacked
+    return state
+
+
+def _stack_priors(priors):
+    'Batched prior from a list of priors of the same type.'
+    retval = copy.copy(priors[0])
+    retval.natural_parameters = torch.stack([
+        prior.natural_parameters for prior in priors
+    ])
+    return retval
+
+
+class StackedBayesianParameterSet(BayesianParameter):
+    '''Set of Bayesian parameters whose posteriors are stored in a
+    single K x P tensor of natural parameters.
+
+    The set behaves as a single :any:`BayesianParameter`: the
+    accumulated statistics, the natural gradient update and the KL
+    divergence are computed for all the elements at once.
+
+    Note:
+        Contrary to :any:`BayesianParameterSet`, indexing the set
+        returns a read-only :any:`BayesianParameter`: the natural
+        parameters of its prior and posterior are views of the ones of
+        the set and assigning them (or the attributes of the
+        parameter) raises an ``AttributeError``. To modify the set,
+        update ``set.posterior.natural_parameters``. Copies of the
+        prior and the posterior of an element can be modified.
+
+    Attributes:
+        prior (:any:`beer.ExpFamilyPrior`): Prior distribution shared
+            by all the elements or batched prior (K x P natural
+            parameters) with one prior per element.
+        posterior (:any:`beer.ExpFamilyPrior`): Posterior distributions
+            of all the elements (K x P natural parameters).
+        stats (``torch.Tensor[K, P]``): Accumulated statistics.
+
+    '''
+    __repr_str = 'StackedBayesianParameterSet(prior={prior}, size={size})'
+
+    def __init__(self, prior, posteriors):
+        '''
+        Args:
+            prior (:any:`beer.ExpFamilyPrior` or list): Prior shared by
+                all the elements or list of priors (one per element).
+            posteriors (list of :any:`beer.ExpFamilyPrior`): Posterior
+                of each element (same type as the prior).
+        '''
+        if isinstance(prior, (list, tuple)):
+            prior = _stack_priors(prior)
+        posterior = _stack_priors(posteriors)
+        super().__init__(prior, posterior)
+        self.stats = torch.zeros_like(posterior.natural_parameters)
+
+    def __repr__(self):
+        return self.__repr_str.format(prior=self.prior, size=len(self))
+
+    @classmethod
+    def from_parameters(cls, parameters):
+        '''Create a stacked set from a list of parameters.
+
+        Args:
+            parameters (list): :any:`BayesianParameter` (e.g. a
+                :any:`BayesianParameterSet`) whose priors and
+                posteriors have the same type and shape.
+
+        Returns:
+            :any:`StackedBayesianParameterSet`
+        '''
+        parameters = list(parameters)
+        priors = [param.prior for param in parameters]
+        prior = priors[0]
+        if any(other is not prior for other in priors):
+            prior = priors
+        return cls(prior, [param.posterior for param in parameters])
+
+    def __len__(self):
+        return len(self.posterior.natural_parameters)
+
+    def __getitem__(self, key):
+        prior = copy.copy(self.prior)
+        if prior.natural_parameters.dim() > 1:
+            prior.natural_parameters = self.prior.natural_parameters[key]
+        posterior = copy.copy(self.posterior)
+        posterior.natural_parameters = self.posterior.natural_parameters[key]
+        return _StackedElement(prior, posterior)
+
+    def expected_natural_parameters(self, idxs=None):
+        '''Expected value of the natural form of the parameters w.r.t.
+        their posterior distribution.
+
+        Args:
+            idxs (``torch.LongTensor``): Indices of the parameters to
+                select. If None, all the parameters are selected.
+
+        Returns:
+            ``torch.Tensor[k,dim]`` where k is the number of elements of
+                the set (or of selected parameters).
+        '''
+        nparams = self.posterior.expected_sufficient_statistics()
+        if idxs is not None:
+            nparams = nparams[idxs]
+        return nparams
+
+    def kl_divs(self):
+        '''KL divergence posterior/prior of each element of the set.
+
+        Returns:
+            ``torch.Tensor[K]``
+        '''
+        return ExpFamilyPrior.kl_div(self.posterior, self.prior)
+
+    def kl_div(self):
+        '''Sum of the KL divergences posterior/prior of the elements of
+        the set.'''
+        return self.kl_divs().sum()
+
+
+class BayesianParameterArena:
+    '''Flat buffers holding the natural parameters of the posteriors,
+    the natural parameters of the priors and the accumulated
+    statistics of a group of Bayesian parameters.
+
+    The posteriors and the statistics of the parameters are views of
+    the buffers so that the natural gradient update of the whole
+    group is a single in-place operation. The priors are copied (a
+    prior shared by the elements of a
+    :any:`StackedBayesianParameterSet` is broadcast to all the
+    elements). The in-place update increments the version counter of
+    the posteriors which invalidates their cache.
+
+    If the posterior, the prior or the statistics of a parameter is
+    replaced by another tensor (e.g. when storing the statistics of
+    the ELBO), it is copied back to the buffers before the update.
+
+    Attributes:
+        posteriors (``torch.Tensor[N]``): Natural parameters of the
+            posteriors.
+        priors (``torch.Tensor[N]``): Natural parameters of the
+            priors.
+        stats (``torch.Tensor[N]``): Accumulated statistics.
+
+    '''
+
+    def __init__(self, parameters):
+        '''
+        Args:
+            parameters (list of :any:`BayesianParameter`): Parameters
+                of the arena. They should have the same type and
+                device.
+        '''
+        self.parameters = list(parameters)
+        self._build()
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def _build(self):
+        tensors = [param.posterior.natural_parameters
+                   for param in self.parameters]
+        if len(set((tensor.dtype, tensor.device) for tensor in tensors)) > 1:
+            raise ValueError('the parameters of an arena should have the '
+                             'same type and device')
+        self.posteriors = torch.cat([tensor.reshape(-1) for tensor in tensors])
+        self.priors = torch.zeros_like(self.posteriors)
+        self.stats = torch.zeros_like(self.posteriors)
+        self._views, offset = [], 0
+        for tensor in tensors:
+            self._views.append(slice(offset, offset + tensor.numel()))
+            offset += tensor.numel()
+        self._posterior_refs = [None] * len(self.parameters)
+        self._prior_refs = [None] * len(self.parameters)
+        self._stats_views = [None] * len(self.parameters)
+        for idx, param in enumerate(self.parameters):
+            shape = param.posterior.natural_parameters.shape
+            self._stats_views[idx] = self.stats[self._views[idx]].view(shape)
+            self._sync_prior(idx, param)
+            self._sync_posterior(idx, param)
+            self._sync_stats(idx, param)
+
+    def _sync_prior(self, idx, param):
+        prior = param.prior.natural_parameters
+        if prior is not self._prior_refs[idx]:
+            view = self.priors[self._views[idx]].view(
+                param.posterior.natural_parameters.shape)
+            view.copy_(prior.expand_as(view))
+            self._prior_refs[idx] = prior
+
+    def _sync_posterior(self, idx, param):
+        posterior = param.posterior.natural_parameters
+        if posterior is not self._posterior_refs[idx]:
+            view = self.posteriors[self._views[idx]].view(posterior.shape)
+            if posterior.data_ptr() != view.data_ptr():
+                view.copy_(posterior)
+            param.posterior.natural_parameters = view
+            self._posterior_refs[idx] = param.posterior.natural_parameters
+
+    def _sync_stats(self, idx, param):
+        view = self._stats_views[idx]
+        if param.stats is not view:
+            view.copy_(param.stats)
+            param.stats = view
+
+    def _sync(self):
+        'Copy the tensors replaced since the last update to the buffers.'
+        for idx, param in enumerate(self.parameters):
+            posterior = param.posterior.natural_parameters
+            if posterior.dtype != self.posteriors.dtype or \
+               posterior.device != self.posteriors.device:
+                # The type or the device of the model has changed.
+                self._build()
+                return
+            self._sync_prior(idx, param)
+            self._sync_posterior(idx, param)
+            self._sync_stats(idx, param)
+
+    def zero_stats(self):
+        'Set the statistics of all the parameters to zero.'
+        for idx, param in enumerate(self.parameters):
+            param.stats = self._stats_views[idx]
+        self.stats.zero_()
+
+    def natural_grad_update(self, lrate):
+        '''Natural gradient update of all the parameters of the arena.
+
+        Args:
+            lrate (float): Learning rate.
+        '''
+        self._sync()
+        grad = self.priors + self.stats - self.posteriors
+        self.posteriors.add_(grad, alpha=lrate)
+        # Notify the observers the parameters has changed.
+        for param in self.parameters:
+            if param._callbacks:
+                param._dispatch()
+
+
 __all__ = [
     'ConstantParameter',
     'BayesianParameter',
-    'BayesianParameterSet'
+    'BayesianParameterSet',
+    'StackedBayesianParameterSet',
+    'BayesianParameterArena',
+    'VersionedCache'
 ]
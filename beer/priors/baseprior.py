@@ -2,18 +2,41 @@
 distribution.'''
 
 import abc
+import itertools
 import torch
 import torch.autograd as ta
 
 
+# Identifier of each assignment of natural parameters (see
+# :any:`ExpFamilyPrior.version`).
+_ASSIGNMENTS = itertools.count()
+
+
 def _bregman_divergence(f_val1, f_val2, grad_f_val2, val1, val2):
-    return f_val1 - f_val2 - torch.sum(grad_f_val2 * (val1 - val2))
+    return f_val1 - f_val2 - torch.sum(grad_f_val2 * (val1 - val2), dim=-1)
+
+
+def _batch_scalar(value, batch_shape):
+    '''Reshape a scalar parameter to ``batch_shape x 1``. The value is
+    either a single scalar (broadcasted to the whole batch) or has one
+    element per item of the batch.'''
+    if value.numel() == 1:
+        return value.reshape([1] * (len(batch_shape) + 1)).expand(
+            *batch_shape, 1)
+    return value.reshape(*batch_shape, 1)
 
 
 class ExpFamilyPrior(metaclass=abc.ABCMeta):
     '''Abstract base class for (conjugate) priors from the exponential
     family of distribution.
 
+    The natural parameters may have arbitrary leading (batch)
+    dimensions, i.e. ``torch.Tensor[..., P]``. All the methods (
+    conversion to/from the standard parameters, log-normalizer,
+    expected sufficient statistics and KL divergence) are then
+    evaluated for every item of the batch at once and keep the leading
+    dimensions.
+
     '''
     __repr_str = '{classname}(natural_params={nparams})'
 
@@ -26,7 +49,8 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
             model2 (:any:`beer.ExpFamilyPrior`): Second model.
 
         Returns
-            float: Value of te KL. divergence between these two models.
+            ``torch.Tensor[...]``: Value of the KL. divergence between
+                these two models (for each item of the batch).
 
         '''
         return _bregman_divergence(
@@ -45,8 +69,24 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
                 the distribution.
         '''
         self._natural_params = natural_parameters.detach()
+        self._assignment = next(_ASSIGNMENTS)
         self.cache = {}
 
+    def __setstate__(self, state):
+        # The state is the "__dict__" of the original object for a
+        # shallow copy: it is not modified.
+        state = dict(state)
+
+        # Models pickled before the cache was versioned.
+        cache = state.pop('cache', None)
+        state.setdefault('_assignment', next(_ASSIGNMENTS))
+
+        # The copies of a read-only prior can be modified.
+        state.pop('_read_only', None)
+        self.__dict__.update(state)
+        if cache is not None:
+            self.cache = cache
+
     def __repr__(self):
         return self.__repr_str.format(
             classname=self.__class__.__name__,
@@ -65,6 +105,30 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
         self.natural_parameters = self.natural_parameters.to(device)
         return self
 
+    @property
+    def version(self):
+        '''tuple: Version of the natural parameters. It changes every
+        time the natural parameters are assigned or updated in place
+        (e.g. by a :any:`BayesianParameterArena`). Each assignment
+        has a process-wide unique identifier so that two priors with
+        distinct natural parameters never share a version.
+        '''
+        return (self._assignment, self._natural_params._version)
+
+    @property
+    def cache(self):
+        '''dict: Quantities derived from the natural parameters (only
+        valid for the version they were computed from).
+        '''
+        if self.version != self._cache_version:
+            self.cache = {}
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        self._cache = value
+        self._cache_version = self.version
+
     @property
     def natural_parameters(self):
         '``torch.Tensor``: Natural parameters.'
@@ -72,7 +136,10 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
 
     @natural_parameters.setter
     def natural_parameters(self, value):
+        if getattr(self, '_read_only', False):
+            raise AttributeError('the natural parameters are read-only')
         self._natural_params = value.detach()
+        self._assignment = next(_ASSIGNMENTS)
         self.cache = {}
 
     def _to_std_parameters(self, natural_parameters=None):
@@ -115,17 +182,29 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
             self.cache['exp_stats'] = exp_stats
         return exp_stats
 
+    def _expected_value(self):
+        # Generic fallback: gradient of the log-normalizer, i.e. the
+        # expected value of the sufficient statistics. Subclasses
+        # should provide the closed-form expression.
+        copied_tensor = self.natural_parameters.clone().requires_grad_(True)
+        log_norm = self.log_norm(copied_tensor)
+        ta.backward(log_norm.sum())
+        return copied_tensor.grad.detach()
+
     def expected_value(self):
         '''Mean value of the random variable w.r.t. to the distribution.
 
+        The value is cached until the natural parameters change.
+
         Returns:
             ``torch.Tensor``
         '''
-        copied_tensor = torch.tensor(self.natural_parameters,
-                                     requires_grad=True)
-        log_norm = self.log_norm(copied_tensor)
-        ta.backward(log_norm)
-        return copied_tensor.grad.detach()
+        try:
+            exp_value = self.cache['exp_value']
+        except KeyError:
+            exp_value = self._expected_value()
+            self.cache['exp_value'] = exp_value
+        return exp_value
 
     @abc.abstractmethod
     def _log_norm(self, natural_parameters=None):
@@ -144,7 +223,8 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
              the given natural parameters.
 
         Returns:
-            ``torch.Tensor[1]`` : Log-normalization value.
+            ``torch.Tensor[...]`` : Log-normalization value (for each
+                item of the batch).
 
         '''
         if natural_parameters is not None:
@@ -31,9 +31,9 @@ class DirichletPrior(ExpFamilyPrior):
             alphas=alphas
         )
 
-    def expected_value(self):
-        alphas = self.to_std_parameters(self.natural_parameters)
-        return alphas / alphas.sum()
+    def _expected_value(self):
+        alphas = self.to_std_parameters()
+        return alphas / alphas.sum(dim=-1, keepdim=True)
 
     def to_natural_parameters(self, std_parameters=None):
         if std_parameters is None:
@@ -46,14 +46,16 @@ class DirichletPrior(ExpFamilyPrior):
         return (natural_parameters + 1)
 
     def _expected_sufficient_statistics(self):
-        alphas = self.to_std_parameters(self.natural_parameters)
-        return (torch.digamma(alphas) - torch.digamma(alphas.sum()))
+        alphas = self.to_std_parameters()
+        return torch.digamma(alphas) \
+            - torch.digamma(alphas.sum(dim=-1, keepdim=True))
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         alphas = self.to_std_parameters(natural_parameters)
-        return torch.lgamma(alphas).sum() - torch.lgamma(alphas.sum())
+        return torch.lgamma(alphas).sum(dim=-1) \
+            - torch.lgamma(alphas.sum(dim=-1))
 
 
 __all__ = ['DirichletPrior']
@@ -27,27 +27,30 @@ class GammaPrior(ExpFamilyPrior):
         super().__init__(nparams)
 
     def __repr__(self):
-        shape, rate = self.to_std_parameters(self.natural_parameters)
+        shape, rate = self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             shape=repr(shape), rate=repr(rate)
         )
 
-    def expected_value(self):
-        shape, rate = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        shape, rate = self.to_std_parameters()
         return shape / rate
 
     def to_natural_parameters(self, shape, rate):
-        return torch.cat([-rate.view(1), (shape - 1).view(1)])
+        return torch.stack(torch.broadcast_tensors(-rate, shape - 1), dim=-1)
 
-    def _to_std_parameters(self, natural_parameters):
-        shape, rate = natural_parameters[1] + 1, -natural_parameters[0]
-        return  shape, rate
+    def _to_std_parameters(self, natural_parameters=None):
+        if natural_parameters is None:
+            natural_parameters = self.natural_parameters
+        shape = natural_parameters[..., 1] + 1
+        rate = -natural_parameters[..., 0]
+        return shape, rate
 
     def _expected_sufficient_statistics(self):
-        shape, rate = self.to_std_parameters(self.natural_parameters)
-        return torch.cat([(shape / rate).view(1),
-                          (torch.digamma(shape) - torch.log(rate)).view(1)])
+        shape, rate = self.to_std_parameters()
+        return torch.stack([shape / rate,
+                            torch.digamma(shape) - torch.log(rate)], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -1,7 +1,7 @@
 '''Implementation of the isotropic Normal-Gamma distribution.'''
 
 import torch
-from .baseprior import ExpFamilyPrior
+from .baseprior import ExpFamilyPrior, _batch_scalar
 
 
 class IsotropicNormalGammaPrior(ExpFamilyPrior):
@@ -53,12 +53,12 @@ class IsotropicNormalGammaPrior(ExpFamilyPrior):
 
     @property
     def strength(self):
-        return self.natural_parameters[-1]
+        return self.natural_parameters[..., -1]
 
     @strength.setter
     def strength(self, value):
         mean, scale, shape, rate = self.to_std_parameters()
-        dim = len(mean)
+        dim = mean.shape[-1]
         precision = shape / rate
         scale = torch.tensor(value, dtype=scale.dtype, device=scale.device)
         shape = torch.tensor(.5 * dim * value, dtype=scale.dtype, device=scale.device)
@@ -69,47 +69,47 @@ class IsotropicNormalGammaPrior(ExpFamilyPrior):
             shape / precision
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, shape, rate = self.to_std_parameters()
-        return mean.view(-1), shape.view(-1) / rate.view(-1)
+        return mean, shape / rate
 
     def to_natural_parameters(self, mean, scale, shape, rate):
+        batch_shape = mean.shape[:-1]
+        scale = _batch_scalar(scale, batch_shape)
+        shape = _batch_scalar(shape, batch_shape)
+        rate = _batch_scalar(rate, batch_shape)
         return torch.cat([
-            (-.5 * scale * torch.sum(mean * mean) - rate).view(1),
+            -.5 * scale * torch.sum(mean * mean, dim=-1, keepdim=True) - rate,
             scale * mean,
-            -.5 * scale.view(1),
-            shape.view(1) - 1 + .5 * len(mean),
-        ])
+            -.5 * scale,
+            shape - 1 + .5 * mean.shape[-1],
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
-        np_dim = natural_parameters.shape[-1]
-        natural_parameters = natural_parameters.view(-1, np_dim)
-
         dim = natural_parameters.shape[-1] - 3
-        np1 = natural_parameters[:, 0].view(-1, 1)
-        np2 = natural_parameters[:, 1:1 + dim]
-        np3, np4 = natural_parameters[:, -2].view(-1, 1), \
-                   natural_parameters[:, -1].view(-1, 1)
+        np1 = natural_parameters[..., :1]
+        np2 = natural_parameters[..., 1:1 + dim]
+        np3 = natural_parameters[..., -2:-1]
+        np4 = natural_parameters[..., -1:]
         scale = -2 * np3
         shape = np4 + 1 - .5 * dim
         mean = np2 / scale
-        rate = -np1 - .5 * scale * torch.sum(mean * mean, dim=-1)[:, None]
+        rate = -np1 - .5 * scale * torch.sum(mean * mean, dim=-1, keepdim=True)
         return mean, scale, shape, rate
 
     def _expected_sufficient_statistics(self):
         mean, scale, shape, rate = self.to_std_parameters()
-        mean, scale, shape, rate = mean[0], scale[0], shape[0], rate[0]
-        dim = len(mean)
+        dim = mean.shape[-1]
         precision = shape / rate
         logdet = torch.digamma(shape) - torch.log(rate)
         return torch.cat([
-            precision.view(1),
+            precision,
             precision * mean,
-            ((dim / scale) + precision * (mean.pow(2)).sum()).view(1),
-            logdet.view(1)
-        ])
+            (dim / scale) + precision * mean.pow(2).sum(dim=-1, keepdim=True),
+            logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -117,7 +117,8 @@ class IsotropicNormalGammaPrior(ExpFamilyPrior):
 
         mean, scale, shape, rate = self.to_std_parameters(natural_parameters)
         dim = mean.shape[-1]
-        return torch.lgamma(shape) - shape * rate.log()  - .5 * dim * scale.log()
+        lognorm = torch.lgamma(shape) - shape * rate.log()  - .5 * dim * scale.log()
+        return lognorm[..., 0]
 
 
 class JointIsotropicNormalGammaPrior(ExpFamilyPrior):
@@ -157,7 +158,7 @@ class JointIsotropicNormalGammaPrior(ExpFamilyPrior):
             rate (``torch.tensor[dim]``): Rate parameter of the Gamma
                 distribution.
         '''
-        self._ncomp = len(means)
+        self._ncomp = means.shape[-2]
         nparams = self.to_natural_parameters(means, scales, shape, rate)
         super().__init__(nparams)
 
@@ -169,51 +170,61 @@ class JointIsotropicNormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rate={rate}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, shape, rate = self.to_std_parameters()
         return means, shape / rate
 
     def to_natural_parameters(self, means, scales, shape, rate):
+        batch_shape = means.shape[:-2]
+        scales = scales.expand(*means.shape[:-1])
+        shape = _batch_scalar(shape, batch_shape)
+        rate = _batch_scalar(rate, batch_shape)
+        quad_means = (scales * (means * means).sum(dim=-1)).sum(dim=-1,
+                                                                keepdim=True)
         return torch.cat([
-            (-.5 * (scales * (means * means).sum(dim=-1)).sum() - rate).view(1),
-            (scales[:, None] * means).view(-1),
-            -.5 * scales.view(-1),
-            shape.view(1) - 1 + .5 * means.shape[1] * self._ncomp,
-        ])
+            -.5 * quad_means - rate,
+            (scales[..., None] * means).reshape(*batch_shape, -1),
+            -.5 * scales,
+            shape - 1 + .5 * means.shape[-1] * self._ncomp,
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
-        dim = (len(natural_parameters) - 2 - self._ncomp) // self._ncomp
-        np1 = natural_parameters[0]
-        np2s = natural_parameters[1:1 + self._ncomp * dim].view(self._ncomp, dim)
-        np3s = natural_parameters[-(self._ncomp + 1):-1]
-        np4 = natural_parameters[-1]
+        batch_shape = natural_parameters.shape[:-1]
+        ncomp = self._ncomp
+        dim = (natural_parameters.shape[-1] - 2 - ncomp) // ncomp
+        np1 = natural_parameters[..., :1]
+        np2s = natural_parameters[..., 1:1 + ncomp * dim].reshape(
+            *batch_shape, ncomp, dim)
+        np3s = natural_parameters[..., -(ncomp + 1):-1]
+        np4 = natural_parameters[..., -1:]
         scales = -2 * np3s
-        shape = np4 + 1 - .5 * dim * self._ncomp
-        means = np2s / scales[:, None]
-        rate = -np1 - .5 * (scales * (means * means).sum(dim=-1)).sum()
+        shape = np4 + 1 - .5 * dim * ncomp
+        means = np2s / scales[..., None]
+        rate = -np1 - .5 * (scales * (means * means).sum(dim=-1)).sum(
+            dim=-1, keepdim=True)
         return means, scales, shape, rate
 
     def _expected_sufficient_statistics(self):
         means, scales, shape, rate = self.to_std_parameters()
-        dim = means.shape[1]
+        batch_shape, dim = means.shape[:-2], means.shape[-1]
         precision = shape / rate
         logdet = torch.digamma(shape) - torch.log(rate)
         return torch.cat([
-            precision.view(1),
-            precision * means.view(-1),
-            ((dim / scales) + precision * (means * means).sum(dim=-1)).view(-1),
-            logdet.view(1)
-        ])
+            precision,
+            (precision[..., None] * means).reshape(*batch_shape, -1),
+            (dim / scales) + precision * (means * means).sum(dim=-1),
+            logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         means, scales, shape, rate = self.to_std_parameters(natural_parameters)
-        dim = means.shape[1]
-        return torch.lgamma(shape) - shape * rate.log() \
-            - .5 * dim * scales.log().sum()
+        dim = means.shape[-1]
+        lognorm = torch.lgamma(shape) - shape * rate.log()
+        return lognorm[..., 0] - .5 * dim * scales.log().sum(dim=-1)
 
 
 __all__ = ['IsotropicNormalGammaPrior', 'JointIsotropicNormalGammaPrior']
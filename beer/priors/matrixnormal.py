@@ -30,42 +30,48 @@ class MatrixNormalPrior(ExpFamilyPrior):
             mean (``torch.Tensor[dim,dim]``)): Matrix mean.
             cov (``torch.tensor[1]``): Covariance matrix.
         '''
-        self.dims = mean.shape
+        self.dims = mean.shape[-2:]
         nparams = self.to_natural_parameters(mean, cov)
         super().__init__(nparams)
 
     def __repr__(self):
-        mean, cov = self.to_std_parameters(self.natural_parameters)
+        mean, cov = self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             mean=repr(mean),
             cov=repr(cov)
         )
 
-    def expected_value(self):
-        mean, _ = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        mean, _ = self.to_std_parameters()
         return mean
 
     def to_natural_parameters(self, mean, cov):
-        prec = cov.inverse().contiguous()
-        return torch.cat([-.5 * prec.view(-1),
-                          (prec @ mean).contiguous().view(-1)])
+        batch_shape = mean.shape[:-2]
+        prec = cov.inverse().expand(*batch_shape, *cov.shape[-2:])
+        return torch.cat([-.5 * prec.reshape(*batch_shape, -1),
+                          (prec @ mean).reshape(*batch_shape, -1)], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
+        batch_shape = natural_parameters.shape[:-1]
         dim1, dim2 = self.dims
-        precision = - 2 *natural_parameters[:int(dim1**2)].view(dim1, dim1)
+        precision = - 2 * natural_parameters[..., :dim1 ** 2].reshape(
+            *batch_shape, dim1, dim1)
         cov = precision.inverse()
-        mean = cov @ natural_parameters[int(dim1**2):].view(dim1, dim2)
+        mean = cov @ natural_parameters[..., dim1 ** 2:].reshape(
+            *batch_shape, dim1, dim2)
         return mean, cov
 
     def _expected_sufficient_statistics(self):
-        mean, cov = self.to_std_parameters(self.natural_parameters)
+        mean, cov = self.to_std_parameters()
+        batch_shape = mean.shape[:-2]
         return torch.cat([
-            (self.dims[1] * cov + mean @ mean.t()).view(-1),
-            mean.view(-1)
-        ])
+            (self.dims[1] * cov + mean @ mean.transpose(-2, -1)).reshape(
+                *batch_shape, -1),
+            mean.reshape(*batch_shape, -1)
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -73,7 +79,7 @@ class MatrixNormalPrior(ExpFamilyPrior):
         mean, cov = self.to_std_parameters(natural_parameters)
         precision = cov.inverse()
         log_norm = - self.dims[1] * .5 * _logdet(precision)
-        log_norm += .5 * torch.trace(mean.t() @ precision @  mean)
+        log_norm += .5 * ((precision @ mean) * mean).sum(dim=(-2, -1))
         return log_norm
 
 
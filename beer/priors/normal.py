@@ -2,7 +2,7 @@
 
 import math
 import torch
-from .baseprior import ExpFamilyPrior
+from .baseprior import ExpFamilyPrior, _batch_scalar
 
 
 class NormalFullCovariancePrior(ExpFamilyPrior):
@@ -36,48 +36,49 @@ class NormalFullCovariancePrior(ExpFamilyPrior):
         super().__init__(nparams)
 
     def __repr__(self):
-        mean, scale = self.to_std_parameters(self.natural_parameters)
+        mean, scale = self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             shape=repr(mean), rate=repr(scale),
             precision=repr(self.precision_prior)
         )
 
-    def expected_value(self):
-        mean, _ = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        mean, _ = self.to_std_parameters()
         return mean
 
     def to_natural_parameters(self, mean, scale):
-        return torch.cat([scale * mean, -.5 * scale.view(1)])
+        scale = _batch_scalar(scale, mean.shape[:-1])
+        return torch.cat([scale * mean, -.5 * scale], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
-        scale = - 2 * natural_parameters[-1]
-        mean = natural_parameters[:-1] / scale
+        scale = - 2 * natural_parameters[..., -1:]
+        mean = natural_parameters[..., :-1] / scale
         return mean, scale
 
     def _expected_sufficient_statistics(self):
-        mean, scale = self.to_std_parameters(self.natural_parameters)
-        dim = len(mean)
+        mean, scale = self.to_std_parameters()
+        dim = mean.shape[-1]
         precision = self.precision_prior.expected_value()
-        mean_quad = torch.trace(precision @ torch.ger(mean, mean))
-        return torch.cat([
-            precision.inverse() @ mean,
-            (mean_quad + dim / scale).view(1)
-        ])
+        prec_mean = (precision @ mean[..., None])[..., 0]
+        mean_quad = (prec_mean * mean).sum(dim=-1, keepdim=True)
+        return torch.cat([prec_mean, mean_quad + dim / scale], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         mean, scale = self.to_std_parameters(natural_parameters)
-        dim = len(mean)
+        dim = mean.shape[-1]
         precision_stats = self.precision_prior.expected_sufficient_statistics()
-        precision = precision_stats[:-1].reshape((dim, dim))
-        logdet_precision = precision_stats[-1]
-        log_norm = .5 * scale * torch.trace(torch.ger(mean, mean) @ precision)
+        precision = precision_stats[..., :-1].reshape(
+            *precision_stats.shape[:-1], dim, dim)
+        logdet_precision = precision_stats[..., -1]
+        mean_quad = ((precision @ mean[..., None])[..., 0] * mean).sum(dim=-1)
+        log_norm = .5 * scale[..., 0] * mean_quad
         log_norm -= .5 * logdet_precision
-        log_norm -= .5 * dim * scale.log()
+        log_norm -= .5 * dim * scale[..., 0].log()
         return log_norm
 
 
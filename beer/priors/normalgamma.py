@@ -1,7 +1,7 @@
 '''Implementation of the Normal-Gamma distribution.'''
 
 import torch
-from .baseprior import ExpFamilyPrior
+from .baseprior import ExpFamilyPrior, _batch_scalar
 
 
 class NormalGammaPrior(ExpFamilyPrior):
@@ -51,29 +51,29 @@ class NormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rates={rates}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, shape, rates = self.to_std_parameters()
-        return mean.view(-1), shape.view(-1) / rates.view(-1)
+        return mean, shape / rates
 
     def to_natural_parameters(self, mean, scale, shape, rates):
+        batch_shape = mean.shape[:-1]
+        scale = _batch_scalar(scale, batch_shape)
+        shape = _batch_scalar(shape, batch_shape)
         return torch.cat([
             -.5 * scale * mean.pow(2) - rates,
             scale * mean,
-            -.5 * scale.view(1),
-            shape.view(1) - .5,
-        ])
+            -.5 * scale,
+            shape - .5,
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
-        np_dim = natural_parameters.shape[-1]
-        natural_parameters = natural_parameters.view(-1, np_dim)
-
         dim = (natural_parameters.shape[-1] - 2) // 2
-        np1 = natural_parameters[:, :dim]
-        np2 = natural_parameters[:, dim:2 * dim]
-        np3, np4 = natural_parameters[:, -2][:, None], \
-                   natural_parameters[:, -1][:, None]
+        np1 = natural_parameters[..., :dim]
+        np2 = natural_parameters[..., dim:2 * dim]
+        np3 = natural_parameters[..., -2:-1]
+        np4 = natural_parameters[..., -1:]
 
         scale = -2 * np3
         shape = np4 + .5
@@ -84,24 +84,25 @@ class NormalGammaPrior(ExpFamilyPrior):
 
     def _expected_sufficient_statistics(self):
         mean, scale, shape, rates = self.to_std_parameters()
-        mean, scale, shape, rates = mean.view(-1), scale.view(-1), \
-                                    shape.view(-1), rates.view(-1)
-        dim = len(mean)
+        dim = mean.shape[-1]
         diag_precision = shape / rates
-        logdet = torch.sum(torch.digamma(shape) - torch.log(rates))
+        logdet = torch.sum(torch.digamma(shape) - torch.log(rates), dim=-1,
+                           keepdim=True)
         return torch.cat([
             diag_precision,
             diag_precision * mean,
-            ((dim / scale) + (diag_precision * mean.pow(2)).sum()).view(1),
-            logdet.view(1)
-        ])
+            (dim / scale) + (diag_precision * mean.pow(2)).sum(dim=-1,
+                                                              keepdim=True),
+            logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         mean, scale, shape, rates = self.to_std_parameters(natural_parameters)
         dim = mean.shape[-1]
-        return dim * torch.lgamma(shape) - shape * rates.log().sum(dim=-1)[:, None] \
+        shape, scale = shape[..., 0], scale[..., 0]
+        return dim * torch.lgamma(shape) - shape * rates.log().sum(dim=-1) \
             - .5 * dim * scale.log()
 
 
@@ -141,7 +142,7 @@ class JointNormalGammaPrior(ExpFamilyPrior):
             rates (``torch.tensor[dim]``): Rate parameters of the
                 Gamma distribution.
         '''
-        self._ncomp, self._dim = means.shape
+        self._ncomp, self._dim = means.shape[-2:]
         nparams = self.to_natural_parameters(means, scales, shape, rates)
         super().__init__(nparams)
 
@@ -153,54 +154,61 @@ class JointNormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rates={rates}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, shape, rates = self.to_std_parameters()
         return means, shape / rates
 
     def to_natural_parameters(self, means, scales, shape, rates):
+        batch_shape = means.shape[:-2]
+        scales = scales.expand(*means.shape[:-1])
+        shape = _batch_scalar(shape, batch_shape)
         return torch.cat([
-            -.5 * ((scales[:, None] * means) * means).sum(dim=0) - rates,
-            (scales[:, None] * means).view(-1),
-            -.5 * scales.view(-1),
-            shape.view(1) - 1. + .5 * self._ncomp
-        ])
+            -.5 * ((scales[..., None] * means) * means).sum(dim=-2) - rates,
+            (scales[..., None] * means).reshape(*batch_shape, -1),
+            -.5 * scales,
+            shape - 1. + .5 * self._ncomp
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
+        batch_shape = natural_parameters.shape[:-1]
         ncomp, dim = self._ncomp, self._dim
-        np1 = natural_parameters[:dim]
-        np2s = natural_parameters[dim:dim + ncomp * dim].view((ncomp, dim))
-        np3s = natural_parameters[-(ncomp + 1):-1]
-        np4 = natural_parameters[-1]
+        np1 = natural_parameters[..., :dim]
+        np2s = natural_parameters[..., dim:dim + ncomp * dim].reshape(
+            *batch_shape, ncomp, dim)
+        np3s = natural_parameters[..., -(ncomp + 1):-1]
+        np4 = natural_parameters[..., -1:]
 
         scales = -2 * np3s
         shape = np4 + 1 - .5 * ncomp
-        means = np2s / scales[:, None]
-        rates = -np1 - .5 * ((scales[:, None] * means) * means).sum(dim=0)
+        means = np2s / scales[..., None]
+        rates = -np1 - .5 * ((scales[..., None] * means) * means).sum(dim=-2)
 
         return means, scales, shape, rates
 
     def _expected_sufficient_statistics(self):
         means, scales, shape, rates = self.to_std_parameters()
-        dim = self._dim
+        batch_shape, dim = means.shape[:-2], self._dim
         diag_precision = shape / rates
-        logdet = torch.sum(torch.digamma(shape) - torch.log(rates))
+        prec_means = diag_precision[..., None, :] * means
+        logdet = torch.sum(torch.digamma(shape) - torch.log(rates), dim=-1,
+                           keepdim=True)
         return torch.cat([
             diag_precision,
-            (diag_precision[None] * means).view(-1),
-            ((dim / scales) + torch.sum((diag_precision[None] * means) * means,
-                                         dim=-1)).view(-1),
-            logdet.view(1)
-        ])
+            prec_means.reshape(*batch_shape, -1),
+            (dim / scales) + torch.sum(prec_means * means, dim=-1),
+            logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         _, scales, shape, rates = self.to_std_parameters(natural_parameters)
         dim = self._dim
-        return dim * torch.lgamma(shape) - shape * rates.log().sum() \
-            - .5 * dim * scales.log().sum()
+        shape = shape[..., 0]
+        return dim * torch.lgamma(shape) - shape * rates.log().sum(dim=-1) \
+            - .5 * dim * scales.log().sum(dim=-1)
 
 
 __all__ = ['NormalGammaPrior', 'JointNormalGammaPrior']
@@ -2,7 +2,7 @@
 
 import math
 import torch
-from .baseprior import ExpFamilyPrior
+from .baseprior import ExpFamilyPrior, _batch_scalar
 from .wishart import _logdet
 
 
@@ -41,7 +41,8 @@ class NormalWishartPrior(ExpFamilyPrior):
                 precision matrix.
             dof (``torch.tensor[1]``): degree of freedom.
         '''
-        if not dof > len(mean) - 1:
+        dim = mean.shape[-1]
+        if not (dof > dim - 1).all():
             raise ValueError('Degree of freedom should be greater than '
                              'D - 1. dim={dim}, dof={dof}'.format(dim=dim,
                                                                   dof=dof))
@@ -50,70 +51,69 @@ class NormalWishartPrior(ExpFamilyPrior):
 
     def __repr__(self):
         mean, scale, mean_precision, dof = \
-            self.to_std_parameters(self.natural_parameters)
+            self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             mean=repr(mean), scale=repr(scale),
             mean_precision={mean_precision}, dof={dof}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, mean_precision, dof = self.to_std_parameters()
-        mean, mean_precision, dof = mean[0], mean_precision[0], dof[0]
-        return mean, dof * mean_precision
+        return mean, dof[..., None] * mean_precision
 
     def to_natural_parameters(self, mean, scale, mean_precision, dof):
-        dim = len(mean)
+        batch_shape, dim = mean.shape[:-1], mean.shape[-1]
+        scale = _batch_scalar(scale, batch_shape)
+        dof = _batch_scalar(dof, batch_shape)
         inv_mean_prec = mean_precision.inverse()
+        mean_quad = scale[..., None] * mean[..., :, None] * mean[..., None, :]
         return torch.cat([
-            -.5 * (scale * torch.ger(mean, mean) + inv_mean_prec).reshape(-1),
+            -.5 * (mean_quad + inv_mean_prec).reshape(*batch_shape, -1),
             scale * mean,
-            -.5 * scale.view(1),
-            .5 * (dof - dim).view(1),
-        ])
+            -.5 * scale,
+            .5 * (dof - dim),
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
 
-        np_dim = natural_parameters.shape[-1]
-        natural_parameters = natural_parameters.view(-1, np_dim)
+        batch_shape, np_dim = natural_parameters.shape[:-1], \
+                              natural_parameters.shape[-1]
         dim = int(-1 + math.sqrt(1 - 4 * (2 - np_dim))) // 2
-        #np1 = natural_parameters[:int(dim**2)].reshape((dim, dim))
-        np1 = natural_parameters[:, :int(dim**2)].reshape((-1, dim, dim))
-        #np2 = natural_parameters[int(dim**2):int(dim**2) + dim]
-        np2 = natural_parameters[:, int(dim**2):int(dim**2) + dim]
-        #np3, np4 = natural_parameters[-2], natural_parameters[-1]
-        np3, np4 = natural_parameters[:, -2].view(-1, 1), \
-                   natural_parameters[:, -1].view(-1, 1)
+        np1 = natural_parameters[..., :dim ** 2].reshape(*batch_shape, dim,
+                                                         dim)
+        np2 = natural_parameters[..., dim ** 2:dim ** 2 + dim]
+        np3 = natural_parameters[..., -2:-1]
+        np4 = natural_parameters[..., -1:]
 
         scale = -2 * np3
         dof = 2 * np4 + dim
         mean = np2 / scale
-        mean_quad = mean[:, :, None] * mean[:, None, :]
-        M = -2 * np1 - scale[:, :, None] * mean_quad
-        eye = M.new_ones(M.size(-1)).diag().expand_as(M)
-        M_inv, _ = torch.gesv(eye, M)
+        mean_quad = mean[..., :, None] * mean[..., None, :]
+        mean_precision = torch.inverse(-2 * np1 - scale[..., None] * mean_quad)
+        mean_precision = mean_precision.contiguous()
 
-        return mean, scale, M_inv.contiguous(), dof
+        return mean, scale, mean_precision, dof
 
     def _expected_sufficient_statistics(self):
         mean, scale, mean_precision, dof = self.to_std_parameters()
-        mean, scale, mean_precision, dof = mean[0], scale[0], \
-                                           mean_precision[0], dof[0]
         dtype, device = mean.dtype, mean.device
-        dim = len(mean)
+        batch_shape, dim = mean.shape[:-1], mean.shape[-1]
 
-        precision = dof * mean_precision
-        logdet = _logdet(mean_precision)[0]
+        precision = dof[..., None] * mean_precision
+        prec_mean = (precision @ mean[..., None])[..., 0]
+        logdet = _logdet(mean_precision)[..., None]
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
-        sum_digamma = torch.digamma(.5 * (dof + 1 - seq)).sum()
+        sum_digamma = torch.digamma(.5 * (dof + 1 - seq)).sum(dim=-1,
+                                                               keepdim=True)
         return torch.cat([
-            precision.reshape(-1),
-            precision @ mean,
-            (dim / scale) + torch.trace(precision @ torch.ger(mean, mean)).view(1),
-            (sum_digamma + dim * math.log(2) + logdet).view(1)
-        ])
+            precision.reshape(*batch_shape, -1),
+            prec_mean,
+            (dim / scale) + (prec_mean * mean).sum(dim=-1, keepdim=True),
+            sum_digamma + dim * math.log(2) + logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -122,6 +122,7 @@ class NormalWishartPrior(ExpFamilyPrior):
             self.to_std_parameters(natural_parameters)
         dtype, device = mean.dtype, mean.device
         dim = mean.shape[-1]
+        scale, dof = scale[..., 0], dof[..., 0]
 
         lognorm = .5 * dof * _logdet(mean_precision)
         lognorm -= .5 * dim * torch.log(scale)
@@ -129,7 +130,7 @@ class NormalWishartPrior(ExpFamilyPrior):
         lognorm += .25 * dim * (dim - 1) * math.log(math.pi)
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device,
                            requires_grad=False)
-        lognorm += torch.lgamma(.5 * (dof + 1 - seq)).sum(dim=-1).view(-1, 1)
+        lognorm += torch.lgamma(.5 * (dof[..., None] + 1 - seq)).sum(dim=-1)
         return lognorm
 
 
@@ -169,8 +170,8 @@ class JointNormalWishartPrior(ExpFamilyPrior):
                 precision matrix.
             dof (``torch.tensor[1]``): degree of freedom.
         '''
-        self._ncomp, self._dim = means.shape
-        if not dof > self._dim - 1:
+        self._ncomp, self._dim = means.shape[-2:]
+        if not (dof > self._dim - 1).all():
             raise ValueError('Degree of freedom should be greater than '
                              'D - 1. dim={dim}, dof={dof}'.format(dim=self._dim,
                                                                   dof=dof))
@@ -179,63 +180,69 @@ class JointNormalWishartPrior(ExpFamilyPrior):
 
     def __repr__(self):
         means, scales, mean_precision, dof = \
-            self.to_std_parameters(self.natural_parameters)
+            self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             means=repr(means), scales=repr(scales),
             mean_precision={mean_precision}, dof={dof}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, mean_precision, dof = self.to_std_parameters()
-        return means, dof * mean_precision
+        return means, dof[..., None] * mean_precision
 
     def to_natural_parameters(self, means, scales, mean_precision, dof):
         ncomp, dim = self._ncomp, self._dim
+        batch_shape = means.shape[:-2]
+        scales = scales.expand(*means.shape[:-1])
+        dof = _batch_scalar(dof, batch_shape)
         inv_mean_prec = mean_precision.inverse()
-        quad_means = (scales[:, None] * means).t() @ means
+        quad_means = (scales[..., None] * means).transpose(-2, -1) @ means
         return torch.cat([
-            -.5 * (quad_means + inv_mean_prec).view(-1),
-            (scales[:, None] * means).view(-1),
-            -.5 * scales.view(-1),
-            .5 * (dof - dim - 1 + ncomp).view(1),
-        ])
+            -.5 * (quad_means + inv_mean_prec).reshape(*batch_shape, -1),
+            (scales[..., None] * means).reshape(*batch_shape, -1),
+            -.5 * scales,
+            .5 * (dof - dim - 1 + ncomp),
+        ], dim=-1)
 
     def _to_std_parameters(self, natural_parameters=None):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
+        batch_shape = natural_parameters.shape[:-1]
         ncomp, dim = self._ncomp, self._dim
-        np1 = natural_parameters[:int(dim**2)].view((dim, dim))
-        np2s = natural_parameters[int(dim**2):int(dim**2) + ncomp * dim].view((ncomp, dim))
-        np3s = natural_parameters[-(ncomp+1):-1]
-        np4 = natural_parameters[-1]
+        np1 = natural_parameters[..., :dim ** 2].reshape(*batch_shape, dim,
+                                                         dim)
+        np2s = natural_parameters[..., dim ** 2:dim ** 2 + ncomp * dim]
+        np2s = np2s.reshape(*batch_shape, ncomp, dim)
+        np3s = natural_parameters[..., -(ncomp+1):-1]
+        np4 = natural_parameters[..., -1:]
 
         scales = -2 * np3s
         dof = 2 * np4 + dim + 1 - ncomp
-        means = np2s / scales[:, None]
-        quad_means = (scales[:, None] * means).t() @ means
-        mean_precision = torch.inverse(-2 * np1 - quad_means)
+        means = np2s / scales[..., None]
+        quad_means = (scales[..., None] * means).transpose(-2, -1) @ means
+        mean_precision = torch.inverse(-2 * np1 - quad_means).contiguous()
 
         return means, scales, mean_precision, dof
 
     def _expected_sufficient_statistics(self):
         means, scales, mean_precision, dof = self.to_std_parameters()
         dtype, device = means.dtype, means.device
-        ncomp, dim = self._ncomp, self._dim
+        batch_shape, dim = means.shape[:-2], self._dim
 
-        precision = dof * mean_precision
-        logdet = _logdet(mean_precision)
+        precision = dof[..., None] * mean_precision
+        logdet = _logdet(mean_precision)[..., None]
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
-        sum_digamma = torch.digamma(.5 * (dof + 1 - seq)).sum()
+        sum_digamma = torch.digamma(.5 * (dof + 1 - seq)).sum(dim=-1,
+                                                               keepdim=True)
 
-        quad_means = (means[:, :, None] @ means[:, None, :]).view(ncomp, -1)
-        vec_precision = precision.view(-1)
+        prec_means = means @ precision
         return torch.cat([
-            precision.reshape(-1),
-            (means @ precision).view(-1),
-            (dim / scales) + quad_means @ vec_precision,
-            (sum_digamma + dim * math.log(2) + logdet).view(1)
-        ])
+            precision.reshape(*batch_shape, -1),
+            prec_means.reshape(*batch_shape, -1),
+            (dim / scales) + (prec_means * means).sum(dim=-1),
+            sum_digamma + dim * math.log(2) + logdet
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -245,13 +252,14 @@ class JointNormalWishartPrior(ExpFamilyPrior):
             self.to_std_parameters(natural_parameters)
         dtype, device = mean_precision.dtype, mean_precision.device
         dim = self._dim
+        dof = dof[..., 0]
 
         lognorm_prec = .5 * dof * _logdet(mean_precision)
         lognorm_prec += .5 * dof * dim * math.log(2)
         lognorm_prec += .25 * dim * (dim - 1) * math.log(math.pi)
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
-        lognorm_prec += torch.lgamma(.5 * (dof + 1 - seq)).sum()
-        lognorm = -.5 * dim  * torch.log(scales).sum()
+        lognorm_prec += torch.lgamma(.5 * (dof[..., None] + 1 - seq)).sum(dim=-1)
+        lognorm = -.5 * dim  * torch.log(scales).sum(dim=-1)
         return lognorm + lognorm_prec
 
 
@@ -2,19 +2,22 @@
 
 import math
 import torch
-from .baseprior import ExpFamilyPrior
+from .baseprior import ExpFamilyPrior, _batch_scalar
 
 
 def _logdet(mats):
-    '''Log determinant of a positive definite matrix.'''
-    dim = mats.shape[-1]
-    vmats = mats.view(-1, dim, dim)
-    retval = []
-    for mat in vmats:
-        if mat.requires_grad:
-            mat.register_hook(lambda grad: .5 * (grad + grad.t()))
-        retval.append(2 * torch.log(torch.diag(torch.potrf(mat))).sum().view(1))
-    return torch.cat(retval).view(-1, 1)
+    '''Log determinant of a (batch of) positive definite matrix.
+
+    Args:
+        mats (``torch.Tensor[..., dim, dim]``): Matrices.
+
+    Returns:
+        ``torch.Tensor[...]``
+    '''
+    if mats.requires_grad:
+        mats.register_hook(lambda grad: .5 * (grad + grad.transpose(-2, -1)))
+    chols = torch.linalg.cholesky(mats)
+    return 2 * torch.log(chols.diagonal(dim1=-2, dim2=-1)).sum(dim=-1)
 
 
 class WishartPrior(ExpFamilyPrior):
@@ -41,8 +44,8 @@ class WishartPrior(ExpFamilyPrior):
             scale (``torch.Tensor[dim,dim]``)): Scale matrix.
             dof (``torch.tensor[1]``): degree of freedom.
         '''
-        dim = len(scale)
-        if not dof > len(scale) - 1:
+        dim = scale.shape[-1]
+        if not (dof > dim - 1).all():
             raise ValueError('Degree of freedom should be greater than '
                              'D - 1. dim={dim}, dof={dof}'.format(dim=dim,
                                                                   dof=dof))
@@ -50,7 +53,7 @@ class WishartPrior(ExpFamilyPrior):
         super().__init__(nparams)
 
     def __repr__(self):
-        scale, dof = self.to_std_parameters(self.natural_parameters)
+        scale, dof = self.to_std_parameters()
         return self.__repr_str.format(
             classname=self.__class__.__name__,
             shape=repr(scale), rate=repr(dof)
@@ -58,48 +61,51 @@ class WishartPrior(ExpFamilyPrior):
 
     @property
     def strength(self):
-        mean, dof = self.to_std_parameters(self.natural_parameters)
-        dim = len(mean)
+        mean, dof = self.to_std_parameters()
+        dim = mean.shape[-1]
         return dof - dim + 1
 
     @strength.setter
     def strength(self, value):
-        nparams = self.natural_parameters
-        dim = int(math.sqrt(len(nparams)) - 1)
+        nparams = self.natural_parameters.clone()
+        dim = int(math.sqrt(nparams.shape[-1] - 1))
         new_dof = value + dim - 1
-        nparams[-1] = .5 * (new_dof - dim - 1)
+        nparams[..., -1] = .5 * (new_dof - dim - 1)
         self.natural_parameters = nparams
 
-    def expected_value(self):
-        scale, dof = self.to_std_parameters(self.natural_parameters)
-        return dof * scale
+    def _expected_value(self):
+        scale, dof = self.to_std_parameters()
+        return dof[..., None, None] * scale
 
     def to_natural_parameters(self, scale, dof):
-        dim = len(scale)
+        batch_shape, dim = scale.shape[:-2], scale.shape[-1]
         return torch.cat([
-            -.5 * scale.inverse().reshape(-1),
-            .5 * (dof - dim - 1).view(1),
-        ])
-
-    def _to_std_parameters(self, natural_parameters):
-        dim = math.sqrt(len(natural_parameters) - 1)
-        np1 = natural_parameters[:-1].reshape((dim, dim))
-        np2 = natural_parameters[-1]
-        scale = torch.inverse(-2 * np1)
+            -.5 * scale.inverse().reshape(*batch_shape, -1),
+            .5 * (_batch_scalar(dof, batch_shape) - dim - 1),
+        ], dim=-1)
+
+    def _to_std_parameters(self, natural_parameters=None):
+        if natural_parameters is None:
+            natural_parameters = self.natural_parameters
+        batch_shape = natural_parameters.shape[:-1]
+        dim = int(math.sqrt(natural_parameters.shape[-1] - 1))
+        np1 = natural_parameters[..., :-1].reshape(*batch_shape, dim, dim)
+        np2 = natural_parameters[..., -1]
+        scale = torch.inverse(-2 * np1).contiguous()
         dof = 2 * np2 + dim + 1
-        return scale.contiguous().view((dim, dim)), dof
+        return scale, dof
 
     def _expected_sufficient_statistics(self):
-        scale, dof = self.to_std_parameters(self.natural_parameters)
+        scale, dof = self.to_std_parameters()
         dtype, device = scale.dtype, scale.device
-        dim = len(scale)
+        batch_shape, dim = scale.shape[:-2], scale.shape[-1]
         scale_logdet = _logdet(scale)
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
-        sum_digamma = torch.digamma(.5 * (dof + 1 - seq)).sum()
+        sum_digamma = torch.digamma(.5 * (dof[..., None] + 1 - seq)).sum(dim=-1)
         return torch.cat([
-            dof * scale.view(-1),
-            (sum_digamma + dim * math.log(2) + scale_logdet).view(1)
-        ])
+            (dof[..., None, None] * scale).reshape(*batch_shape, -1),
+            (sum_digamma + dim * math.log(2) + scale_logdet)[..., None]
+        ], dim=-1)
 
     def _log_norm(self, natural_parameters=None):
         if natural_parameters is None:
@@ -107,13 +113,13 @@ class WishartPrior(ExpFamilyPrior):
 
         scale, dof = self.to_std_parameters(natural_parameters)
         dtype, device = scale.dtype, scale.device
-        dim = len(scale)
+        dim = scale.shape[-1]
 
         lognorm = .5 * dof * _logdet(scale)
         lognorm += .5 * dof * dim * math.log(2)
         lognorm += .25 * dim * (dim - 1) * math.log(math.pi)
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
-        lognorm += torch.lgamma(.5 * (dof + 1 - seq)).sum()
+        lognorm += torch.lgamma(.5 * (dof[..., None] + 1 - seq)).sum(dim=-1)
 
         return lognorm
 
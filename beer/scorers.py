@@ -0,0 +1,569 @@
+'''Frozen emission scorers for decoding.
+
+A scorer is a plain (non-Bayesian) snapshot of a trained set of
+emission densities. The expected natural parameters are computed once
+when the scorer is exported (see the ``scorer()`` method of the model
+sets) and the per-frame log-likelihoods are computed directly from the
+features with a few matrix multiplications: there is no expansion of
+the sufficient statistics.
+
+For a set of Normal densities, the log-likelihood of the k-th density
+is:
+
+.. math::
+    \\ln p(x | k) = -\\frac{1}{2} || L_k^T (x - m_k) ||^2 + c_k
+
+where :math:`L_k` is the Cholesky factor of the expected precision
+matrix and :math:`c_k` gathers all the terms that do not depend on
+:math:`x`. The scorers give the same log-likelihoods as the
+``expected_log_likelihood`` method of the model sets they were
+exported from.
+
+'''
+
+import math
+import torch
+
+
+# Maximum number of components whitened at once by the full covariance
+# scorer (to bound the memory).
+_BLOCK_SIZE = 64
+
+
+class DiagonalNormalSetScorer:
+    '''Frozen set of Normal densities with diagonal (or isotropic)
+    covariance matrices.
+
+    Attributes:
+        means (``torch.Tensor[k, dim]``): Mean of each density.
+        scales (``torch.Tensor[k, dim]``): Square root of the diagonal
+            of the precision matrix of each density.
+        consts (``torch.Tensor[k]``): Constant term of the
+            log-likelihood of each density.
+
+    '''
+
+    def __init__(self, means, scales, consts):
+        self.means = means
+        self.scales = scales
+        self.consts = consts
+
+        # The log-likelihood is a single matrix multiplication with the
+        # features and their square.
+        precisions = scales ** 2
+        self._params = torch.cat([-.5 * precisions, precisions * means],
+                                 dim=-1)
+        self._consts = consts - .5 * (precisions * means ** 2).sum(dim=-1)
+
+    def __len__(self):
+        return len(self.means)
+
+    def log_likelihood(self, data, idxs=None):
+        '''Per-frame log-likelihood of the densities.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            idxs (``torch.LongTensor``): Indices of the densities to
+                evaluate. If None, all the densities are evaluated.
+
+        Returns:
+            ``torch.Tensor[n_frames, k]``
+
+        '''
+        params, consts = self._params, self._consts
+        if idxs is not None:
+            params, consts = params[idxs], consts[idxs]
+        return torch.cat([data ** 2, data], dim=-1) @ params.t() + consts
+
+    def selected_log_likelihood(self, data, frames, idxs):
+        '''Log-likelihood of selected pairs (frame, density).
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            frames (``torch.LongTensor[n]``): Frame of each pair.
+            idxs (``torch.LongTensor[n]``): Density of each pair.
+
+        Returns:
+            ``torch.Tensor[n]``
+
+        '''
+        feats = torch.cat([data ** 2, data], dim=-1)
+        return torch.einsum('nd,nd->n', self._params.index_select(0, idxs),
+                            feats.index_select(0, frames)) \
+            + self._consts.index_select(0, idxs)
+
+
+class FullNormalSetScorer:
+    '''Frozen set of Normal densities with full covariance matrices.
+
+    Attributes:
+        means (``torch.Tensor[k, dim]``): Mean of each density.
+        whiteners (``torch.Tensor[k, dim, dim]`` or
+            ``torch.Tensor[dim, dim]``): Cholesky factor of the
+            precision matrix of each density or of all the densities
+            (shared covariance matrix).
+        consts (``torch.Tensor[k]``): Constant term of the
+            log-likelihood of each density.
+
+    '''
+
+    def __init__(self, means, whiteners, consts):
+        self.means = means
+        self.whiteners = whiteners
+        self.consts = consts
+
+        # Whitened means.
+        if self.shared:
+            self._means = means @ whiteners
+            self._consts = consts - .5 * (self._means ** 2).sum(dim=-1)
+        else:
+            self._means = (means[:, None, :] @ whiteners)[:, 0, :]
+            self._consts = consts
+
+    def __len__(self):
+        return len(self.means)
+
+    @property
+    def shared(self):
+        'bool: Whether the densities share the same covariance matrix.'
+        return self.whiteners.dim() == 2
+
+    def log_likelihood(self, data, idxs=None):
+        '''Per-frame log-likelihood of the densities.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            idxs (``torch.LongTensor``): Indices of the densities to
+                evaluate. If None, all the densities are evaluated.
+
+        Returns:
+            ``torch.Tensor[n_frames, k]``
+
+        '''
+        means, consts = self._means, self._consts
+        if idxs is not None:
+            means, consts = means[idxs], consts[idxs]
+        if self.shared:
+            # The data is whitened once for all the densities.
+            wdata = data @ self.whiteners
+            return -.5 * (wdata ** 2).sum(dim=-1)[:, None] \
+                + wdata @ means.t() + consts
+
+        whiteners = self.whiteners
+        if idxs is not None:
+            whiteners = whiteners[idxs]
+        llhs = []
+        for start in range(0, len(means), _BLOCK_SIZE):
+            end = start + _BLOCK_SIZE
+            wdata = torch.matmul(data[None], whiteners[start:end])
+            wdata -= means[start:end, None, :]
+            llhs.append(-.5 * (wdata ** 2).sum(dim=-1).t())
+        return torch.cat(llhs, dim=-1) + consts
+
+    def selected_log_likelihood(self, data, frames, idxs):
+        '''Log-likelihood of selected pairs (frame, density).
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            frames (``torch.LongTensor[n]``): Frame of each pair.
+            idxs (``torch.LongTensor[n]``): Density of each pair.
+
+        Returns:
+            ``torch.Tensor[n]``
+
+        '''
+        if self.shared:
+            wdata = data @ self.whiteners
+            sq_norms = (wdata ** 2).sum(dim=-1)
+            return -.5 * sq_norms[frames] \
+                + torch.einsum('nd,nd->n', self._means.index_select(0, idxs),
+                               wdata.index_select(0, frames)) \
+                + self._consts.index_select(0, idxs)
+        wdata = (data[frames, None, :] @ self.whiteners[idxs])[:, 0, :]
+        wdata -= self._means[idxs]
+        return -.5 * (wdata ** 2).sum(dim=-1) + self._consts[idxs]
+
+
+class MixtureSetScorer:
+    '''Frozen set of mixtures having the same number of components.
+
+    Attributes:
+        log_weights (``torch.Tensor[k, n_comp]``): Log-weights of the
+            components of each mixture.
+        scorer: Scorer of the components of all the mixtures.
+        selector (:any:`GaussianSelector`): Gaussian selection. If
+            None, all the components are evaluated.
+        floor (float): Log-likelihood of the components that are not
+            selected. If None, the lowest log-likelihood of the
+            selected components of the frame is used.
+
+    '''
+
+    def __init__(self, log_weights, scorer, selector=None, floor=None):
+        self.log_weights = log_weights
+        self.scorer = scorer
+        self.selector = selector
+        self.floor = floor
+
+    def __len__(self):
+        return len(self.log_weights)
+
+    @property
+    def n_comp_per_mixture(self):
+        'Number of components per mixture'
+        return self.log_weights.shape[1]
+
+    def log_likelihood(self, data, idxs=None):
+        '''Per-frame log-likelihood of the mixtures.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            idxs (``torch.LongTensor``): Indices of the mixtures to
+                evaluate. If None, all the mixtures are evaluated.
+
+        Returns:
+            ``torch.Tensor[n_frames, k]``
+
+        '''
+        log_weights = self.log_weights
+        comp_idxs = None
+        if idxs is not None:
+            log_weights = log_weights[idxs]
+            comp_idxs = idxs[:, None] * self.n_comp_per_mixture
+            comp_idxs = comp_idxs + torch.arange(self.n_comp_per_mixture,
+                                                 device=idxs.device)
+            comp_idxs = comp_idxs.view(-1)
+        if self.selector is not None:
+            llhs = self._selected_log_likelihood(data)
+            return llhs if idxs is None else llhs[:, idxs]
+        pc_llhs = self.scorer.log_likelihood(data, comp_idxs)
+        pc_llhs = pc_llhs.reshape(len(data), len(log_weights),
+                                  self.n_comp_per_mixture)
+        return torch.logsumexp(pc_llhs + log_weights[None], dim=-1)
+
+    def _selected_log_likelihood(self, data):
+        # Only the selected components are evaluated, the other ones
+        # have the floor log-likelihood. For each frame and each
+        # mixture:
+        #   llh = log(sum_{selected} w_c p_c + floor * sum_{other} w_c)
+        # The sums are computed from the pairs (frame, component)
+        # without building the dense matrix of the components.
+        frames, comps = self.selector.select(data)
+        log_weights = self.log_weights.view(-1)
+        llhs = self.scorer.selected_log_likelihood(data, frames, comps)
+        if self.floor is None:
+            floor = torch.full((len(data),), float('inf'), dtype=llhs.dtype,
+                               device=llhs.device)
+            floor.scatter_reduce_(0, frames, llhs, reduce='amin')
+        else:
+            floor = torch.full((len(data),), self.floor, dtype=llhs.dtype,
+                               device=llhs.device)
+        w_llhs = llhs + log_weights[comps]
+
+        # Reference value of each frame for numerical stability.
+        ref = torch.full((len(data),), float('-inf'), dtype=llhs.dtype,
+                         device=llhs.device)
+        ref.scatter_reduce_(0, frames, w_llhs, reduce='amax')
+        ref = torch.where(torch.isinf(ref), torch.zeros_like(ref), ref)
+
+        keys = frames * len(self) + comps // self.n_comp_per_mixture
+        sums = torch.zeros(len(data) * len(self), dtype=llhs.dtype,
+                           device=llhs.device)
+        sums.index_add_(0, keys, (w_llhs - ref[frames]).exp())
+        sel_weights = torch.zeros_like(sums)
+        sel_weights.index_add_(0, keys, log_weights[comps].exp())
+
+        # The mixtures without selected components have the floor
+        # log-likelihood.
+        total_weights = self.log_weights.exp().sum(dim=-1)
+        retval = floor[:, None] + total_weights.log()[None, :]
+        retval = retval.reshape(-1)
+        keys = torch.nonzero(sel_weights).view(-1)
+        key_frames = keys // len(self)
+        other_weights = total_weights[keys % len(self)] - sel_weights[keys]
+        retval[keys] = torch.logaddexp(
+            ref[key_frames] + sums[keys].log(),
+            floor[key_frames] + other_weights.clamp(min=0).log()
+        )
+        return retval.view(len(data), -1)
+
+
+class JointScorer:
+    '''Concatenation of scorers.
+
+    Attributes:
+        scorers (list): Concatenated scorers.
+
+    '''
+
+    def __init__(self, scorers):
+        self.scorers = scorers
+
+    def __len__(self):
+        return sum(len(scorer) for scorer in self.scorers)
+
+    def log_likelihood(self, data, idxs=None):
+        '''Per-frame log-likelihood of the densities.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            idxs (``torch.LongTensor``): Indices of the densities to
+                evaluate. If None, all the densities are evaluated.
+
+        Returns:
+            ``torch.Tensor[n_frames, k]``
+
+        '''
+        if idxs is None:
+            return torch.cat([scorer.log_likelihood(data)
+                              for scorer in self.scorers], dim=-1)
+
+        llhs = None
+        start_idx = 0
+        for scorer in self.scorers:
+            length = len(scorer)
+            selected = (idxs >= start_idx) & (idxs < start_idx + length)
+            if selected.any():
+                sub_llhs = scorer.log_likelihood(data,
+                                                 idxs[selected] - start_idx)
+                if llhs is None:
+                    llhs = torch.zeros(len(data), len(idxs),
+                                       dtype=sub_llhs.dtype,
+                                       device=sub_llhs.device)
+                llhs[:, selected] = sub_llhs
+            start_idx += length
+        return llhs
+
+
+class RepeatedScorer:
+    '''Scorer repeated several times.
+
+    Attributes:
+        scorer: Repeated scorer.
+        repeat (int): Number of repetitions.
+
+    '''
+
+    def __init__(self, scorer, repeat):
+        self.scorer = scorer
+        self.repeat = repeat
+
+    def __len__(self):
+        return len(self.scorer) * self.repeat
+
+    def log_likelihood(self, data, idxs=None):
+        '''Per-frame log-likelihood of the densities.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+            idxs (``torch.LongTensor``): Indices of the densities to
+                evaluate. If None, all the densities are evaluated.
+
+        Returns:
+            ``torch.Tensor[n_frames, k]``
+
+        '''
+        if idxs is not None:
+            return self.scorer.log_likelihood(data, idxs % len(self.scorer))
+        return self.scorer.log_likelihood(data).repeat(1, self.repeat)
+
+
+class GaussianSelector:
+    '''Gaussian selection (shortlisting) based on a vector
+    quantization of the Gaussians.
+
+    The Gaussians are clustered and each cluster is represented by a
+    diagonal Normal density (background model). For each frame, only
+    the Gaussians of the ``n_best`` clusters with the highest
+    log-likelihood are selected.
+
+    Attributes:
+        clusters (:any:`DiagonalNormalSetScorer`): Background model.
+        gaussians (``torch.LongTensor[n_gaussians]``): Gaussians
+            sorted by cluster.
+        offsets (``torch.LongTensor[n_clusters]``): Position of the
+            first Gaussian of each cluster in ``gaussians``.
+        sizes (``torch.LongTensor[n_clusters]``): Number of Gaussians of
+            each cluster.
+        n_best (int): Number of selected clusters per frame.
+        n_frames (int): Number of frames processed since the last
+            reset.
+        n_selected (int): Number of selected Gaussians since the last
+            reset.
+
+    '''
+
+    @classmethod
+    def create(cls, scorer, n_clusters, n_best, n_iters=10):
+        '''Cluster the Gaussians of a scorer with the k-means
+        algorithm.
+
+        Args:
+            scorer (:any:`DiagonalNormalSetScorer` or
+                :any:`FullNormalSetScorer`): Scorer of the Gaussians.
+            n_clusters (int): Number of clusters.
+            n_best (int): Number of selected clusters per frame.
+            n_iters (int): Number of iterations of the k-means
+                algorithm.
+
+        Returns:
+            :any:`GaussianSelector`
+
+        '''
+        if isinstance(scorer, DiagonalNormalSetScorer):
+            scales = scorer.scales
+        elif isinstance(scorer, FullNormalSetScorer):
+            # Square root of the diagonal of the precision matrices.
+            scales = (scorer.whiteners ** 2).sum(dim=-1).sqrt()
+            scales = scales.expand_as(scorer.means)
+        else:
+            raise ValueError('Gaussian selection is not supported for ' \
+                             '{}'.format(type(scorer).__name__))
+
+        # K-means on the means normalized by the average scale.
+        norm = scales.mean(dim=0)
+        points = scorer.means * norm
+        n_clusters = min(n_clusters, len(points))
+        init_idxs = torch.randperm(len(points))[:n_clusters]
+        centroids = points[init_idxs.to(points.device)]
+        for _ in range(n_iters):
+            assignments = torch.cdist(points, centroids).argmin(dim=-1)
+            counts = torch.bincount(assignments, minlength=n_clusters)
+            sums = torch.zeros_like(centroids).index_add_(0, assignments,
+                                                          points)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] \
+                / counts[nonempty, None].type(points.dtype)
+        assignments = torch.cdist(points, centroids).argmin(dim=-1)
+        _, assignments = torch.unique(assignments, return_inverse=True)
+        counts = torch.bincount(assignments).type(points.dtype)
+
+        # Background model: the mean and the precision of each cluster
+        # are the average of those of its Gaussians.
+        means = torch.zeros(len(counts), points.shape[1], dtype=points.dtype,
+                            device=points.device)
+        means.index_add_(0, assignments, scorer.means)
+        means /= counts[:, None]
+        precisions = torch.zeros_like(means).index_add_(0, assignments,
+                                                        scales ** 2)
+        precisions /= counts[:, None]
+        clusters = DiagonalNormalSetScorer(means, precisions.sqrt(),
+                                           .5 * precisions.log().sum(dim=-1))
+
+        # Shortlists of the clusters.
+        gaussians = torch.argsort(assignments, stable=True)
+        return cls(clusters, gaussians, torch.bincount(assignments), n_best)
+
+    def __init__(self, clusters, gaussians, sizes, n_best):
+        self.clusters = clusters
+        self.gaussians = gaussians
+        self.sizes = sizes
+        self.offsets = sizes.cumsum(dim=0) - sizes
+        self.n_best = min(n_best, len(sizes))
+        self.reset()
+
+    def reset(self):
+        'Reset the pruning statistics.'
+        self.n_frames = 0
+        self.n_selected = 0
+
+    @property
+    def mean_n_selected(self):
+        'float: Average number of selected Gaussians per frame.'
+        return self.n_selected / max(self.n_frames, 1)
+
+    def select(self, data):
+        '''Select the Gaussians for each frame.
+
+        Args:
+            data (``torch.Tensor[n_frames, dim]``): Features.
+
+        Returns:
+            (``torch.LongTensor[n]``, ``torch.LongTensor[n]``): Frame
+            and index of each selected Gaussian.
+
+        '''
+        llhs = self.clusters.log_likelihood(data)
+        best_clusters = torch.topk(llhs, self.n_best, dim=-1)[1].view(-1)
+
+        # Concatenate the shortlists of the selected clusters.
+        counts = self.sizes[best_clusters]
+        starts = self.offsets[best_clusters]
+        positions = torch.arange(int(counts.sum()), device=counts.device)
+        positions += (starts - counts.cumsum(dim=0) + counts) \
+            .repeat_interleave(counts)
+        frames = torch.arange(len(data), device=counts.device)
+        frames = frames.repeat_interleave(
+            counts.view(len(data), -1).sum(dim=-1))
+        self.n_frames += len(data)
+        self.n_selected += len(positions)
+        return frames, self.gaussians[positions]
+
+    def hit_rate(self, scorer, data):
+        '''Proportion of frames for which the best Gaussian is
+        selected.
+
+        Args:
+            scorer (:any:`DiagonalNormalSetScorer` or
+                :any:`FullNormalSetScorer`): Scorer of the Gaussians.
+            data (``torch.Tensor[n_frames, dim]``): Features.
+
+        Returns:
+            float
+
+        '''
+        best = scorer.log_likelihood(data).argmax(dim=-1)
+        frames, gaussians = self.select(data)
+        hits = torch.zeros(len(data), dtype=torch.bool, device=best.device)
+        hits[frames[gaussians == best[frames]]] = True
+        return float(hits.double().mean())
+
+
+def normal_set_scorer(precisions, linear_nparams, consts, diagonal):
+    '''Create the scorer of a set of Normal densities from the expected
+    natural parameters of their posteriors.
+
+    Args:
+        precisions (``torch.Tensor``): Expected precision (matrix) of
+            each density (``[k, dim]`` or ``[k, dim, dim]``) or of all
+            the densities (shared covariance). For the diagonal
+            covariance, any shape that can be broadcasted to
+            ``[k, dim]`` is accepted.
+        linear_nparams (``torch.Tensor[k, dim]``): Expected value of
+            the precision matrix times the mean of each density.
+        consts (``torch.Tensor[k]``): Terms of the expected
+            log-likelihood that do not depend on the data (excluding
+            the normalizing constant of the Normal density).
+        diagonal (boolean): Whether the covariance matrices are
+            diagonal.
+
+    Returns:
+        :any:`DiagonalNormalSetScorer` or :any:`FullNormalSetScorer`
+
+    '''
+    dim = linear_nparams.shape[-1]
+    consts = consts - .5 * dim * math.log(2 * math.pi)
+    if diagonal:
+        precisions = precisions.expand_as(linear_nparams)
+        means = linear_nparams / precisions
+        consts = consts + .5 * (means * linear_nparams).sum(dim=-1)
+        return DiagonalNormalSetScorer(means, precisions.sqrt(), consts)
+
+    whiteners = torch.linalg.cholesky(precisions)
+    if precisions.dim() == 2:
+        means = torch.cholesky_solve(linear_nparams.t(), whiteners).t()
+    else:
+        means = torch.cholesky_solve(linear_nparams[:, :, None],
+                                     whiteners)[:, :, 0]
+    consts = consts + .5 * (means * linear_nparams).sum(dim=-1)
+    return FullNormalSetScorer(means, whiteners, consts)
+
+
+__all__ = [
+    'DiagonalNormalSetScorer',
+    'FullNormalSetScorer',
+    'MixtureSetScorer',
+    'JointScorer',
+    'RepeatedScorer',
+    'GaussianSelector',
+]
@@ -27,6 +27,88 @@ def onehot(labels, max_label, dtype, device):
     return retval
 
 
+def is_hard_assignment(resps):
+    '''Whether responsibilities are given as hard assignments, i.e.
+    as the index of the component of each data point rather than as a
+    N x K matrix.
+
+    Args:
+        resps (``torch.Tensor``): Responsibilities.
+
+    Returns:
+        boolean
+    '''
+    return not resps.is_floating_point()
+
+
+def weighted_sum(resps, stats, n_components):
+    '''Sum of the statistics of each component weighted by the
+    responsibilities.
+
+    For hard assignments, the statistics are summed with a single
+    ``index_add_``: the cost is O(N x D) whatever the number of
+    components.
+
+    Args:
+        resps (``torch.Tensor[N, n_components]`` or
+            ``torch.LongTensor[N]``): Responsibilities or hard
+            assignments (index of the component of each data point).
+        stats (``torch.Tensor[N, D]``): Statistics.
+        n_components (int): Number of components.
+
+    Returns:
+        ``torch.Tensor[n_components, D]``
+    '''
+    if not is_hard_assignment(resps):
+        return resps.t() @ stats
+    retval = torch.zeros(n_components, stats.shape[1], dtype=stats.dtype,
+                         device=stats.device)
+    return retval.index_add_(0, resps, stats)
+
+
+# Maximum number of components accumulated at once by
+# :any:`weighted_outer_sum` (to bound the memory).
+_BLOCK_SIZE = 16
+
+
+def weighted_outer_sum(resps, data, n_components):
+    '''Sum of the outer products of the data weighted by the
+    responsibilities, i.e. :math:`X^T \\text{diag}(r_k) X` for each
+    component.
+
+    The outer products of the data points are never stored: the
+    components are accumulated by blocks and the memory is
+    O(N x D + K x D x D).
+
+    Args:
+        resps (``torch.Tensor[N, n_components]`` or
+            ``torch.LongTensor[N]``): Responsibilities or hard
+            assignments (index of the component of each data point).
+        data (``torch.Tensor[N, D]``): Data.
+        n_components (int): Number of components.
+
+    Returns:
+        ``torch.Tensor[n_components, D, D]``
+    '''
+    dim, dtype, device = data.shape[1], data.dtype, data.device
+    retval = torch.zeros(n_components, dim, dim, dtype=dtype, device=device)
+    for start in range(0, n_components, _BLOCK_SIZE):
+        end = min(start + _BLOCK_SIZE, n_components)
+        if is_hard_assignment(resps):
+            # Only the data points assigned to the block.
+            mask = (resps >= start) & (resps < end)
+            if not mask.any():
+                continue
+            b_data = data[mask]
+            b_resps = onehot(resps[mask] - start, end - start, dtype, device)
+        else:
+            b_data, b_resps = data, resps[:, start:end]
+        w_data = (b_resps[:, :, None] * b_data[:, None, :]).reshape(
+            len(b_data), -1)
+        retval[start:end] = (w_data.t() @ b_data).view(-1, dim, dim)
+    return retval
+
+
 def logsumexp(tensor, dim=0):
     '''Stable log -> sum -> exponential computation
 
@@ -148,5 +230,7 @@ def approximate_hessian(list_grads):
     return hessians
 
 
-__all__ = ['onehot', 'logsumexp', 'symmetrize_matrix', 'make_symposdef',
-           'sample_from_normals', 'jacobians', 'approximate_hessian']
+__all__ = ['onehot', 'is_hard_assignment', 'weighted_sum',
+           'weighted_outer_sum', 'logsumexp', 'symmetrize_matrix',
+           'make_symposdef', 'sample_from_normals', 'jacobians',
+           'approximate_hessian']
@@ -0,0 +1,105 @@
+'''Benchmark the beam search decoder against the exhaustive Viterbi
+decoding on phone loops of increasing size and the online decoder on
+long streams.
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import create_units, create_phone_loop
+from graph import timeit
+
+
+def create_llhs(n_units, n_states, n_frames, noise_std=3., offset=10.):
+    '''Per-frame log-likelihood of the pdfs favoring a random sequence
+    of units (to mimic the output of a trained model).'''
+    pdf_ids = []
+    while len(pdf_ids) < n_frames:
+        unit = int(torch.randint(n_units, (1,)))
+        for state in range(n_states):
+            duration = int(torch.randint(1, 5, (1,)))
+            pdf_ids += [unit * n_states + state] * duration
+    pdf_ids = torch.LongTensor(pdf_ids[:n_frames])
+    llhs = noise_std * torch.randn(n_frames, n_units * n_states)
+    llhs[torch.arange(n_frames), pdf_ids] += offset
+    return llhs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-units', type=int, nargs='+',
+                        default=[48, 200, 500],
+                        help='number of units of the phone loops')
+    parser.add_argument('--n-states', type=int, default=3,
+                        help='number of emitting states per unit')
+    parser.add_argument('--n-frames', type=int, default=300,
+                        help='number of frames of the utterance')
+    parser.add_argument('--beams', type=float, nargs='+',
+                        default=[20., 10.],
+                        help='log-likelihood beams')
+    parser.add_argument('--max-active', type=int, default=None,
+                        help='maximum number of active states')
+    parser.add_argument('--stream-n-frames', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='number of frames of the streams')
+    parser.add_argument('--chunk-size', type=int, default=50,
+                        help='number of frames per chunk of the streams')
+    args = parser.parse_args()
+
+    print('{:>7} {:>8} {:>12} {:>10} {:>10} {:>10}'.format(
+        'states', 'beam', 'time (s)', 'speedup', 'active', 'accuracy'))
+    for n_units in args.n_units:
+        units = create_units(n_units, args.n_states)
+        cgraph = create_phone_loop(units).compile()
+        pdf_llhs = create_llhs(n_units, args.n_states, args.n_frames)
+        llhs = pdf_llhs[:, cgraph.pdf_id_mapping]
+        ref_time, ref_path = timeit(cgraph.best_path, llhs)
+        print('{:>7} {:>8} {:>12.4f} {:>10} {:>10} {:>10}'.format(
+            cgraph.n_states, '-', ref_time, '-', cgraph.n_states, '-'))
+        llh_fn = lambda frames, pdf_ids: pdf_llhs[frames][:, pdf_ids]
+        for beam in args.beams:
+            decoder = beer.BeamSearchDecoder(cgraph, beam=beam,
+                                             max_active=args.max_active)
+            dec_time, path = timeit(decoder.decode, llh_fn, args.n_frames)
+            n_active = sum(decoder.n_active) / len(decoder.n_active)
+            accuracy = float((path == ref_path).double().mean())
+            print('{:>7} {:>8.1f} {:>12.4f} {:>10.1f} {:>10.1f} {:>10.3f}'.format(
+                cgraph.n_states, beam, dec_time, ref_time / dec_time,
+                n_active, accuracy))
+
+    print()
+    print('Online decoding (phone loop, {} units)'.format(args.n_units[0]))
+    print('{:>8} {:>12} {:>12} {:>10} {:>10} {:>10}'.format(
+        'frames', 'offline (s)', 'online (s)', 'max delay', 'mean delay',
+        'accuracy'))
+    units = create_units(args.n_units[0], args.n_states)
+    cgraph = create_phone_loop(units).compile()
+    for n_frames in args.stream_n_frames:
+        pdf_llhs = create_llhs(args.n_units[0], args.n_states, n_frames)
+        llhs = pdf_llhs[:, cgraph.pdf_id_mapping]
+        ref_time, ref_path = timeit(cgraph.best_path, llhs, repeat=1)
+        delays = []
+        def decode_stream():
+            decoder = beer.OnlineViterbiDecoder(cgraph)
+            paths = []
+            for chunk in llhs.split(args.chunk_size):
+                paths.append(decoder.push(chunk))
+                delays.append(decoder.delay)
+            paths.append(decoder.finalize())
+            return torch.cat(paths)
+        online_time, path = timeit(decode_stream, repeat=1)
+        accuracy = float((path == ref_path).double().mean())
+        print('{:>8} {:>12.4f} {:>12.4f} {:>10} {:>10.1f} {:>10.3f}'.format(
+            n_frames, ref_time, online_time, max(delays),
+            sum(delays) / len(delays), accuracy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+'''Benchmark the creation and the compilation of the acoustic graphs.
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+import torch
+sys.path.insert(0, './')
+
+import beer
+
+
+def create_unit_graph(n_emitting_states, start_pdf_id):
+    '''Left-to-right unit graph with non-emitting start/end states.'''
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    states = [graph.add_state(pdf_id=start_pdf_id + i)
+              for i in range(n_emitting_states)]
+    graph.end_state = graph.add_state()
+    graph.add_arc(graph.start_state, states[0])
+    for state, next_state in zip(states, states[1:] + [graph.end_state]):
+        graph.add_arc(state, state)
+        graph.add_arc(state, next_state)
+    graph.normalize()
+    return graph
+
+
+def create_units(n_units, n_emitting_states):
+    return [create_unit_graph(n_emitting_states, i * n_emitting_states)
+            for i in range(n_units)]
+
+
+def create_phone_loop(units):
+    '''Phone loop graph: all the units are connected through a single
+    non-emitting "joint" state.'''
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    graph.end_state = graph.add_state()
+    joint_state = graph.add_state()
+    graph.add_arc(graph.start_state, joint_state)
+    graph.add_arc(joint_state, graph.end_state)
+    for unit in units:
+        unit_state = graph.add_state()
+        graph.add_arc(joint_state, unit_state)
+        graph.add_arc(unit_state, joint_state)
+        graph.replace_state(unit_state, unit)
+    graph.normalize()
+    return graph
+
+
+def create_alignment_graph(seq, units):
+    '''Linear graph for a sequence of units (as done by the alignment
+    recipes).'''
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    last_state = graph.start_state
+    unit_states = []
+    for _ in seq:
+        state = graph.add_state()
+        unit_states.append(state)
+        graph.add_arc(last_state, state)
+        last_state = state
+    graph.end_state = graph.add_state()
+    graph.add_arc(last_state, graph.end_state)
+    for state, unit in zip(unit_states, seq):
+        graph.replace_state(state, units[unit])
+    graph.normalize()
+    return graph
+
+
+def timeit(func, *args, repeat=3):
+    best, retval = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        retval = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, retval
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-units', type=int, default=40,
+                        help='number of units in the phone loop')
+    parser.add_argument('--n-states', type=int, default=3,
+                        help='number of emitting states per unit')
+    parser.add_argument('--seq-length', type=int, default=1000,
+                        help='number of units in the alignment graph')
+    parser.add_argument('--decode-n-units', type=int, default=500,
+                        help='number of units in the large decoding graph')
+    parser.add_argument('--n-utts', type=int, default=200,
+                        help='number of utterances for the alignment graphs')
+    parser.add_argument('--utt-length', type=int, default=40,
+                        help='number of units per utterance')
+    args = parser.parse_args()
+
+    units = create_units(args.n_units, args.n_states)
+    seq = [i % args.n_units for i in range(args.seq_length)]
+
+    duration, graph = timeit(create_phone_loop, units)
+    print('phone loop ({} units, {} states, {} arcs)'.format(
+        args.n_units, len(graph.states()), graph.n_arcs))
+    print('  build:   {:.4f} s'.format(duration))
+    duration, cgraph = timeit(graph.compile)
+    print('  compile: {:.4f} s ({} emitting states)'.format(duration,
+                                                         cgraph.n_states))
+
+    duration, graph = timeit(create_alignment_graph, seq, units)
+    print('alignment graph ({} units, {} states, {} arcs)'.format(
+        args.seq_length, len(graph.states()), graph.n_arcs))
+    print('  build:   {:.4f} s'.format(duration))
+    duration, cgraph = timeit(graph.compile)
+    print('  compile: {:.4f} s ({} emitting states)'.format(duration,
+                                                         cgraph.n_states))
+    unit_graphs = [unit.compile() for unit in units]
+    duration, _ = timeit(beer.graph.CompiledGraph.from_sequence, seq,
+                          unit_graphs)
+    print('  from sequence: {:.4f} s'.format(duration))
+
+    seqs = [[int(unit) for unit in torch.randint(args.n_units,
+                                                 (args.utt_length,))]
+            for _ in range(args.n_utts)]
+    def graph_path():
+        return [create_alignment_graph(seq, units).compile() for seq in seqs]
+    def sequence_path():
+        return [beer.graph.CompiledGraph.from_sequence(seq, unit_graphs)
+                for seq in seqs]
+    print('alignment graphs ({} utterances, {} units per utterance)'.format(
+        args.n_utts, args.utt_length))
+    ref_duration, _ = timeit(graph_path, repeat=1)
+    print('  build + compile: {:.4f} s'.format(ref_duration))
+    duration, cgraphs = timeit(sequence_path, repeat=1)
+    print('  from sequence:   {:.4f} s (x{:.1f})'.format(
+        duration, ref_duration / duration))
+
+    # Storage of the alignment graphs: one pickled graph per utterance
+    # in a zip archive (as done previously by the recipes) vs archive of
+    # compiled graphs.
+    uttids = ['utt{}'.format(i) for i in range(args.n_utts)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        npz_path = os.path.join(tmpdir, 'ali_graphs.npz')
+        with zipfile.ZipFile(npz_path, 'w', zipfile.ZIP_DEFLATED) as fid:
+            for uttid, cgraph in zip(uttids, cgraphs):
+                buffer = io.BytesIO()
+                np.save(buffer, np.array([cgraph]))
+                fid.writestr(uttid + '.npy', buffer.getvalue())
+        archive_path = os.path.join(tmpdir, 'ali_graphs.graphs')
+        beer.graph.save_compiled_graphs(archive_path, zip(uttids, cgraphs))
+
+        def load_npz():
+            graphs = np.load(npz_path, allow_pickle=True)
+            return [graphs[uttid][0] for uttid in uttids]
+        def load_archive():
+            graphs = beer.graph.CompiledGraphArchive(archive_path)
+            return [graphs[uttid] for uttid in uttids]
+        print('alignment graphs storage')
+        ref_duration, _ = timeit(load_npz)
+        print('  npz:     {:.2f} MB, load: {:.4f} s'.format(
+            os.path.getsize(npz_path) / 2**20, ref_duration))
+        duration, _ = timeit(load_archive)
+        print('  archive: {:.2f} MB, load: {:.4f} s (x{:.1f})'.format(
+            os.path.getsize(archive_path) / 2**20, duration,
+            ref_duration / duration))
+
+    units = create_units(args.decode_n_units, args.n_states)
+    duration, graph = timeit(create_phone_loop, units, repeat=1)
+    print('decoding graph ({} units, {} states, {} arcs)'.format(
+        args.decode_n_units, len(graph.states()), graph.n_arcs))
+    print('  build:   {:.4f} s'.format(duration))
+    duration, cgraph = timeit(graph.compile, repeat=1)
+    print('  compile: {:.4f} s ({} emitting states, {})'.format(
+        duration, cgraph.n_states,
+        'sparse' if cgraph.is_sparse else 'dense'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+'''Benchmark the mapping between the states of the inference graph
+and the pdfs of the HMM (:any:`AlignModelSet`) and the accumulation of
+the statistics for hard assignments (Viterbi training).
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import timeit
+
+
+def loop_expected_log_likelihood(pc_exp_llh, state_ids):
+    '''Previous implementation (copy into a new tensor).'''
+    new_pc_exp_llh = torch.zeros((len(pc_exp_llh), len(state_ids)),
+                                 dtype=pc_exp_llh.dtype)
+    new_pc_exp_llh[:, :] = pc_exp_llh[:, state_ids]
+    return new_pc_exp_llh
+
+
+def loop_accumulate(resps, state_ids, n_pdfs):
+    '''Previous implementation (loop over the states).'''
+    new_resps = torch.zeros((len(resps), n_pdfs), dtype=resps.dtype)
+    for key, val in enumerate(resps.t()):
+        new_resps[:, state_ids[key]] += val
+    return new_resps
+
+
+def index_accumulate(resps, state_ids, n_pdfs):
+    new_resps = torch.zeros((len(resps), n_pdfs), dtype=resps.dtype)
+    return new_resps.index_add_(-1, state_ids, resps)
+
+
+def full_emissions(modelset, stats, state_ids, resps):
+    '''Llhs and accumulated statistics of all the pdfs (previous
+    implementation).'''
+    llhs = modelset.expected_log_likelihood(stats)[:, state_ids]
+    pdf_resps = torch.zeros(len(stats), len(modelset), dtype=resps.dtype)
+    pdf_resps.index_add_(-1, state_ids, resps)
+    return llhs, modelset.accumulate(stats, pdf_resps)
+
+
+def subset_emissions(modelset, stats, state_ids, resps):
+    '''Llhs and accumulated statistics of the pdfs used by the
+    states only.'''
+    emissions = beer.AlignModelSet(modelset, state_ids)
+    llhs = emissions.expected_log_likelihood(stats)
+    return llhs, emissions.accumulate(stats, resps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-pdfs', type=int, default=144,
+                        help='number of pdfs')
+    parser.add_argument('--n-states', type=int, nargs='+',
+                        default=[50, 200, 800],
+                        help='number of states of the alignment graphs')
+    parser.add_argument('--n-frames', type=int, default=300,
+                        help='number of frames per utterance')
+    parser.add_argument('--dim', type=int, default=39,
+                        help='dimension of the features')
+    parser.add_argument('--n-comps', type=int, default=4,
+                        help='number of Gaussians per pdf')
+    parser.add_argument('--utt-n-phones', type=int, default=15,
+                        help='number of phones of the utterances')
+    parser.add_argument('--hard-n-frames', type=int, default=10000,
+                        help='number of frames for the hard assignments')
+    parser.add_argument('--hard-n-pdfs', type=int, nargs='+',
+                        default=[144, 1000, 4000],
+                        help='number of pdfs for the hard assignments')
+    args = parser.parse_args()
+
+    print('{:>7} {:>14} {:>14} {:>9} {:>14} {:>14} {:>9}'.format(
+        'states', 'llh loop (s)', 'llh index (s)', 'speedup',
+        'acc loop (s)', 'acc index (s)', 'speedup'))
+    for n_states in args.n_states:
+        state_ids = torch.randint(args.n_pdfs, (n_states,)).tolist()
+        state_ids_tensor = torch.tensor(state_ids)
+        pc_exp_llh = torch.randn(args.n_frames, args.n_pdfs)
+        resps = torch.rand(args.n_frames, n_states)
+
+        llh_ref_time, llhs1 = timeit(loop_expected_log_likelihood,
+                                     pc_exp_llh, state_ids)
+        llh_time, llhs2 = timeit(torch.index_select, pc_exp_llh, -1,
+                                 state_ids_tensor)
+        assert torch.equal(llhs1, llhs2)
+        acc_ref_time, acc1 = timeit(loop_accumulate, resps, state_ids,
+                                    args.n_pdfs)
+        acc_time, acc2 = timeit(index_accumulate, resps, state_ids_tensor,
+                                args.n_pdfs)
+        assert torch.allclose(acc1, acc2, atol=1e-5)
+        print('{:>7} {:>14.5f} {:>14.5f} {:>9.1f} {:>14.5f} {:>14.5f} '
+              '{:>9.1f}'.format(n_states, llh_ref_time, llh_time,
+                                llh_ref_time / llh_time, acc_ref_time,
+                                acc_time, acc_ref_time / acc_time))
+
+    # Emissions of an utterance (alignment graph) for a GMM-HMM with
+    # 3-state phones.
+    print()
+    n_phones = args.n_pdfs // 3
+    modelset = beer.MixtureSet.create(args.n_pdfs, beer.NormalSet.create(
+        torch.zeros(args.dim), torch.ones(args.dim),
+        args.n_pdfs * args.n_comps, cov_type='diagonal'
+    ))
+    data = torch.randn(args.n_frames, args.dim)
+    stats = modelset.sufficient_statistics(data)
+    phones = torch.randint(n_phones, (args.utt_n_phones,))
+    state_ids = (3 * phones[:, None] + torch.arange(3)).view(-1)
+    resps = torch.rand(args.n_frames, len(state_ids))
+    print('alignment graph: {} states, {} of the {} pdfs '
+          '({} Gaussians per pdf)'.format(len(state_ids),
+                                          len(state_ids.unique()),
+                                          args.n_pdfs, args.n_comps))
+    ref_time, (llhs1, acc_stats1) = timeit(full_emissions, modelset, stats,
+                                           state_ids, resps)
+    print('  all the pdfs:       {:.5f} s'.format(ref_time))
+    subset_time, (llhs2, acc_stats2) = timeit(subset_emissions, modelset,
+                                              stats, state_ids, resps)
+    print('  pdfs of the graph:  {:.5f} s (x{:.1f})'.format(
+        subset_time, ref_time / subset_time))
+    assert torch.allclose(llhs1, llhs2, atol=1e-3)
+    assert all(torch.allclose(acc_stats1[param], value, atol=1e-3)
+               for param, value in acc_stats2.items())
+
+    # Accumulation of the statistics for a Viterbi path: one-hot
+    # responsibilities vs index of the pdf of each frame.
+    print()
+    print('{:>7} {:>14} {:>14} {:>9}'.format('pdfs', 'one-hot (s)',
+                                             'index (s)', 'speedup'))
+    data = torch.randn(args.hard_n_frames, args.dim)
+    for n_pdfs in args.hard_n_pdfs:
+        modelset = beer.NormalSet.create(torch.zeros(args.dim),
+                                         torch.ones(args.dim), n_pdfs,
+                                         cov_type='diagonal')
+        stats = modelset.sufficient_statistics(data)
+        path = torch.randint(n_pdfs, (args.hard_n_frames,))
+        ref_time, acc_stats1 = timeit(
+            lambda: modelset.accumulate(stats, beer.utils.onehot(
+                path, n_pdfs, dtype=stats.dtype, device=stats.device)))
+        hard_time, acc_stats2 = timeit(modelset.accumulate, stats, path)
+        assert all(torch.allclose(acc_stats1[param], value, atol=1e-3)
+                   for param, value in acc_stats2.items())
+        print('{:>7} {:>14.5f} {:>14.5f} {:>9.1f}'.format(
+            n_pdfs, ref_time, hard_time, ref_time / hard_time))
+
+
+if __name__ == '__main__':
+    main()
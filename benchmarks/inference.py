@@ -0,0 +1,170 @@
+'''Benchmark the inference (forward-backward and Viterbi) on compiled
+graphs.
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import create_units, create_phone_loop, create_alignment_graph
+from graph import timeit
+
+
+def as_dense_and_sparse(cgraph):
+    return [
+        beer.graph.CompiledGraph(cgraph.init_probs, cgraph.final_probs,
+                                 cgraph.trans_probs, cgraph.pdf_id_mapping,
+                                 sparse=sparse)
+        for sparse in [False, True]
+    ]
+
+
+def viterbi_backpointers(cgraph, llhs):
+    backtrack = torch.zeros(llhs.shape, dtype=torch.long)
+    omega = llhs[0] + cgraph.init_probs.log()
+    log_trans_probs = cgraph._log_trans_probs()
+    for i in range(1, llhs.shape[0]):
+        hypothesis, backtrack[i] = cgraph._viterbi_step(omega,
+                                                        log_trans_probs)
+        omega = llhs[i] + hypothesis
+    return backtrack, int(torch.argmax(omega + cgraph.final_probs.log()))
+
+
+def reference_traceback(backtrack, last_state):
+    '''List-based traceback on int64 back-pointers.'''
+    path = [torch.tensor(last_state)]
+    for i in reversed(range(1, len(backtrack))):
+        path.insert(0, backtrack[i, path[0]])
+    return torch.LongTensor(path)
+
+
+def posteriors_peak_memory(n_units, n_states, n_frames, checkpoint, queue):
+    '''Time and increase of the peak memory (MB) of the
+    forward-backward (to be run in a fresh process).'''
+    units = create_units(n_units, n_states)
+    cgraph = create_phone_loop(units).compile()
+    llhs = torch.randn(n_frames, cgraph.n_states)
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    cgraph.posteriors(llhs, checkpoint=checkpoint)
+    duration = time.time() - start_time
+    end_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((duration, (end_rss - start_rss) / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-units', type=int, default=40,
+                        help='number of units')
+    parser.add_argument('--n-states', type=int, default=3,
+                        help='number of emitting states per unit')
+    parser.add_argument('--n-frames', type=int, default=500,
+                        help='number of frames per utterance')
+    parser.add_argument('--long-n-frames', type=int, nargs='+',
+                        default=[10000, 30000],
+                        help='number of frames of the long utterances')
+    parser.add_argument('--seq-lengths', type=int, nargs='+',
+                        default=[20, 70, 200, 700],
+                        help='number of units of the alignment graphs')
+    parser.add_argument('--checkpoint-n-frames', type=int, nargs='+',
+                        default=[20000, 80000],
+                        help='number of frames for the checkpointed '
+                             'forward-backward')
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[8, 32],
+                        help='number of utterances of the batches')
+    args = parser.parse_args()
+
+    units = create_units(args.n_units, args.n_states)
+    graphs = [('phone loop', create_phone_loop(units))]
+    for length in args.seq_lengths:
+        seq = [i % args.n_units for i in range(length)]
+        graphs.append(('alignment ({} units)'.format(length),
+                       create_alignment_graph(seq, units)))
+
+    print('{:<25} {:>7} {:>7} {:>12} {:>12}'.format(
+        'graph', 'states', 'format', 'fw-bw (s)', 'viterbi (s)'))
+    for name, graph in graphs:
+        cgraph = graph.compile()
+        llhs = torch.randn(args.n_frames, cgraph.n_states)
+        for cgraph in as_dense_and_sparse(cgraph):
+            fmt = 'sparse' if cgraph.is_sparse else 'dense'
+            fb_time, _ = timeit(cgraph.posteriors, llhs)
+            vit_time, _ = timeit(cgraph.best_path, llhs)
+            print('{:<25} {:>7} {:>7} {:>12.4f} {:>12.4f}'.format(
+                name, cgraph.n_states, fmt, fb_time, vit_time))
+
+    print()
+    print('Viterbi on long utterances (phone loop)')
+    print('{:>8} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+        'frames', 'ref. tb (s)', 'tb (s)', 'ref. bp (MB)', 'bp (MB)',
+        'viterbi (s)'))
+    cgraph = create_phone_loop(units).compile()
+    dtype = beer.graph._backtrack_dtype(cgraph.n_states)
+    for n_frames in args.long_n_frames:
+        llhs = torch.randn(n_frames, cgraph.n_states)
+        backtrack, last_state = viterbi_backpointers(cgraph, llhs)
+        compact_backtrack = backtrack.to(dtype).numpy()
+        ref_time, path1 = timeit(reference_traceback, backtrack, last_state,
+                                 repeat=1)
+        tb_time, path2 = timeit(beer.graph._traceback, compact_backtrack,
+                                last_state)
+        vit_time, path3 = timeit(cgraph.best_path, llhs, repeat=1)
+        assert (path1.numpy() == path2).all() and (path1 == path3).all()
+        print('{:>8} {:>12.4f} {:>12.4f} {:>12.2f} {:>12.2f} {:>12.4f}'.format(
+            n_frames, ref_time, tb_time, backtrack.numpy().nbytes / 2**20,
+            compact_backtrack.nbytes / 2**20, vit_time))
+
+    print()
+    print('Batched inference (phone loop)')
+    print('{:>6} {:>14} {:>14} {:>14} {:>14}'.format(
+        'batch', 'loop fw-bw (s)', 'fw-bw (s)', 'loop vit. (s)',
+        'viterbi (s)'))
+    for batch_size in args.batch_sizes:
+        lengths = torch.randint(args.n_frames // 2, args.n_frames + 1,
+                                (batch_size,))
+        llhs = [torch.randn(int(length), cgraph.n_states)
+                for length in lengths]
+        padded_llhs = torch.nn.utils.rnn.pad_sequence(llhs, batch_first=True)
+        loop_fb_time, _ = timeit(lambda: [cgraph.posteriors(utt_llhs)
+                                          for utt_llhs in llhs])
+        fb_time, _ = timeit(cgraph.posteriors, padded_llhs, 1e-6, lengths)
+        loop_vit_time, paths1 = timeit(lambda: [cgraph.best_path(utt_llhs)
+                                                for utt_llhs in llhs])
+        vit_time, paths2 = timeit(cgraph.best_path, padded_llhs, lengths)
+        assert all((path1 == path2).all()
+                   for path1, path2 in zip(paths1, paths2))
+        print('{:>6} {:>14.4f} {:>14.4f} {:>14.4f} {:>14.4f}'.format(
+            batch_size, loop_fb_time, fb_time, loop_vit_time, vit_time))
+
+    print()
+    print('Checkpointed forward-backward (phone loop)')
+    print('{:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+        'frames', 'fw-bw (s)', 'peak (MB)', 'ckpt. (s)', 'ckpt. (MB)'))
+    context = multiprocessing.get_context('spawn')
+    for n_frames in args.checkpoint_n_frames:
+        results = []
+        for checkpoint in [False, True]:
+            queue = context.Queue()
+            process = context.Process(
+                target=posteriors_peak_memory,
+                args=(args.n_units, args.n_states, n_frames, checkpoint, queue)
+            )
+            process.start()
+            results += queue.get()
+            process.join()
+        print('{:>8} {:>12.4f} {:>12.1f} {:>12.4f} {:>12.1f}'.format(
+            n_frames, *results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+'''Benchmark the marginal log-likelihood of the sets of Normal
+densities (inner loop of the collapsed variational Bayes) and the
+update of their parameters (:any:`StackedBayesianParameterSet` and
+:any:`BayesianParameterArena`) against the previous implementations
+(loop over the components).
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import copy
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import timeit
+
+
+NORMALS = {
+    'isotropic': beer.NormalIsotropicCovariance,
+    'diagonal': beer.NormalDiagonalCovariance,
+    'full': beer.NormalFullCovariance,
+}
+
+
+def loop_marginal_log_likelihood(posteriors, normal_cls, stats):
+    '''Previous implementation (loop over the components).'''
+    m_llhs = []
+    for posterior in posteriors:
+        c_m_llhs = normal_cls._marginal_log_likelihood(posterior, stats)
+        m_llhs.append(c_m_llhs.view(-1, 1))
+    return torch.cat(m_llhs, dim=-1)
+
+
+def loop_update(params, acc_stats, lrate=1.):
+    '''Previous implementation (one parameter per component).'''
+    for param, param_stats in zip(params, acc_stats):
+        param.store_stats(param_stats)
+        param.natural_grad_update(lrate)
+    nparams = params.expected_natural_parameters()
+    kl_div = sum(param.kl_div() for param in params)
+    return nparams, kl_div
+
+
+def loop_natural_grad_update(params, acc_stats, lrate=1.):
+    for param, param_stats in zip(params, acc_stats):
+        param.store_stats(param_stats)
+        param.natural_grad_update(lrate)
+
+
+def arena_natural_grad_update(arena, acc_stats, lrate=1.):
+    for param, param_stats in zip(arena.parameters, acc_stats):
+        param.store_stats(param_stats)
+    arena.natural_grad_update(lrate)
+
+
+def stacked_update(params, acc_stats, lrate=1.):
+    params.store_stats(acc_stats)
+    params.natural_grad_update(lrate)
+    return params.expected_natural_parameters(), params.kl_div()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-comps', type=int, nargs='+',
+                        default=[100, 200, 500, 1000],
+                        help='number of components (clusters)')
+    parser.add_argument('--n-frames', type=int, default=500,
+                        help='number of frames')
+    parser.add_argument('--dim', type=int, default=39,
+                        help='dimension of the features')
+    parser.add_argument('--cov-types', nargs='+',
+                        default=['isotropic', 'diagonal', 'full'],
+                        help='types of covariance matrix')
+    args = parser.parse_args()
+
+    data = torch.randn(args.n_frames, args.dim)
+    print('{:>10} {:>6} {:>10} {:>12} {:>9}'.format(
+        'cov', 'comps', 'loop (s)', 'batched (s)', 'speedup'))
+    for cov_type in args.cov_types:
+        for n_comps in args.n_comps:
+            cov = torch.eye(args.dim) if cov_type == 'full' \
+                else torch.ones(args.dim)
+            modelset = beer.NormalSet.create(torch.zeros(args.dim), cov,
+                                             n_comps, cov_type=cov_type)
+            stats = modelset.sufficient_statistics(data)
+            posteriors = [param.posterior
+                          for param in modelset.means_precisions]
+            loop_time, llhs1 = timeit(loop_marginal_log_likelihood,
+                                      posteriors, NORMALS[cov_type], stats)
+            batch_time, llhs2 = timeit(modelset.marginal_log_likelihood,
+                                       stats)
+            assert torch.allclose(llhs1, llhs2, rtol=1e-3, atol=1e-2)
+            print('{:>10} {:>6} {:>10.4f} {:>12.4f} {:>9.1f}'.format(
+                cov_type, n_comps, loop_time, batch_time,
+                loop_time / batch_time))
+
+    # Update of the parameters: natural gradient step, expected
+    # natural parameters and KL divergence.
+    print()
+    print('{:>10} {:>6} {:>10} {:>12} {:>9}'.format(
+        'cov', 'comps', 'loop (s)', 'stacked (s)', 'speedup'))
+    for cov_type in args.cov_types:
+        for n_comps in args.n_comps:
+            cov = torch.eye(args.dim) if cov_type == 'full' \
+                else torch.ones(args.dim)
+            modelset = beer.NormalSet.create(torch.zeros(args.dim), cov,
+                                             n_comps, cov_type=cov_type)
+            stacked_params = modelset.means_precisions
+            params = beer.BayesianParameterSet([
+                beer.BayesianParameter(param.prior, copy.copy(param.posterior))
+                for param in stacked_params
+            ])
+            stats = modelset.sufficient_statistics(data)
+            resps = torch.rand(args.n_frames, n_comps)
+            acc_stats = modelset.accumulate(stats, resps)[stacked_params]
+            loop_time, (nparams1, kl_div1) = timeit(loop_update, params,
+                                                    acc_stats)
+            stacked_time, (nparams2, kl_div2) = timeit(
+                stacked_update, stacked_params, acc_stats)
+            assert torch.allclose(nparams1, nparams2, rtol=1e-3, atol=1e-2)
+            assert torch.allclose(kl_div1, kl_div2, rtol=1e-3)
+            print('{:>10} {:>6} {:>10.4f} {:>12.4f} {:>9.1f}'.format(
+                cov_type, n_comps, loop_time, stacked_time,
+                loop_time / stacked_time))
+
+    # Natural gradient step of independent parameters (one parameter
+    # per component): loop vs :any:`BayesianParameterArena`.
+    print()
+    print('{:>10} {:>6} {:>10} {:>12} {:>9}'.format(
+        'cov', 'comps', 'loop (s)', 'arena (s)', 'speedup'))
+    for cov_type in args.cov_types:
+        for n_comps in args.n_comps:
+            cov = torch.eye(args.dim) if cov_type == 'full' \
+                else torch.ones(args.dim)
+            modelset = beer.NormalSet.create(torch.zeros(args.dim), cov,
+                                             n_comps, cov_type=cov_type)
+            stacked_params = modelset.means_precisions
+            params1 = [beer.BayesianParameter(param.prior,
+                                              copy.copy(param.posterior))
+                       for param in stacked_params]
+            params2 = [beer.BayesianParameter(param.prior,
+                                              copy.deepcopy(param.posterior))
+                       for param in stacked_params]
+            arena = beer.BayesianParameterArena(params2)
+            stats = modelset.sufficient_statistics(data)
+            resps = torch.rand(args.n_frames, n_comps)
+            acc_stats = modelset.accumulate(stats, resps)[stacked_params]
+            loop_time, _ = timeit(loop_natural_grad_update, params1,
+                                  acc_stats)
+            arena_time, _ = timeit(arena_natural_grad_update, arena,
+                                   acc_stats)
+            nparams1 = torch.stack([param.posterior.natural_parameters
+                                    for param in params1])
+            nparams2 = arena.posteriors.view(n_comps, -1)
+            assert torch.allclose(nparams1, nparams2, rtol=1e-3, atol=1e-2)
+            print('{:>10} {:>6} {:>10.4f} {:>12.4f} {:>9.1f}'.format(
+                cov_type, n_comps, loop_time, arena_time,
+                loop_time / arena_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''Benchmark the data-parallel E-step
+(:any:`ParallelEvidenceLowerBound`) against the serial evaluation of
+the ELBO for a GMM and a phone-loop HMM (padded batch).
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import multiprocessing
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import create_units, create_phone_loop
+from graph import timeit
+
+
+def create_gmm(n_comps, dim):
+    normalset = beer.NormalSet.create(torch.zeros(dim), torch.ones(dim),
+                                      n_comps, noise_std=1.,
+                                      cov_type='diagonal')
+    return beer.Mixture.create(normalset)
+
+
+def create_hmm(n_units, n_states, dim):
+    cgraph = create_phone_loop(create_units(n_units, n_states)).compile()
+    normalset = beer.NormalSet.create(torch.zeros(dim), torch.ones(dim),
+                                      cgraph.n_states, noise_std=1.,
+                                      cov_type='diagonal')
+    return beer.HMM.create(cgraph, normalset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-workers', type=int, nargs='+',
+                        default=[1, 2, 4, multiprocessing.cpu_count()],
+                        help='number of worker processes')
+    parser.add_argument('--dim', type=int, default=39,
+                        help='dimension of the features')
+    parser.add_argument('--n-comps', type=int, default=512,
+                        help='number of Gaussians of the GMM')
+    parser.add_argument('--n-frames', type=int, default=20000,
+                        help='number of frames of the GMM batch')
+    parser.add_argument('--n-units', type=int, default=40,
+                        help='number of units in the phone loop')
+    parser.add_argument('--n-states', type=int, default=3,
+                        help='number of emitting states per unit')
+    parser.add_argument('--n-utts', type=int, default=32,
+                        help='number of utterances of the HMM batch')
+    parser.add_argument('--utt-length', type=int, default=500,
+                        help='number of frames per utterance')
+    args = parser.parse_args()
+
+    gmm = create_gmm(args.n_comps, args.dim)
+    gmm_data = torch.randn(args.n_frames, args.dim)
+    hmm = create_hmm(args.n_units, args.n_states, args.dim)
+    lengths = torch.randint(args.utt_length // 2, args.utt_length + 1,
+                            (args.n_utts,))
+    hmm_data = torch.nn.utils.rnn.pad_sequence(
+        [torch.randn(int(length), args.dim) for length in lengths],
+        batch_first=True
+    )
+    benchmarks = [
+        ('gmm', gmm, gmm_data, {}),
+        ('hmm', hmm, hmm_data, {'lengths': lengths,
+                                'inference_type': 'baum_welch'}),
+    ]
+
+    print('{:>6} {:>8} {:>11} {:>13} {:>9}'.format(
+        'model', 'workers', 'serial (s)', 'parallel (s)', 'speedup'))
+    for name, model, data, kwargs in benchmarks:
+        ref_time, elbo1 = timeit(
+            lambda: beer.evidence_lower_bound(model, data, **kwargs))
+        for n_workers in args.n_workers:
+            with beer.ParallelEvidenceLowerBound(model, n_workers) as elbo_fn:
+                par_time, elbo2 = timeit(lambda: elbo_fn(data, **kwargs))
+            assert abs(float(elbo1) - float(elbo2)) <= 1e-3 * abs(float(elbo1))
+            print('{:>6} {:>8} {:>11.4f} {:>13.4f} {:>9.1f}'.format(
+                name, n_workers, ref_time, par_time, ref_time / par_time))
+
+
+if __name__ == '__main__':
+    main()
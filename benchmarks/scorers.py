@@ -0,0 +1,122 @@
+'''Benchmark the frozen emission scorers against the expected
+log-likelihood of the model sets (sufficient statistics) for decoding
+and the Gaussian selection for large GMM emissions.
+
+This script should be run from the beer root directory.
+
+'''
+
+import argparse
+import math
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './benchmarks')
+
+import torch
+import beer
+from graph import timeit
+
+
+def create_modelset(cov_type, shared_cov, n_pdfs, n_comps, dim,
+                    noise_std=.1):
+    cov = torch.eye(dim) if cov_type == 'full' else torch.ones(dim)
+    normalset = beer.NormalSet.create(torch.zeros(dim), cov,
+                                      n_pdfs * n_comps, noise_std=noise_std,
+                                      cov_type=cov_type,
+                                      shared_cov=shared_cov)
+    if n_comps == 1:
+        return normalset
+    return beer.MixtureSet.create(n_pdfs, normalset)
+
+
+def expected_log_likelihood(modelset, data):
+    '''Emissions from the posteriors (previous implementation).'''
+    stats = modelset.sufficient_statistics(data)
+    return modelset.expected_log_likelihood(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-pdfs', type=int, default=144,
+                        help='number of pdfs')
+    parser.add_argument('--n-comps', type=int, nargs='+', default=[1, 4],
+                        help='number of Gaussians per pdf')
+    parser.add_argument('--n-frames', type=int, default=300,
+                        help='number of frames per utterance')
+    parser.add_argument('--dim', type=int, default=39,
+                        help='dimension of the features')
+    parser.add_argument('--cov-types', nargs='+',
+                        default=['isotropic', 'diagonal', 'full'],
+                        help='types of covariance matrix')
+    parser.add_argument('--gselect-n-pdfs', type=int, default=500,
+                        help='number of pdfs (Gaussian selection)')
+    parser.add_argument('--gselect-n-comps', type=int, default=16,
+                        help='number of Gaussians per pdf (Gaussian '
+                             'selection)')
+    parser.add_argument('--gselect-clusters', type=int, default=256,
+                        help='number of clusters (Gaussian selection)')
+    parser.add_argument('--gselect-best', type=int, nargs='+',
+                        default=[2, 4, 8, 16],
+                        help='number of selected clusters per frame')
+    args = parser.parse_args()
+
+    data = torch.randn(args.n_frames, args.dim)
+    print('{:>10} {:>7} {:>6} {:>12} {:>12} {:>9}'.format(
+        'cov', 'shared', 'comps', 'stats (s)', 'scorer (s)', 'speedup'))
+    for cov_type in args.cov_types:
+        for shared_cov in [False, True]:
+            for n_comps in args.n_comps:
+                modelset = create_modelset(cov_type, shared_cov, args.n_pdfs,
+                                           n_comps, args.dim)
+                scorer = modelset.scorer()
+                ref_time, llhs1 = timeit(expected_log_likelihood, modelset,
+                                         data)
+                scorer_time, llhs2 = timeit(scorer.log_likelihood, data)
+                assert torch.allclose(llhs1, llhs2, rtol=1e-3, atol=1e-2)
+                print('{:>10} {:>7} {:>6} {:>12.5f} {:>12.5f} {:>9.1f}'.format(
+                    cov_type, str(shared_cov), n_comps, ref_time,
+                    scorer_time, ref_time / scorer_time))
+
+    # Gaussian selection. The means of the Gaussians are grouped around
+    # a few centers (as the Gaussians of the states of a same phone)
+    # and the frames are sampled from the Gaussians to mimic the data
+    # of a trained model.
+    print()
+    n_gaussians = args.gselect_n_pdfs * args.gselect_n_comps
+    centers = 3 * torch.randn(args.gselect_clusters, args.dim)
+    means = centers[torch.randint(len(centers), (n_gaussians,))]
+    means += .5 * torch.randn(n_gaussians, args.dim)
+    scales = 1 + torch.rand(n_gaussians, args.dim)
+    gaussians_scorer = beer.DiagonalNormalSetScorer(means, scales,
+                                                    scales.log().sum(dim=-1))
+    log_weights = torch.zeros(args.gselect_n_pdfs, args.gselect_n_comps)
+    log_weights -= math.log(args.gselect_n_comps)
+    scorer = beer.MixtureSetScorer(log_weights, gaussians_scorer)
+    gaussians = torch.randint(n_gaussians, (args.n_frames,))
+    data = means[gaussians] \
+        + torch.randn(args.n_frames, args.dim) / scales[gaussians]
+    ref_time, ref_llhs = timeit(scorer.log_likelihood, data)
+    ref_best = ref_llhs.argmax(dim=-1)
+    print('Gaussian selection ({} pdfs, {} Gaussians per pdf, {} '
+          'clusters)'.format(args.gselect_n_pdfs, args.gselect_n_comps,
+                             args.gselect_clusters))
+    print('{:>6} {:>10} {:>10} {:>9} {:>10} {:>10}'.format(
+        'best', 'time (s)', 'speedup', 'mean k', 'hit rate', 'best pdf'))
+    print('{:>6} {:>10.5f} {:>10} {:>9} {:>10} {:>10}'.format(
+        '-', ref_time, '-', len(scorer.scorer.means), '-', '-'))
+    for n_best in args.gselect_best:
+        selector = beer.GaussianSelector.create(gaussians_scorer,
+                                                args.gselect_clusters, n_best)
+        gs_scorer = beer.MixtureSetScorer(log_weights, gaussians_scorer,
+                                          selector)
+        gs_time, llhs = timeit(gs_scorer.log_likelihood, data)
+        n_selected = selector.mean_n_selected
+        hit_rate = selector.hit_rate(scorer.scorer, data)
+        same_best = float((llhs.argmax(dim=-1) == ref_best).double().mean())
+        print('{:>6} {:>10.5f} {:>10.1f} {:>9.1f} {:>10.3f} {:>10.3f}'.format(
+            n_best, gs_time, ref_time / gs_time, n_selected, hit_rate,
+            same_best))
+
+
+if __name__ == '__main__':
+    main()
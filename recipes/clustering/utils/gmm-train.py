@@ -23,6 +23,8 @@ def main():
     parser.add_argument('--fast-eval', action='store_true')
     parser.add_argument('--lrate', type=float, default=1.,
                         help='learning rate')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='number of processes for the E-step (CPU only)')
     parser.add_argument('--use-gpu', action='store_true')
     parser.add_argument('--verbose', action='store_true')
     parser.add_argument('model', help='model to train')
@@ -58,6 +60,11 @@ def main():
                                                             lrate=args.lrate)
 
 
+    # Data-parallel E-step.
+    elbo_fn = None
+    if args.n_jobs > 1:
+        elbo_fn = beer.ParallelEvidenceLowerBound(model, args.n_jobs)
+
     tot_counts = int(stats['nframes'])
     for epoch in range(1, args.epochs + 1):
         # Shuffle the order of the utterance.
@@ -72,8 +79,13 @@ def main():
             ft = ft.to(device)
 
             # Compute the objective function.
-            elbo = beer.evidence_lower_bound(model, ft, datasize=tot_counts,
-                                             fast_eval=args.fast_eval)
+            if elbo_fn is None:
+                elbo = beer.evidence_lower_bound(model, ft,
+                                                 datasize=tot_counts,
+                                                 fast_eval=args.fast_eval)
+            else:
+                elbo = elbo_fn(ft, datasize=tot_counts,
+                               fast_eval=args.fast_eval)
 
             # Compute the gradient of the model.
             elbo.natural_backward()
@@ -89,6 +101,9 @@ def main():
                 round(elbo_value, 3))
             )
 
+    if elbo_fn is not None:
+        elbo_fn.close()
+
     with open(args.out, 'wb') as fh:
         pickle.dump(model.to(torch.device('cpu')), fh)
 
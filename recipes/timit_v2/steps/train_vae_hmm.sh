@@ -107,7 +107,7 @@ trap "rm -rf $mdl_dir/beer.tmp* &" EXIT
 
 
 # Prepare the alignments the alignemnts graphs.
-if [ ! -f $mdl_dir/ali_graphs.npz ]; then
+if [ ! -f $mdl_dir/ali_graphs.graphs ]; then
     echo "Preparing alignment graphs..."
 
     tmpdir=$(mktemp -d $mdl_dir/beer.tmp.XXXX);
@@ -122,11 +122,11 @@ if [ ! -f $mdl_dir/ali_graphs.npz ]; then
         "$data_train_dir/trans" \
         "$cmd" \
         $mdl_dir || exit 1
-    find $tmpdir -name '*npy' \
-        | zip -j -@ $mdl_dir/ali_graphs.npz > /dev/null || exit 1
+    python utils/merge-graphs.py $mdl_dir/ali_graphs.graphs \
+        $tmpdir/*.graphs || exit 1
 
 else
-    echo "Alignment graphs already prepared: $mdl_dir/ali_graphs.npz"
+    echo "Alignment graphs already prepared: $mdl_dir/ali_graphs.graphs"
 fi
 
 
@@ -153,7 +153,7 @@ if [ ! -f $mdl_dir/final.mdl ];then
 
             tmpdir=$(mktemp -d $mdl_dir/tmp.XXXX);
             cmd="python utils/vae-hmm-align.py \
-                --ali-graphs $mdl_dir/ali_graphs.npz \
+                --ali-graphs $mdl_dir/ali_graphs.graphs \
                 $mdl_dir/$mdl  $data_train_dir/feats.npz  $tmpdir"
             utils/parallel/submit_parallel.sh \
                 "$parallel_env" \
@@ -31,7 +31,7 @@ def main():
 
     ali_graphs = None
     if args.ali_graphs:
-        ali_graphs = np.load(args.ali_graphs)
+        ali_graphs = beer.graph.CompiledGraphArchive(args.ali_graphs)
 
     with open(args.hmm, 'rb') as fh:
         model = pickle.load(fh)
@@ -41,7 +41,7 @@ def main():
         ft = torch.from_numpy(feats[uttid]).float()
         graph = None
         if ali_graphs is not None:
-            graph = ali_graphs[uttid][0]
+            graph = ali_graphs[uttid]
         enc_states = model.encoder(ft)
         post_params = model.encoder_problayer1(enc_states)
         samples, _ = model.encoder_problayer1.samples_and_llh(post_params)
@@ -31,18 +31,21 @@ def main():
 
     ali_graphs = None
     if args.ali_graphs:
-        ali_graphs = np.load(args.ali_graphs)
+        ali_graphs = beer.graph.CompiledGraphArchive(args.ali_graphs)
 
     with open(args.hmm, 'rb') as fh:
         model = pickle.load(fh)
 
+    # The emissions are frozen for the alignment.
+    scorer = model.modelset.scorer()
+
     for line in sys.stdin:
         uttid = line.strip()
         ft = torch.from_numpy(feats[uttid]).float()
         graph = None
         if ali_graphs is not None:
-            graph = ali_graphs[uttid][0]
-        ali = model.decode(ft, inference_graph=graph)
+            graph = ali_graphs[uttid]
+        ali = model.decode(ft, inference_graph=graph, scorer=scorer)
         path = os.path.join(args.outdir, uttid + '.npy')
         np.save(path, ali.numpy())
 
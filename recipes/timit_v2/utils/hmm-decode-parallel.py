@@ -14,6 +14,12 @@ import beer
 
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument('--gselect-clusters', type=int,
+                        help='number of clusters of the Gaussian ' \
+                             'selection (GMM emissions)')
+    parser.add_argument('--gselect-best', type=int, default=2,
+                        help='number of selected clusters per frame ' \
+                             '(Gaussian selection)')
     parser.add_argument('model', help='Decoding model')
     parser.add_argument('feats', help='data to decode')
     parser.add_argument('outdir', help='output directory')
@@ -24,11 +30,21 @@ def main():
     with open(args.model, 'rb') as m:
         mdl = pickle.load(m)
 
+    # The emissions are frozen for the decoding.
+    if args.gselect_clusters is not None:
+        scorer = mdl.modelset.scorer(n_clusters=args.gselect_clusters,
+                                     n_best=args.gselect_best)
+    else:
+        scorer = mdl.modelset.scorer()
 
     for line in sys.stdin:
         utt = line.strip()
         ft = torch.from_numpy(feats[utt]).float()
-        best_path = mdl.decode(ft)
+        best_path = mdl.decode(ft, scorer=scorer)
+        if args.gselect_clusters is not None:
+            print('{}: {:.1f} selected Gaussians per frame'.format(
+                utt, scorer.selector.mean_n_selected), file=sys.stderr)
+            scorer.selector.reset()
         path = os.path.join(args.outdir, utt + '.npy')
         np.save(path, best_path)
 
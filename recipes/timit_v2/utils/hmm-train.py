@@ -16,7 +16,8 @@ logging.basicConfig(level=logging.INFO, format=log_format)
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--alignments', help='utterance alignemnts')
+    parser.add_argument('--alignments',
+                        help='archive of the alignment graphs')
     parser.add_argument('--batch-size', type=int,
                         help='utterance number in each batch')
     parser.add_argument('--epochs', type=int)
@@ -25,6 +26,8 @@ def main():
                         choices=['baum_welch', 'viterbi'],
                         help='how to compute the state posteriors')
     parser.add_argument('--lrate', type=float, help='learning rate')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='number of processes for the E-step (CPU only)')
     parser.add_argument('--tmpdir', help='directory to store intermediary ' \
                                          'models')
     parser.add_argument('--use-gpu', action='store_true')
@@ -39,7 +42,7 @@ def main():
 
     ali = None
     if args.alignments:
-        ali = np.load(args.alignments)
+        ali = beer.graph.CompiledGraphArchive(args.alignments)
 
     stats = np.load(args.feat_stats)
 
@@ -57,7 +60,13 @@ def main():
     optimizer = beer.BayesianModelCoordinateAscentOptimizer(params,
                                                             lrate=args.lrate)
 
+    # Data-parallel E-step.
+    elbo_fn = None
+    if args.n_jobs > 1:
+        elbo_fn = beer.ParallelEvidenceLowerBound(model, args.n_jobs)
+
     tot_counts = int(stats['nframes'])
+    elbo = beer.EvidenceLowerBoundAccumulator(model, tot_counts)
     for epoch in range(1, args.epochs + 1):
 
         # Shuffle the order of the utterance.
@@ -74,21 +83,48 @@ def main():
             optimizer.zero_grad()
 
             # Initialize the ELBO.
-            elbo = beer.evidence_lower_bound(datasize=tot_counts)
-
-            for utt in batch_keys:
-                ft = torch.from_numpy(feats[utt]).float().to(device)
-
-                # Get the alignment graph if provided.
-                graph = None
-                if ali is not None:
-                    graph = ali[utt][0].to(device)
-
-                elbo += beer.evidence_lower_bound(model, ft,
+            elbo.reset()
+
+            if elbo_fn is not None:
+                # The whole minibatch is a single ELBO.
+                if ali is None:
+                    fts = [torch.from_numpy(feats[utt]).float()
+                           for utt in batch_keys]
+                    lengths = torch.LongTensor([len(ft) for ft in fts])
+                    fts = torch.nn.utils.rnn.pad_sequence(fts,
+                                                          batch_first=True)
+                    elbo += elbo_fn(fts, datasize=tot_counts,
+                                    fast_eval=args.fast_eval,
+                                    inference_type=args.infer_type,
+                                    lengths=lengths)
+                else:
+                    seqs = [(torch.from_numpy(feats[utt]).float(),
+                             {'inference_graph': ali[utt]})
+                            for utt in batch_keys]
+                    elbo += elbo_fn.sequences(seqs, datasize=tot_counts,
+                                              fast_eval=args.fast_eval,
+                                              inference_type=args.infer_type)
+            elif ali is None:
+                # Without alignment graphs, all the utterances share
+                # the same graph and are processed as a padded batch.
+                fts = [torch.from_numpy(feats[utt]).float()
+                       for utt in batch_keys]
+                lengths = torch.LongTensor([len(ft) for ft in fts])
+                fts = torch.nn.utils.rnn.pad_sequence(fts, batch_first=True)
+                elbo += beer.evidence_lower_bound(model, fts.to(device),
                                                   datasize=tot_counts,
                                                   fast_eval=args.fast_eval,
-                                                  inference_graph=graph,
-                                                  inference_type=args.infer_type)
+                                                  inference_type=args.infer_type,
+                                                  lengths=lengths.to(device))
+            else:
+                for utt in batch_keys:
+                    ft = torch.from_numpy(feats[utt]).float().to(device)
+                    graph = ali[utt].to(device)
+                    elbo += beer.evidence_lower_bound(model, ft,
+                                                      datasize=tot_counts,
+                                                      fast_eval=args.fast_eval,
+                                                      inference_graph=graph,
+                                                      inference_type=args.infer_type)
 
             # Compute the gradient of the model.
             elbo.natural_backward()
@@ -96,7 +132,10 @@ def main():
             # Update the parameters.
             optimizer.step()
 
-            elbo_value = float(elbo) / (tot_counts * len(batch_keys))
+            # The batched ELBO is already scaled to the whole data set.
+            n_elbos = 1 if ali is None or elbo_fn is not None \
+                else len(batch_keys)
+            elbo_value = float(elbo) / (tot_counts * n_elbos)
             log_msg = 'epoch={}/{}  batch={}/{}  ELBO={}'
             logging.info(log_msg.format(epoch, args.epochs,
                                         batch_no, len(batches),
@@ -108,6 +147,8 @@ def main():
             with open(path, 'wb') as fh:
                 pickle.dump(model.to(torch.device('cpu')), fh)
 
+    if elbo_fn is not None:
+        elbo_fn.close()
 
     with open(args.out, 'wb') as fh:
         pickle.dump(model.to(torch.device('cpu')), fh)
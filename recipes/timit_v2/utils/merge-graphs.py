@@ -0,0 +1,25 @@
+'Merge archives of compiled graphs into a single archive.'
+
+
+import argparse
+import itertools
+
+import beer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out', help='output archive')
+    parser.add_argument('archives', nargs='+', help='archives to merge')
+    args = parser.parse_args()
+
+    archives = [beer.graph.CompiledGraphArchive(path)
+                for path in args.archives]
+    beer.graph.save_compiled_graphs(
+        args.out,
+        itertools.chain.from_iterable(archive.items() for archive in archives)
+    )
+
+
+if __name__ == '__main__':
+    main()
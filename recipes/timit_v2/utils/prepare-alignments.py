@@ -6,38 +6,13 @@ import pickle
 import logging
 import os
 import sys
+import tempfile
 
-import numpy as np
 import beer
 
 logging.basicConfig(format='%(levelname)s: %(message)s')
 
 
-def create_graph_from_seq(seq, phone_graphs):
-    # Create the linear graph corresponding to the sequence.
-    graph = beer.graph.Graph()
-    graph.start_state = graph.add_state()
-    last_state = graph.start_state
-    id2sym = {}
-    phone_states = []
-    for i, phone in enumerate(seq):
-        state = graph.add_state()
-        phone_states.append(state)
-        graph.add_arc(last_state, state)
-        last_state = state
-        id2sym[i] = phone
-    state = graph.add_state()
-    graph.add_arc(last_state, state)
-    graph.end_state = state
-
-    # Replace the phone states with the corresponding HMMs.
-    for i, phone in enumerate(seq):
-        graph.replace_state(phone_states[i], phone_graphs[phone])
-    graph.normalize()
-
-    return graph.compile()
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--verbose', action='store_true',
@@ -52,20 +27,24 @@ def main():
     with open(args.hmm_graphs, 'rb') as fid:
         hmm_graphs = pickle.load(fid)
 
-    graph = beer.graph.Graph()
+    # The units' graphs are compiled once and the alignment graphs are
+    # assembled directly from them.
+    unit_graphs = {unit: unit_graph.compile()
+                   for unit, unit_graph in hmm_graphs.items()}
+
+    graphs = []
     for line in sys.stdin:
         tokens = line.strip().split()
         uttid, phones = tokens[0], tokens[1:]
         logging.debug('Create alignment graph for utterance: {}'.format(uttid))
-        graph = create_graph_from_seq(phones, hmm_graphs)
-
-        path = os.path.join(args.outdir, uttid + '.npy')
-        graph = np.array([graph])
-        np.save(path, graph)
-
-    with open('test.pkl', 'wb') as fid:
-        pickle.dump(graph, fid)
-
+        graph = beer.graph.CompiledGraph.from_sequence(phones, unit_graphs)
+        graphs.append((uttid, graph))
+
+    # One archive per job (the archives of all the jobs are merged with
+    # "utils/merge-graphs.py").
+    fd, path = tempfile.mkstemp(dir=args.outdir, suffix='.graphs')
+    os.close(fd)
+    beer.graph.save_compiled_graphs(path, graphs)
 
 
 if __name__ == '__main__':
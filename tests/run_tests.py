@@ -19,28 +19,38 @@ import test_nnet
 import test_problayers
 import test_arnet
 import test_create_model
+import test_decoders
+import test_distributed
 import test_bayesmodel
 import test_expfamilyprior
 import test_features
+import test_graph
 import test_mixture
 import test_normal
+import test_parallel
 import test_hmm
 import test_subspacemodels
 import test_utils
 import test_vae
 import test_vbi
 import test_priors
+import test_scorers
 
 testcases = {
     'test_problayers': test_problayers,
     'test_arnet': test_arnet,
     'test_nnet': test_nnet,
     'test_features': test_features,
+    'test_graph': test_graph,
     'test_priors': test_priors,
+    'test_scorers': test_scorers,
     'test_bayesmodel': test_bayesmodel,
     'test_create_model': test_create_model,
+    'test_decoders': test_decoders,
+    'test_distributed': test_distributed,
     'test_mixture': test_mixture,
     'test_normal': test_normal,
+    'test_parallel': test_parallel,
     'test_subspacemodels': test_subspacemodels,
     'test_vae': test_vae,
     'test_utils': test_utils,
@@ -76,11 +86,16 @@ def run():
             test_nnet,
             test_arnet,
             test_bayesmodel,
+            test_decoders,
+            test_distributed,
             test_expfamilyprior,
             test_features,
-            #test_hmm,
+            test_graph,
+            test_hmm,
             test_mixture,
             test_normal,
+            test_parallel,
+            test_scorers,
             test_subspacemodels,
             test_utils,
             test_vae,
@@ -6,7 +6,9 @@
 import sys
 sys.path.insert(0, './')
 sys.path.insert(0, './tests')
+import copy
 import glob
+import pickle
 import yaml
 import numpy as np
 import torch
@@ -176,6 +178,386 @@ class TestBayesianParameterSet(BaseTest):
                     )
 
 
+class TestStackedBayesianParameterSet(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.size = int(1 + torch.randint(100, (1, 1)).item())
+        self.lrate = torch.rand(1).item()
+        self.params = []
+        for cov_type in ['isotropic', 'diagonal', 'full']:
+            cov = torch.eye(self.dim) if cov_type == 'full' \
+                else torch.ones(self.dim)
+            normal = beer.Normal.create(torch.zeros(self.dim).type(self.type),
+                                        cov.type(self.type),
+                                        cov_type=cov_type)
+            prior = normal.mean_precision.prior
+            posteriors = []
+            for _ in range(self.size):
+                normal = beer.Normal.create(
+                    torch.randn(self.dim).type(self.type),
+                    cov.type(self.type),
+                    prior_strength=1 + torch.rand(1).item(),
+                    cov_type=cov_type
+                )
+                posteriors.append(normal.mean_precision.posterior)
+            params = [beer.BayesianParameter(prior, posterior)
+                      for posterior in posteriors]
+            stacked_params = beer.StackedBayesianParameterSet(prior,
+                                                              posteriors)
+            self.params.append((params, stacked_params))
+
+    def test_create(self):
+        for i, (params, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                self.assertEqual(len(stacked_params), len(params))
+                for param1, param2 in zip(params, stacked_params):
+                    self.assertArraysAlmostEqual(
+                        param1.posterior.natural_parameters.numpy(),
+                        param2.posterior.natural_parameters.numpy()
+                    )
+
+    def test_expected_natural_parameters(self):
+        idxs = torch.randint(self.size, (self.size,))
+        for i, (params, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                nparams1 = torch.stack([
+                    params[idx].expected_natural_parameters()
+                    for idx in idxs.tolist()
+                ]).numpy()
+                nparams2 = stacked_params.expected_natural_parameters(idxs)
+                self.assertArraysAlmostEqual(nparams1, nparams2.numpy())
+
+    def test_kl_div(self):
+        for i, (params, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                kl_divs1 = np.array([float(param.kl_div())
+                                     for param in params])
+                kl_divs2 = stacked_params.kl_divs().numpy()
+                self.assertArraysAlmostEqual(kl_divs1, kl_divs2)
+                self.assertAlmostEqual(float(stacked_params.kl_div()),
+                                       kl_divs1.sum(),
+                                       places=self.tolplaces)
+
+    def test_natural_grad_update(self):
+        for i, (params, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                stats = torch.rand(*stacked_params.stats.shape).type(self.type)
+                for param, param_stats in zip(params, stats):
+                    param.store_stats(param_stats)
+                    param.natural_grad_update(self.lrate)
+                stacked_params.store_stats(stats)
+                stacked_params.natural_grad_update(self.lrate)
+                nparams1 = torch.stack([param.posterior.natural_parameters
+                                        for param in params]).numpy()
+                nparams2 = stacked_params.posterior.natural_parameters
+                self.assertArraysAlmostEqual(nparams1, nparams2.numpy())
+
+    def test_batched_prior(self):
+        alphas = 1 + torch.rand(2, self.size, self.dim).type(self.type)
+        priors = [beer.priors.DirichletPrior(alpha) for alpha in alphas[0]]
+        posteriors = [beer.priors.DirichletPrior(alpha)
+                      for alpha in alphas[1]]
+        params = [beer.BayesianParameter(prior, posterior)
+                  for prior, posterior in zip(priors, posteriors)]
+        stacked_params = beer.StackedBayesianParameterSet(priors, posteriors)
+        kl_divs1 = np.array([float(param.kl_div()) for param in params])
+        self.assertArraysAlmostEqual(kl_divs1,
+                                     stacked_params.kl_divs().numpy())
+        stats = torch.rand(*stacked_params.stats.shape).type(self.type)
+        for param, param_stats in zip(params, stats):
+            param.store_stats(param_stats)
+            param.natural_grad_update(self.lrate)
+        stacked_params.store_stats(stats)
+        stacked_params.natural_grad_update(self.lrate)
+        for param1, param2 in zip(params, stacked_params):
+            self.assertArraysAlmostEqual(
+                param1.prior.natural_parameters.numpy(),
+                param2.prior.natural_parameters.numpy()
+            )
+            self.assertArraysAlmostEqual(
+                param1.posterior.natural_parameters.numpy(),
+                param2.posterior.natural_parameters.numpy()
+            )
+
+
+    def test_from_parameters(self):
+        for i, (params, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                stacked_params2 = \
+                    beer.StackedBayesianParameterSet.from_parameters(params)
+                self.assertIs(stacked_params2.prior, params[0].prior)
+                self.assertArraysAlmostEqual(
+                    stacked_params2.posterior.natural_parameters.numpy(),
+                    stacked_params.posterior.natural_parameters.numpy()
+                )
+
+    def test_read_only(self):
+        for i, (_, stacked_params) in enumerate(self.params):
+            with self.subTest(i=i):
+                param = stacked_params[0]
+                nparams = param.posterior.natural_parameters
+                with self.assertRaises(AttributeError):
+                    param.posterior.natural_parameters = nparams + 1
+                with self.assertRaises(AttributeError):
+                    param.stats = torch.zeros_like(param.stats)
+
+                # The elements are views of the set.
+                stacked_params.posterior.natural_parameters[0] += 1
+                self.assertArraysAlmostEqual(
+                    param.posterior.natural_parameters.numpy(),
+                    stacked_params.posterior.natural_parameters[0].numpy()
+                )
+
+                # The copies can be modified.
+                posterior = copy.copy(param.posterior)
+                posterior.natural_parameters = nparams + 1
+                with self.assertRaises(AttributeError):
+                    param.posterior.natural_parameters = nparams + 1
+
+    def test_pickled_parameter_set(self):
+        # Models pickled before the parameters were stacked stored
+        # them in a BayesianParameterSet.
+        def old_format(model, name, shared_prior):
+            stacked_params = getattr(model, name)
+            paramset = beer.BayesianParameterSet([
+                beer.BayesianParameter(
+                    stacked_params.prior if shared_prior
+                    else copy.copy(param.prior),
+                    copy.copy(param.posterior)
+                )
+                for param in stacked_params
+            ])
+            state = dict(model.__dict__)
+            state[name] = paramset
+            state['_bayesian_parameters'] = {name: paramset}
+            old_model = type(model).__new__(type(model))
+            old_model.__dict__.update(state)
+            return old_model
+
+        data = torch.randn(20, self.dim).type(self.type)
+        for i, cov_type in enumerate(['isotropic', 'diagonal', 'full']):
+            with self.subTest(i=i):
+                cov = torch.eye(self.dim) if cov_type == 'full' \
+                    else torch.ones(self.dim)
+                normalset = beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    cov.type(self.type), 4, cov_type=cov_type)
+                mixtureset = beer.MixtureSet.create(2, normalset)
+                old_mixtureset = old_format(mixtureset, 'weights', False)
+                old_mixtureset.modelset = old_format(
+                    normalset, 'means_precisions', True)
+                old_mixtureset._submodels = {
+                    'modelset': old_mixtureset.modelset}
+                mixtureset2 = pickle.loads(pickle.dumps(old_mixtureset))
+                normalset2 = mixtureset2.modelset
+                self.assertIsInstance(normalset2.means_precisions,
+                                      beer.StackedBayesianParameterSet)
+                self.assertIsInstance(mixtureset2.weights,
+                                      beer.StackedBayesianParameterSet)
+                self.assertEqual(
+                    list(mixtureset2.bayesian_parameters()),
+                    [mixtureset2.weights, normalset2.means_precisions]
+                )
+                stats = mixtureset.sufficient_statistics(data)
+                self.assertArraysAlmostEqual(
+                    mixtureset2.expected_log_likelihood(stats).numpy(),
+                    mixtureset.expected_log_likelihood(stats).numpy()
+                )
+                self.assertArraysAlmostEqual(
+                    normalset2.marginal_log_likelihood(stats).numpy(),
+                    normalset.marginal_log_likelihood(stats).numpy()
+                )
+
+
+class TestBayesianParameterArena(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.size = int(1 + torch.randint(100, (1, 1)).item())
+        self.lrate = torch.rand(1).item()
+        self.params, self.normals = [], []
+        for cov_type in ['isotropic', 'diagonal', 'full']:
+            cov = torch.eye(self.dim) if cov_type == 'full' \
+                else torch.ones(self.dim)
+            normal = beer.Normal.create(torch.zeros(self.dim).type(self.type),
+                                        cov.type(self.type),
+                                        cov_type=cov_type)
+            prior = normal.mean_precision.prior
+            self.normals.append(normal)
+            params1, params2 = [], []
+            for _ in range(self.size):
+                normal = beer.Normal.create(
+                    torch.randn(self.dim).type(self.type),
+                    cov.type(self.type),
+                    prior_strength=1 + torch.rand(1).item(),
+                    cov_type=cov_type
+                )
+                posterior = normal.mean_precision.posterior
+                params1.append(beer.BayesianParameter(prior, posterior))
+                params2.append(beer.BayesianParameter(
+                    prior, copy.deepcopy(posterior)))
+            self.params.append((params1, params2))
+
+    def test_create(self):
+        for i, (params, _) in enumerate(self.params):
+            with self.subTest(i=i):
+                nparams = torch.cat([param.posterior.natural_parameters
+                                     for param in params])
+                arena = beer.BayesianParameterArena(params)
+                self.assertEqual(len(arena), len(params))
+                self.assertArraysAlmostEqual(arena.posteriors.numpy(),
+                                             nparams.numpy())
+                # The posteriors are views of the arena.
+                arena.posteriors.add_(1.)
+                nparams2 = torch.cat([param.posterior.natural_parameters
+                                      for param in params])
+                self.assertArraysAlmostEqual(nparams2.numpy(),
+                                             nparams.numpy() + 1)
+
+    def test_natural_grad_update(self):
+        for i, (params1, params2) in enumerate(self.params):
+            with self.subTest(i=i):
+                arena = beer.BayesianParameterArena(params2)
+                for _ in range(2):
+                    # Fill the cache of the posteriors.
+                    for param in params2:
+                        param.expected_natural_parameters()
+                    normal = self.normals[i]
+                    stats = [normal.accumulate(normal.sufficient_statistics(
+                        torch.randn(10, self.dim).type(self.type)
+                    ))[normal.mean_precision] for _ in range(self.size)]
+                    for param1, param2, param_stats in zip(params1, params2,
+                                                           stats):
+                        param1.store_stats(param_stats)
+                        param1.natural_grad_update(self.lrate)
+                        param2.store_stats(param_stats)
+                    arena.natural_grad_update(self.lrate)
+                    for param1, param2 in zip(params1, params2):
+                        self.assertArraysAlmostEqual(
+                            param1.posterior.natural_parameters.numpy(),
+                            param2.posterior.natural_parameters.numpy()
+                        )
+                        # The cache of the posterior is invalidated by
+                        # the update.
+                        self.assertArraysAlmostEqual(
+                            param1.expected_natural_parameters().numpy(),
+                            param2.expected_natural_parameters().numpy()
+                        )
+
+    def test_replaced_posterior(self):
+        params = self.params[0][1]
+        arena = beer.BayesianParameterArena(params)
+        nparams = 2 * params[0].posterior.natural_parameters
+        params[0].posterior.natural_parameters = nparams
+        arena.zero_stats()
+        arena.natural_grad_update(1.)
+        prior = params[0].prior.natural_parameters
+        self.assertArraysAlmostEqual(
+            params[0].posterior.natural_parameters.numpy(),
+            prior.numpy()
+        )
+
+    def test_optimizer(self):
+        params = self.params[0][1]
+        optim = beer.BayesianModelOptimizer([params], lrate=1., arena=True)
+        optim.init_step()
+        optim.step()
+        for param in params:
+            self.assertArraysAlmostEqual(
+                param.posterior.natural_parameters.numpy(),
+                param.prior.natural_parameters.numpy()
+            )
+
+
+class TestVersionedCache(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.size = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(50, self.dim).type(self.type)
+        self.modelsets = []
+        for cov_type in ['isotropic', 'diagonal', 'full']:
+            cov = torch.eye(self.dim) if cov_type == 'full' \
+                else torch.ones(self.dim)
+            modelset = beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type), cov.type(self.type),
+                self.size, cov_type=cov_type
+            )
+            self.modelsets.append(modelset)
+
+    def test_version(self):
+        for i, modelset in enumerate(self.modelsets):
+            with self.subTest(i=i):
+                param = modelset.means_precisions
+                version = param.version
+                param.expected_natural_parameters()
+                self.assertEqual(param.version, version)
+                stats = modelset.accumulate(
+                    modelset.sufficient_statistics(self.data),
+                    torch.ones(len(self.data), self.size).type(self.type)
+                )[param]
+                param.store_stats(stats)
+                param.natural_grad_update(.5)
+                self.assertNotEqual(param.version, version)
+
+                # In-place update of the posterior.
+                version = param.version
+                arena = beer.BayesianParameterArena([param])
+                arena.zero_stats()
+                arena.natural_grad_update(.5)
+                self.assertNotEqual(param.version, version)
+
+    def test_get(self):
+        modelset = self.modelsets[0]
+        param = modelset.means_precisions
+        cache = beer.VersionedCache()
+        func = lambda: param.expected_natural_parameters().clone()
+        value1 = cache.get('nparams', [param], func)
+        value2 = cache.get('nparams', [param], func)
+        self.assertIs(value1, value2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        stats = modelset.accumulate(
+            modelset.sufficient_statistics(self.data),
+            torch.ones(len(self.data), self.size).type(self.type)
+        )[param]
+        param.store_stats(stats)
+        param.natural_grad_update(1.)
+        value3 = cache.get('nparams', [param], func)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertArraysAlmostEqual(value3.numpy(),
+                                     func().numpy())
+
+        cache.reset_counters()
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_marginal_log_likelihood(self):
+        for i, modelset in enumerate(self.modelsets):
+            with self.subTest(i=i):
+                optim = beer.BayesianModelOptimizer(
+                    modelset.mean_field_factorization(), lrate=.5)
+                stats = modelset.sufficient_statistics(self.data)
+                resps = torch.ones(len(self.data), self.size).type(self.type)
+                for _ in range(2):
+                    m_llhs1 = modelset.marginal_log_likelihood(stats)
+                    m_llhs2 = modelset.marginal_log_likelihood(stats)
+                    modelset.derived_cache.clear()
+                    m_llhs3 = modelset.marginal_log_likelihood(stats)
+                    self.assertArraysAlmostEqual(m_llhs1.numpy(),
+                                                 m_llhs2.numpy())
+                    self.assertArraysAlmostEqual(m_llhs1.numpy(),
+                                                 m_llhs3.numpy())
+                    optim.init_step()
+                    param = modelset.means_precisions
+                    param.store_stats(modelset.accumulate(stats,
+                                                          resps)[param])
+                    optim.step()
+                self.assertEqual(modelset.derived_cache_counters(), (2, 4))
+
+
 class TestBayesianModel(BaseTest):
 
     def setUp(self):
@@ -214,5 +596,8 @@ class TestBayesianModel(BaseTest):
 __all__ = [
     'TestBayesianParameter',
     'TestBayesianParameterSet',
+    'TestStackedBayesianParameterSet',
+    'TestBayesianParameterArena',
+    'TestVersionedCache',
     'TestBayesianModel'
 ]
@@ -0,0 +1,161 @@
+'Test the decoders.'
+
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+
+import numpy as np
+import torch
+import beer
+from basetest import BaseTest
+from test_graph import create_unit_graph, create_phone_loop
+
+
+def path_score(graph, llhs, path):
+    'Log-likelihood of a sequence of states.'
+    score = graph.init_probs[path[0]].log() + llhs[0, path[0]]
+    for i in range(1, len(path)):
+        score += graph.trans_probs[path[i - 1], path[i]].log()
+        score += llhs[i, path[i]]
+    return score + graph.final_probs[path[-1]].log()
+
+
+class TestBeamSearchDecoder(BaseTest):
+
+    def setUp(self):
+        n_units = int(1 + torch.randint(10, (1, 1)).item())
+        n_states = int(1 + torch.randint(5, (1, 1)).item())
+        units = [create_unit_graph(n_states, i * n_states)
+                 for i in range(n_units)]
+        cgraph = create_phone_loop(units).compile()
+        self.graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping
+        )
+        # Long enough utterance to reach a final state.
+        self.npoints = int(n_states + torch.randint(100, (1, 1)).item())
+        self.n_pdfs = n_units * n_states
+        self.pdf_llhs = 5 * torch.randn(self.npoints,
+                                        self.n_pdfs).type(self.type)
+        self.llhs = self.pdf_llhs[:, cgraph.pdf_id_mapping]
+
+    def llh_fn(self, frames, pdf_ids):
+        return self.pdf_llhs[frames][:, pdf_ids]
+
+    def test_no_pruning(self):
+        decoder = beer.BeamSearchDecoder(self.graph)
+        path1 = decoder.decode(self.llh_fn, self.npoints).numpy()
+        path2 = self.graph.best_path(self.llhs).numpy()
+        self.assertTrue(np.all(path1 == path2))
+        self.assertEqual(len(decoder.n_active), self.npoints)
+
+    def test_chunk_size(self):
+        chunk_size = int(1 + torch.randint(20, (1, 1)).item())
+        decoder = beer.BeamSearchDecoder(self.graph, chunk_size=chunk_size)
+        path1 = decoder.decode(self.llh_fn, self.npoints).numpy()
+        path2 = self.graph.best_path(self.llhs).numpy()
+        self.assertTrue(np.all(path1 == path2))
+        self.assertLessEqual(decoder.n_llh_calls, self.npoints)
+
+        # One chunk per frame: the pdfs are evaluated for every frame.
+        decoder = beer.BeamSearchDecoder(self.graph, chunk_size=1)
+        path1 = decoder.decode(self.llh_fn, self.npoints).numpy()
+        self.assertTrue(np.all(path1 == path2))
+        self.assertEqual(decoder.n_llh_calls, self.npoints)
+
+    def test_beam(self):
+        decoder = beer.BeamSearchDecoder(self.graph, beam=5.)
+        path = decoder.decode(self.llh_fn, self.npoints).numpy()
+        self.assertEqual(len(path), self.npoints)
+        self.assertTrue(all(0 < n_active <= self.graph.n_states
+                            for n_active in decoder.n_active))
+
+    def test_max_active(self):
+        max_active = int(1 + torch.randint(self.graph.n_states, (1,)).item())
+        decoder = beer.BeamSearchDecoder(self.graph, max_active=max_active)
+        path = decoder.decode(self.llh_fn, self.npoints).numpy()
+        self.assertEqual(len(path), self.npoints)
+        self.assertTrue(all(0 < n_active <= max_active
+                            for n_active in decoder.n_active))
+
+    def test_hmm_decode(self):
+        modelset = beer.NormalSet.create(torch.zeros(2).type(self.type),
+                                         torch.ones(2).type(self.type),
+                                         self.n_pdfs, cov_type='diagonal')
+        hmm = beer.HMM.create(self.graph, modelset)
+        data = torch.randn(self.npoints, 2).type(self.type)
+        decoder = beer.BeamSearchDecoder(self.graph)
+        path1 = hmm.decode(data, decoder=decoder)
+        path2 = hmm.decode(data)
+        self.assertEqual(len(path1), self.npoints)
+
+        # The emissions are evaluated by chunks of frames for subsets of
+        # the pdfs by the decoder so the paths may differ on
+        # (numerical) ties.
+        stats = modelset.sufficient_statistics(data)
+        llhs = modelset.expected_log_likelihood(stats)
+        llhs = llhs[:, self.graph.pdf_id_mapping]
+        self.assertAlmostEqual(float(path_score(self.graph, llhs, path1)),
+                               float(path_score(self.graph, llhs, path2)),
+                               places=self.tolplaces)
+
+
+class TestOnlineViterbiDecoder(BaseTest):
+
+    def setUp(self):
+        n_units = int(1 + torch.randint(10, (1, 1)).item())
+        n_states = int(1 + torch.randint(5, (1, 1)).item())
+        units = [create_unit_graph(n_states, i * n_states)
+                 for i in range(n_units)]
+        cgraph = create_phone_loop(units).compile()
+        self.graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping
+        )
+        self.n_pdfs = n_units * n_states
+        self.npoints = int(n_states + torch.randint(200, (1, 1)).item())
+        self.llhs = 5 * torch.randn(self.npoints,
+                                    self.graph.n_states).type(self.type)
+        self.chunk_size = int(1 + torch.randint(20, (1, 1)).item())
+
+    def test_push(self):
+        decoder = beer.OnlineViterbiDecoder(self.graph)
+        paths = [decoder.push(chunk)
+                 for chunk in self.llhs.split(self.chunk_size)]
+        paths.append(decoder.finalize())
+        path1 = torch.cat(paths).numpy()
+        path2 = self.graph.best_path(self.llhs).numpy()
+        self.assertTrue(np.all(path1 == path2))
+        self.assertEqual(decoder.delay, 0)
+
+    def test_max_delay(self):
+        max_delay = int(1 + torch.randint(10, (1, 1)).item())
+        decoder = beer.OnlineViterbiDecoder(self.graph, max_delay=max_delay)
+        paths = []
+        for chunk in self.llhs.split(self.chunk_size):
+            paths.append(decoder.push(chunk))
+            self.assertLessEqual(decoder.delay, max_delay)
+        paths.append(decoder.finalize())
+        self.assertEqual(len(torch.cat(paths)), self.npoints)
+
+    def test_hmm_decode_stream(self):
+        modelset = beer.NormalSet.create(torch.zeros(2).type(self.type),
+                                         torch.ones(2).type(self.type),
+                                         self.n_pdfs, cov_type='diagonal')
+        hmm = beer.HMM.create(self.graph, modelset)
+        data = torch.randn(self.npoints, 2).type(self.type)
+        chunks = data.split(self.chunk_size)
+        path = torch.cat(list(hmm.decode_stream(chunks)))
+        self.assertEqual(len(path), self.npoints)
+        self.assertTrue(np.all(path.numpy() < self.n_pdfs))
+
+
+__all__ = ['TestBeamSearchDecoder', 'TestOnlineViterbiDecoder']
@@ -0,0 +1,113 @@
+'Test the distributed training.'
+
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+import os
+import tempfile
+import unittest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import beer
+from basetest import BaseTest
+
+
+WORLD_SIZE = 2
+
+
+def create_model(dim, dtype, seed):
+    torch.manual_seed(seed)
+    normalset = beer.NormalSet.create(torch.zeros(dim).type(dtype),
+                                      torch.ones(dim).type(dtype), 4,
+                                      cov_type='diagonal', noise_std=1.)
+    return beer.Mixture.create(normalset)
+
+
+def train(rank, init_file, data, dtype, n_steps, results):
+    '''Training on the shard of a process. The model of each process is
+    initialized with a different seed.'''
+    dist.init_process_group('gloo', init_method='file://' + init_file,
+                            rank=rank, world_size=WORLD_SIZE)
+    model = create_model(data.shape[-1], dtype, seed=rank)
+    linear = torch.nn.Linear(2, 1).type(dtype)
+    std_optim = torch.optim.SGD(linear.parameters(), lr=1.)
+    optim = beer.DistributedBayesianModelOptimizer(
+        model.mean_field_factorization(), lrate=1., std_optim=std_optim)
+    for batch in beer.shard(list(data)):
+        for _ in range(n_steps):
+            optim.init_step()
+            elbo = beer.evidence_lower_bound(model, batch,
+                                             datasize=len(data) * len(batch))
+            elbo.backward()
+            linear.weight.grad = torch.ones_like(linear.weight) * (rank + 1)
+            optim.step()
+    params = [param.posterior.natural_parameters.reshape(-1)
+              for param in model.bayesian_parameters()]
+    params.append(linear.weight.data.reshape(-1))
+    results[rank] = torch.cat(params)
+    dist.destroy_process_group()
+
+
+@unittest.skipUnless(dist.is_available(), 'torch.distributed not available')
+class TestDistributedBayesianModelOptimizer(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.npoints = int(10 + torch.randint(100, (1, 1)).item())
+        self.n_batches = 2 * WORLD_SIZE + 1
+
+    def test_shard(self):
+        seq = list(range(7))
+        self.assertEqual(beer.shard(seq, 0, 2), [0, 2, 4])
+        self.assertEqual(beer.shard(seq, 1, 2), [1, 3, 5])
+        self.assertEqual(beer.shard(seq, 2, 3), [2, 5])
+
+    def test_step(self):
+        data = torch.randn(self.n_batches, self.npoints, self.dim).type(
+            self.type)
+
+        # Reference: single process, the minibatches are the union of
+        # the shards.
+        model = create_model(self.dim, self.type, seed=0)
+        linear = torch.nn.Linear(2, 1).type(self.type)
+        weight = linear.weight.data.clone()
+        optim = beer.BayesianModelOptimizer(model.mean_field_factorization(),
+                                            lrate=1.)
+        n_steps = 2
+        shards = [beer.shard(list(data), rank, WORLD_SIZE)
+                  for rank in range(WORLD_SIZE)]
+        for batches in zip(*shards):
+            batch = torch.cat(batches)
+            for _ in range(n_steps):
+                optim.init_step()
+                elbo = beer.evidence_lower_bound(
+                    model, batch, datasize=len(data) * self.npoints)
+                elbo.backward()
+                optim.step()
+                weight -= (1 + WORLD_SIZE) / 2
+        params = [param.posterior.natural_parameters.reshape(-1)
+                  for param in model.bayesian_parameters()]
+
+        results = torch.zeros(WORLD_SIZE, sum(len(p) for p in params)
+                              + weight.numel()).type(self.type)
+        results.share_memory_()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            init_file = os.path.join(tmpdir, 'init')
+            mp.start_processes(train, nprocs=WORLD_SIZE, start_method='fork',
+                               args=(init_file, data, self.type, n_steps,
+                                     results))
+        # All the processes have the same model.
+        self.assertArraysAlmostEqual(results[0].numpy(), results[1].numpy())
+        n_params = len(results[0]) - weight.numel()
+        self.assertArraysAlmostEqual(results[0, :n_params].numpy(),
+                                     torch.cat(params).numpy())
+        self.assertArraysAlmostEqual(results[0, n_params:].numpy(),
+                                     weight.view(-1).numpy())
+
+
+__all__ = ['TestDistributedBayesianModelOptimizer']
@@ -0,0 +1,464 @@
+'Test the acoustic graph.'
+
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+
+import os
+import pickle
+import tempfile
+import numpy as np
+import torch
+import beer
+from basetest import BaseTest
+
+
+def create_unit_graph(n_emitting_states, start_pdf_id):
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    states = [graph.add_state(pdf_id=start_pdf_id + i)
+              for i in range(n_emitting_states)]
+    graph.end_state = graph.add_state()
+    graph.add_arc(graph.start_state, states[0])
+    for state, next_state in zip(states, states[1:] + [graph.end_state]):
+        graph.add_arc(state, state)
+        graph.add_arc(state, next_state)
+    graph.normalize()
+    return graph
+
+
+def create_skip_unit_graph(start_pdf_id):
+    # Unit with a skip arc: the second state can exit the unit or go
+    # to the third state.
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    states = [graph.add_state(pdf_id=start_pdf_id + i) for i in range(3)]
+    graph.end_state = graph.add_state()
+    graph.add_arc(graph.start_state, states[0], .7)
+    graph.add_arc(graph.start_state, states[1], .3)
+    graph.add_arc(states[0], states[0], .5)
+    graph.add_arc(states[0], states[1], .5)
+    graph.add_arc(states[1], states[1], .4)
+    graph.add_arc(states[1], states[2], .35)
+    graph.add_arc(states[1], graph.end_state, .25)
+    graph.add_arc(states[2], states[2], .6)
+    graph.add_arc(states[2], graph.end_state, .4)
+    return graph
+
+
+def create_phone_loop(units):
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    graph.end_state = graph.add_state()
+    joint_state = graph.add_state()
+    graph.add_arc(graph.start_state, joint_state)
+    graph.add_arc(joint_state, graph.end_state)
+    for unit in units:
+        unit_state = graph.add_state()
+        graph.add_arc(joint_state, unit_state)
+        graph.add_arc(unit_state, joint_state)
+        graph.replace_state(unit_state, unit)
+    graph.normalize()
+    return graph
+
+
+def create_alignment_graph(seq, units):
+    graph = beer.graph.Graph()
+    graph.start_state = graph.add_state()
+    last_state = graph.start_state
+    unit_states = []
+    for _ in seq:
+        state = graph.add_state()
+        unit_states.append(state)
+        graph.add_arc(last_state, state)
+        last_state = state
+    graph.end_state = graph.add_state()
+    graph.add_arc(last_state, graph.end_state)
+    for state, unit in zip(unit_states, seq):
+        graph.replace_state(state, units[unit])
+    graph.normalize()
+    return graph
+
+
+def compile_reference(graph):
+    'Compile the graph by enumerating explicitly all the paths.'
+    emitting = [state_id for state_id in graph.states()
+                if graph._states[state_id].pdf_id is not None]
+    idxs = {state_id: i for i, state_id in enumerate(emitting)}
+    out_arcs = {}
+    for arc in graph.arcs():
+        out_arcs.setdefault(arc.start, []).append((arc.end, arc.weight))
+
+    def next_states(state_id, weight):
+        # Emitting states or end state reached through non-emitting
+        # states only.
+        for end, arc_weight in out_arcs.get(state_id, []):
+            if graph._states[end].pdf_id is not None \
+                    or end == graph.end_state:
+                yield end, weight * arc_weight
+            else:
+                yield from next_states(end, weight * arc_weight)
+
+    nstates = len(emitting)
+    init_probs = np.zeros(nstates)
+    final_probs = np.zeros(nstates)
+    trans_probs = np.zeros((nstates, nstates))
+    for state_id, weight in next_states(graph.start_state, 1.):
+        if state_id != graph.end_state:
+            init_probs[idxs[state_id]] += weight
+    for state_id in emitting:
+        for end, weight in next_states(state_id, 1.):
+            if end == graph.end_state:
+                final_probs[idxs[state_id]] += weight
+            else:
+                trans_probs[idxs[state_id], idxs[end]] += weight
+
+    # The mass going to the final state is redistributed to the other
+    # outgoing arcs (the self-loop probability is kept unchanged).
+    diag = np.diag(trans_probs).copy()
+    off_diag = trans_probs.sum(axis=1) - diag
+    mask = (diag > 0) & (off_diag > 0)
+    trans_probs[mask] *= ((1 - diag[mask]) / off_diag[mask])[:, None]
+    trans_probs[mask, np.where(mask)[0]] = diag[mask]
+    return init_probs / init_probs.sum(), final_probs / final_probs.sum(), \
+        trans_probs
+
+
+def viterbi(init_probs, final_probs, trans_probs, llhs):
+    with np.errstate(divide='ignore'):
+        log_init_probs, log_final_probs, log_trans_probs = \
+            np.log(init_probs), np.log(final_probs), np.log(trans_probs)
+    backtrack = np.zeros_like(llhs, dtype=int)
+    omega = llhs[0] + log_init_probs
+    for i in range(1, llhs.shape[0]):
+        hypothesis = omega[:, None] + log_trans_probs
+        backtrack[i] = np.argmax(hypothesis, axis=0)
+        omega = llhs[i] + np.max(hypothesis, axis=0)
+    path = [np.argmax(omega + log_final_probs)]
+    for i in reversed(range(1, len(llhs))):
+        path.insert(0, backtrack[i, path[0]])
+    return np.asarray(path)
+
+
+class TestGraph(BaseTest):
+
+    def setUp(self):
+        self.n_units = int(1 + torch.randint(10, (1, 1)).item())
+        self.n_states = int(1 + torch.randint(5, (1, 1)).item())
+        self.units = [create_unit_graph(self.n_states, i * self.n_states)
+                      for i in range(self.n_units)]
+
+    def test_add_arc(self):
+        graph = beer.graph.Graph()
+        state1, state2 = graph.add_state(), graph.add_state()
+        arc1 = graph.add_arc(state1, state2, .3)
+        arc2 = graph.add_arc(state2, state2, .7)
+        self.assertEqual(graph.n_arcs, 2)
+        self.assertEqual(list(graph.arcs(state1)), [arc1])
+        self.assertEqual(list(graph.arcs(state2)), [arc2])
+        self.assertEqual(set(graph.arcs(state2, incoming=True)),
+                         set([arc1, arc2]))
+        self.assertAlmostEqual(arc1.weight, .3)
+        self.assertEqual((arc1.start, arc1.end), (state1, state2))
+
+    def test_normalize(self):
+        graph = beer.graph.Graph()
+        state1, state2 = graph.add_state(), graph.add_state()
+        graph.add_arc(state1, state1, 1.)
+        graph.add_arc(state1, state2, 3.)
+        graph.add_arc(state2, state2, 2.)
+        graph.normalize()
+        weights = sorted(arc.weight for arc in graph.arcs(state1))
+        self.assertArraysAlmostEqual(weights, [.25, .75])
+        self.assertAlmostEqual(next(graph.arcs(state2)).weight, 1.)
+
+    def test_replace_state(self):
+        graph = create_phone_loop(self.units)
+        n_states = 3 + self.n_units * (self.n_states + 2)
+        n_arcs = 2 + self.n_units * (2 * self.n_states + 3)
+        self.assertEqual(len(graph.states()), n_states)
+        self.assertEqual(graph.n_arcs, n_arcs)
+        for arc in graph.arcs():
+            self.assertIn(arc.start, graph.states())
+            self.assertIn(arc.end, graph.states())
+        for state_id in graph.states():
+            for arc in graph.arcs(state_id):
+                self.assertEqual(arc.start, state_id)
+            for arc in graph.arcs(state_id, incoming=True):
+                self.assertEqual(arc.end, state_id)
+
+    def test_compile(self):
+        graph = create_phone_loop(self.units)
+        cgraph = graph.compile()
+        init_probs, final_probs, trans_probs = compile_reference(graph)
+        self.assertEqual(cgraph.n_states, self.n_units * self.n_states)
+        self.assertEqual(sorted(cgraph.pdf_id_mapping),
+                         list(range(self.n_units * self.n_states)))
+        self.assertArraysAlmostEqual(cgraph.init_probs.numpy(), init_probs)
+        self.assertArraysAlmostEqual(cgraph.final_probs.numpy(), final_probs)
+        self.assertArraysAlmostEqual(cgraph.trans_probs.numpy(), trans_probs)
+        self.assertAlmostEqual(cgraph.final_probs.sum().item(), 1.,
+                               places=self.tolplaces)
+
+    def test_compile_weighted(self):
+        # Non-uniform weights: the final probabilities are the weights of
+        # all the paths to the end state (the former depth-first search
+        # counted some arc weights twice and kept only the first path
+        # through each non-emitting state).
+        graph = beer.graph.Graph()
+        graph.start_state = graph.add_state()
+        graph.end_state = graph.add_state()
+        state1, state2 = graph.add_state(pdf_id=0), graph.add_state(pdf_id=1)
+        eps_state1, eps_state2 = graph.add_state(), graph.add_state()
+        graph.add_arc(graph.start_state, state1, .6)
+        graph.add_arc(graph.start_state, state2, .4)
+        graph.add_arc(state1, state1, .3)
+        graph.add_arc(state1, eps_state1, .7)
+        graph.add_arc(state2, state2, .5)
+        graph.add_arc(state2, eps_state1, .2)
+        graph.add_arc(state2, eps_state2, .3)
+        graph.add_arc(eps_state1, graph.end_state, .4)
+        graph.add_arc(eps_state1, state2, .6)
+        graph.add_arc(eps_state2, graph.end_state, 1.)
+        cgraph = graph.compile()
+        self.assertArraysAlmostEqual(cgraph.final_probs.numpy(),
+                                     np.array([.28, .38]) / .66)
+
+        # Phone loop with random weights.
+        graph = create_phone_loop([create_skip_unit_graph(3 * i)
+                                   for i in range(self.n_units)])
+        for arc in graph.arcs():
+            arc.weight = .1 + torch.rand(1).item()
+        graph.normalize()
+        cgraph = graph.compile()
+        init_probs, final_probs, trans_probs = compile_reference(graph)
+        self.assertArraysAlmostEqual(cgraph.init_probs.numpy(), init_probs)
+        self.assertArraysAlmostEqual(cgraph.final_probs.numpy(), final_probs)
+        self.assertArraysAlmostEqual(cgraph.trans_probs.numpy(), trans_probs)
+
+    def test_compile_epsilon_cycle(self):
+        graph = beer.graph.Graph()
+        graph.start_state = graph.add_state()
+        graph.end_state = graph.add_state()
+        state1, state2 = graph.add_state(pdf_id=0), graph.add_state(pdf_id=1)
+        eps_state1, eps_state2 = graph.add_state(), graph.add_state()
+        graph.add_arc(graph.start_state, state1)
+        graph.add_arc(state1, state1, .5)
+        graph.add_arc(state1, eps_state1, .5)
+        graph.add_arc(eps_state1, eps_state2, .5)
+        graph.add_arc(eps_state2, eps_state1, 1.)
+        graph.add_arc(eps_state1, state2, .5)
+        graph.add_arc(state2, graph.end_state)
+        cgraph = graph.compile()
+        self.assertArraysAlmostEqual(cgraph.init_probs.numpy(), [1., 0.])
+        self.assertArraysAlmostEqual(cgraph.final_probs.numpy(), [0., 1.])
+        self.assertArraysAlmostEqual(cgraph.trans_probs.numpy(),
+                                     [[.5, .5], [0., 0.]])
+
+    def test_from_sequence(self):
+        seq_len = int(1 + torch.randint(20, (1, 1)).item())
+        seq = [int(unit) for unit in torch.randint(self.n_units, (seq_len,))]
+        cgraph1 = create_alignment_graph(seq, self.units).compile()
+        unit_graphs = [unit.compile() for unit in self.units]
+        cgraph2 = beer.graph.CompiledGraph.from_sequence(seq, unit_graphs)
+        self.assertEqual(cgraph2.n_states, seq_len * self.n_states)
+        self.assertEqual(cgraph2.pdf_id_mapping, cgraph1.pdf_id_mapping)
+        self.assertArraysAlmostEqual(cgraph2.init_probs.numpy(),
+                                     cgraph1.init_probs.numpy())
+        self.assertArraysAlmostEqual(cgraph2.final_probs.numpy(),
+                                     cgraph1.final_probs.numpy())
+        self.assertArraysAlmostEqual(cgraph2.trans_probs.to_dense().numpy(),
+                                     cgraph1.trans_probs.to_dense().numpy())
+        with self.assertRaises(ValueError):
+            beer.graph.CompiledGraph.from_sequence([], unit_graphs)
+
+    def test_from_sequence_skip(self):
+        units = [create_skip_unit_graph(3 * i) for i in range(2)] \
+            + self.units
+        seq_len = int(2 + torch.randint(20, (1, 1)).item())
+        seq = [0, 1] + [int(unit)
+                        for unit in torch.randint(len(units), (seq_len,))]
+        cgraph1 = create_alignment_graph(seq, units).compile()
+        unit_graphs = [unit.compile() for unit in units]
+        cgraph2 = beer.graph.CompiledGraph.from_sequence(seq, unit_graphs)
+        self.assertEqual(cgraph2.pdf_id_mapping, cgraph1.pdf_id_mapping)
+        self.assertArraysAlmostEqual(cgraph2.init_probs.numpy(),
+                                     cgraph1.init_probs.numpy())
+        self.assertArraysAlmostEqual(cgraph2.final_probs.numpy(),
+                                     cgraph1.final_probs.numpy())
+        self.assertArraysAlmostEqual(cgraph2.trans_probs.to_dense().numpy(),
+                                     cgraph1.trans_probs.to_dense().numpy())
+
+        # Compiled graphs without the weights before normalization
+        # (the exit weights are approximated).
+        unit_graphs = [beer.graph.CompiledGraph(graph.init_probs,
+                                                graph.final_probs,
+                                                graph.trans_probs,
+                                                graph.pdf_id_mapping)
+                       for graph in unit_graphs]
+        cgraph3 = beer.graph.CompiledGraph.from_sequence(seq, unit_graphs)
+        trans_probs = cgraph3.trans_probs.to_dense().numpy()
+        self.assertTrue(np.all(trans_probs >= 0))
+        llhs = torch.randn(50, cgraph3.n_states).type(self.type)
+        path = cgraph3.best_path(llhs).numpy()
+        self.assertTrue(np.all(trans_probs[path[:-1], path[1:]] > 0))
+        self.assertTrue(np.all(path == viterbi(
+            cgraph3.init_probs.numpy(), cgraph3.final_probs.numpy(),
+            trans_probs, llhs.numpy().astype(np.float64))))
+
+    def test_pickle(self):
+        graph = create_phone_loop(self.units)
+        graph2 = pickle.loads(pickle.dumps(graph))
+        self.assertEqual(graph2.n_arcs, graph.n_arcs)
+        self.assertArraysAlmostEqual(graph2.compile().trans_probs.numpy(),
+                                     graph.compile().trans_probs.numpy())
+
+
+class TestCompiledGraph(BaseTest):
+
+    def setUp(self):
+        n_units = int(1 + torch.randint(10, (1, 1)).item())
+        n_states = int(1 + torch.randint(5, (1, 1)).item())
+        units = [create_unit_graph(n_states, i * n_states)
+                 for i in range(n_units)]
+        cgraph = create_phone_loop(units).compile()
+        self.dense_graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping,
+            sparse=False
+        )
+        self.sparse_graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping,
+            sparse=True
+        )
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.llhs = torch.randn(self.npoints,
+                                cgraph.n_states).type(self.type)
+
+    def test_sparse(self):
+        self.assertFalse(self.dense_graph.is_sparse)
+        self.assertTrue(self.sparse_graph.is_sparse)
+        self.assertEqual(self.dense_graph.n_states,
+                         self.sparse_graph.n_states)
+        self.assertArraysAlmostEqual(
+            self.sparse_graph.trans_probs.to_dense().numpy(),
+            self.dense_graph.trans_probs.numpy()
+        )
+
+    def test_posteriors(self):
+        posts1 = self.dense_graph.posteriors(self.llhs).numpy()
+        posts2 = self.sparse_graph.posteriors(self.llhs).numpy()
+        self.assertArraysAlmostEqual(posts1, posts2)
+        self.assertArraysAlmostEqual(posts1.sum(axis=1),
+                                     np.ones(self.npoints))
+
+    def test_best_path(self):
+        path1 = self.dense_graph.best_path(self.llhs).numpy()
+        path2 = self.sparse_graph.best_path(self.llhs).numpy()
+        path3 = viterbi(self.dense_graph.init_probs.numpy(),
+                        self.dense_graph.final_probs.numpy(),
+                        self.dense_graph.trans_probs.numpy(),
+                        self.llhs.numpy())
+        self.assertEqual(len(path1), self.npoints)
+        self.assertTrue(np.all(path1 == path2))
+        self.assertTrue(np.all(path1 == path3))
+
+    def test_checkpointed_posteriors(self):
+        step = int(1 + torch.randint(self.npoints, (1, 1)).item())
+        for graph in [self.dense_graph, self.sparse_graph]:
+            posts1 = graph.posteriors(self.llhs).numpy()
+            posts2 = graph.posteriors(self.llhs, checkpoint=True).numpy()
+            posts3 = graph.posteriors(self.llhs, checkpoint=step).numpy()
+            self.assertArraysAlmostEqual(posts1, posts2)
+            self.assertArraysAlmostEqual(posts1, posts3)
+
+    def test_batch_posteriors(self):
+        lengths = torch.LongTensor([self.npoints, max(1, self.npoints // 2)])
+        llhs = [self.llhs[:length] for length in lengths]
+        padded_llhs = torch.nn.utils.rnn.pad_sequence(llhs, batch_first=True)
+        packed_llhs = torch.nn.utils.rnn.pack_sequence(llhs)
+        for graph in [self.dense_graph, self.sparse_graph]:
+            posts = graph.posteriors(padded_llhs, lengths=lengths).numpy()
+            self.assertEqual(posts.shape, padded_llhs.shape)
+            for i, length in enumerate(lengths):
+                self.assertArraysAlmostEqual(
+                    posts[i, :length],
+                    graph.posteriors(llhs[i]).numpy()
+                )
+                self.assertArraysAlmostEqual(
+                    posts[i, length:],
+                    np.zeros((self.npoints - length, graph.n_states))
+                )
+            self.assertArraysAlmostEqual(
+                graph.posteriors(packed_llhs).numpy(),
+                posts
+            )
+            with self.assertRaises(ValueError):
+                graph.posteriors(padded_llhs, lengths=lengths,
+                                 checkpoint=True)
+            with self.assertRaises(ValueError):
+                graph.posteriors(packed_llhs, checkpoint=2)
+
+    def test_batch_best_path(self):
+        lengths = torch.LongTensor([self.npoints, max(1, self.npoints // 2)])
+        llhs = [self.llhs[:length] for length in lengths]
+        padded_llhs = torch.nn.utils.rnn.pad_sequence(llhs, batch_first=True)
+        packed_llhs = torch.nn.utils.rnn.pack_sequence(llhs)
+        for graph in [self.dense_graph, self.sparse_graph]:
+            paths = graph.best_path(padded_llhs, lengths=lengths)
+            packed_paths = graph.best_path(packed_llhs)
+            self.assertEqual(len(paths), len(lengths))
+            for i, path in enumerate(paths):
+                path2 = graph.best_path(llhs[i]).numpy()
+                self.assertEqual(len(path), lengths[i])
+                self.assertTrue(np.all(path.numpy() == path2))
+                self.assertTrue(np.all(packed_paths[i].numpy() == path2))
+
+    def test_traceback(self):
+        self.assertEqual(beer.graph._backtrack_dtype(100), torch.int16)
+        self.assertEqual(beer.graph._backtrack_dtype(40000), torch.int32)
+        backtrack = np.array([[0, 0, 0], [2, 0, 1], [1, 2, 0]])
+        path = beer.graph._traceback(backtrack, 1)
+        self.assertTrue(np.all(path == np.array([1, 2, 1])))
+
+        # Compact and non-contiguous back-pointers (padded batch).
+        padded = np.zeros((2, 4, 3), dtype=np.int16)
+        padded[1, :3] = backtrack
+        path = beer.graph._traceback(padded[1, :3], 1)
+        self.assertTrue(np.all(path == np.array([1, 2, 1])))
+
+    def test_archive(self):
+        graphs = {'dense': self.dense_graph, 'sparse': self.sparse_graph}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'graphs')
+            beer.graph.save_compiled_graphs(path, graphs)
+            archive = beer.graph.CompiledGraphArchive(path)
+            self.assertEqual(sorted(archive), sorted(graphs))
+            for key, graph in graphs.items():
+                graph2 = archive[key]
+                self.assertEqual(graph2.is_sparse, graph.is_sparse)
+                self.assertEqual(graph2.pdf_id_mapping, graph.pdf_id_mapping)
+                self.assertArraysAlmostEqual(graph2.init_probs.numpy(),
+                                             graph.init_probs.numpy())
+                self.assertArraysAlmostEqual(graph2.final_probs.numpy(),
+                                             graph.final_probs.numpy())
+                self.assertArraysAlmostEqual(
+                    graph2.trans_probs.to_dense().numpy(),
+                    graph.trans_probs.to_dense().numpy()
+                )
+                self.assertArraysAlmostEqual(
+                    graph2.posteriors(self.llhs).numpy(),
+                    graph.posteriors(self.llhs).numpy()
+                )
+
+
+__all__ = ['TestGraph', 'TestCompiledGraph']
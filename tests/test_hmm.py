@@ -111,6 +111,8 @@ def create_ali_trans_mat(tot_states):
     return trans_mat
 
 
+@unittest.skip('HMM.create_trans_mat was removed: the HMMs are built '
+               'from a graph')
 class TestCreateTransMatrix(BaseTest):
 
     def setUp(self):
@@ -134,6 +136,8 @@ class TestCreateTransMatrix(BaseTest):
         self.assertArraysAlmostEqual(trans_ali_mat1, trans_ali_mat2.numpy())
 
 # pylint: disable=R0902
+@unittest.skip('the forward-backward and Viterbi algorithms moved to '
+               'CompiledGraph (see test_graph)')
 class TestForwardBackwardViterbi(BaseTest):
 
     def setUp(self):
@@ -188,30 +192,63 @@ class TestAlignModelSet(BaseTest):
         self.ali_seqs = np.random.randint(0, self.nstates,
                                           size=self.nseqs).tolist()
         self.modelsets = [
-            beer.NormalDiagonalCovarianceSet.create(
+            beer.NormalSet.create(
                 torch.zeros(self.dim).type(self.type),
                 torch.ones(self.dim).type(self.type),
                 self.nstates,
-                noise_std=0.1
+                noise_std=0.1,
+                cov_type='diagonal'
             ),
-            beer.NormalFullCovarianceSet.create(
+            beer.NormalSet.create(
                 torch.zeros(self.dim).type(self.type),
                 torch.eye(self.dim).type(self.type),
                 self.nstates,
-                noise_std=0.1
+                noise_std=0.1,
+                cov_type='full'
             ),
-            beer.NormalSetSharedDiagonalCovariance.create(
+            beer.NormalSet.create(
                 torch.zeros(self.dim).type(self.type),
                 torch.ones(self.dim).type(self.type),
                 self.nstates,
-                noise_std=0.1
+                noise_std=0.1,
+                cov_type='diagonal',
+                shared_cov=True
             ),
-            beer.NormalSetSharedFullCovariance.create(
+            beer.NormalSet.create(
                 torch.zeros(self.dim).type(self.type),
                 torch.eye(self.dim).type(self.type),
                 self.nstates,
-                noise_std=0.1
-            )
+                noise_std=0.1,
+                cov_type='full',
+                shared_cov=True
+            ),
+            beer.MixtureSet.create(
+                self.nstates,
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    2 * self.nstates,
+                    noise_std=0.1,
+                    cov_type='diagonal'
+                )
+            ),
+            beer.JointModelSet([
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    self.nstates,
+                    noise_std=0.1,
+                    cov_type='diagonal'
+                ),
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    self.nstates,
+                    noise_std=0.1,
+                    cov_type='diagonal',
+                    shared_cov=True
+                )
+            ])
         ]
         self.alimodelsets = []
         for modelset in self.modelsets:
@@ -221,20 +258,63 @@ class TestAlignModelSet(BaseTest):
         for i, m in enumerate(self.alimodelsets):
              with self.subTest(i=i):
                 stats1 = self.modelsets[i].sufficient_statistics(self.data)
-                _, stats2 = m.sufficient_statistics(self.data)
-                self.assertArraysAlmostEqual(stats1[0].numpy(), stats2[0].numpy())
+                stats2 = m.sufficient_statistics(self.data)
+                self.assertArraysAlmostEqual(stats1.numpy(), stats2.numpy())
 
-    def test_forward(self):
+    def test_expected_log_likelihood(self):
+        for i, m in enumerate(self.alimodelsets):
+            with self.subTest(i=i):
+                stats = m.sufficient_statistics(self.data)
+                llhs1 = self.modelsets[i].expected_log_likelihood(stats)
+                llhs2 = m.expected_log_likelihood(stats)
+                self.assertEqual(llhs2.shape, (self.npoints, self.nseqs))
+                self.assertArraysAlmostEqual(llhs1[:, self.ali_seqs].numpy(),
+                                             llhs2.numpy())
+
+    def test_accumulate(self):
+        resps = torch.rand(self.npoints, self.nseqs).type(self.type)
+        pdf_resps = torch.zeros(self.npoints, len(self.modelsets[-1]))
+        pdf_resps = pdf_resps.type(self.type)
+        for state, pdf_id in enumerate(self.ali_seqs):
+            pdf_resps[:, pdf_id] += resps[:, state]
+        for i, m in enumerate(self.alimodelsets):
+            with self.subTest(i=i):
+                modelset = self.modelsets[i]
+                stats = m.sufficient_statistics(self.data)
+                modelset.expected_log_likelihood(stats)
+                acc_stats1 = modelset.accumulate(
+                    stats, pdf_resps[:, :len(modelset)])
+                m.expected_log_likelihood(stats)
+                acc_stats2 = m.accumulate(stats, resps)
+
+                # Only the statistics of the pdfs used by the states are
+                # accumulated: the other ones are null.
+                for param, value in acc_stats1.items():
+                    value2 = acc_stats2.get(param, torch.zeros_like(value))
+                    self.assertArraysAlmostEqual(value.numpy(),
+                                                 value2.numpy())
+                self.assertTrue(set(acc_stats2).issubset(set(acc_stats1)))
+
+
+    def test_accumulate_hard(self):
+        path = torch.randint(self.nseqs, (self.npoints,))
+        resps = beer.utils.onehot(path, self.nseqs, dtype=self.data.dtype,
+                                  device=self.data.device)
         for i, m in enumerate(self.alimodelsets):
             with self.subTest(i=i):
-                len_stats = m.sufficient_statistics(self.data)
-                shape1 = (self.npoints, self.nseqs)
-                shape2 = m.forward(len_stats).shape
-                self.assertEqual(shape1[0], shape2[0])
-                self.assertEqual(shape1[1], shape2[1])
+                stats = m.sufficient_statistics(self.data)
+                m.expected_log_likelihood(stats)
+                acc_stats1 = m.accumulate(stats, resps)
+                acc_stats2 = m.accumulate(stats, path)
+                for param, value in acc_stats2.items():
+                    value1 = acc_stats1.get(param, torch.zeros_like(value))
+                    self.assertArraysAlmostEqual(value1.numpy(),
+                                                 value.numpy())
 
 
 # pylint: disable=R0902
+@unittest.skip('the normal sets were merged into NormalSet and the HMMs '
+               'are built from a graph')
 class TestHMM(BaseTest):
 
     def setUp(self):
@@ -11,6 +11,7 @@ sys.path.insert(0, './tests')
 
 import yaml
 import math
+import pickle
 import numpy as np
 import torch
 import beer
@@ -414,6 +415,125 @@ class TestNormalSetSharedFullCovariance(BaseTest):
         self.assertArraysAlmostEqual(acc_stats1.numpy(), acc_stats2.numpy())
 
 
+class TestNormalSetMarginalLogLikelihood(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.size = int(1 + torch.randint(100, (1, 1)).item())
+        self.models = []
+        for cov_type, normal_cls in [
+                ('isotropic', beer.NormalIsotropicCovariance),
+                ('diagonal', beer.NormalDiagonalCovariance),
+                ('full', beer.NormalFullCovariance)]:
+            cov = torch.eye(self.dim) if cov_type == 'full' \
+                else torch.ones(self.dim)
+            for low_memory in [False, True]:
+                model = beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    cov.type(self.type),
+                    self.size,
+                    noise_std=1.,
+                    cov_type=cov_type,
+                    low_memory=low_memory
+                )
+                self.models.append((model, normal_cls))
+
+    def test_marginal_log_likelihood(self):
+        for i, (model, normal_cls) in enumerate(self.models):
+            with self.subTest(i=i):
+                stats = model.sufficient_statistics(self.data)
+                m_llhs1 = model.marginal_log_likelihood(stats).numpy()
+                self.assertEqual(m_llhs1.shape, (self.npoints, self.size))
+                stats = normal_cls.sufficient_statistics(self.data)
+                m_llhs2 = np.concatenate([
+                    normal_cls._marginal_log_likelihood(param.posterior,
+                                                        stats).view(-1, 1)
+                    for param in model.means_precisions
+                ], axis=-1)
+                self.assertArraysAlmostEqual(m_llhs1, m_llhs2)
+
+
+class TestNormalSetLowMemory(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.size = int(1 + torch.randint(100, (1, 1)).item())
+        self.models = []
+        for shared_cov in [False, True]:
+            model = beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type),
+                torch.eye(self.dim).type(self.type),
+                self.size,
+                noise_std=1.,
+                cov_type='full',
+                shared_cov=shared_cov
+            )
+            if shared_cov:
+                param = model.means_precision
+                lm_model = type(model)(param.prior, param.posterior,
+                                       low_memory=True)
+            else:
+                posteriors = [param.posterior
+                              for param in model.means_precisions]
+                lm_model = type(model)(model.means_precisions[0].prior,
+                                       posteriors, low_memory=True)
+            self.models.append((model, lm_model))
+
+    def test_sufficient_statistics(self):
+        for i, (_, lm_model) in enumerate(self.models):
+            with self.subTest(i=i):
+                stats = lm_model.sufficient_statistics(self.data)
+                self.assertEqual(stats.shape[1], self.dim + 2)
+
+    def test_expected_log_likelihood(self):
+        idxs = torch.randint(self.size, (self.size,))
+        for i, (model, lm_model) in enumerate(self.models):
+            with self.subTest(i=i):
+                stats1 = model.sufficient_statistics(self.data)
+                stats2 = lm_model.sufficient_statistics(self.data)
+                llhs1 = model.expected_log_likelihood(stats1, idxs).numpy()
+                llhs2 = lm_model.expected_log_likelihood(stats2, idxs).numpy()
+                self.assertArraysAlmostEqual(llhs1, llhs2)
+
+    def test_accumulate(self):
+        resps = torch.rand(self.npoints, self.size).type(self.type)
+        labels = torch.randint(self.size, (self.npoints,))
+        for i, (model, lm_model) in enumerate(self.models):
+            for weights in [resps, labels]:
+                with self.subTest(i=i, hard=weights is labels):
+                    stats1 = model.sufficient_statistics(self.data)
+                    stats2 = lm_model.sufficient_statistics(self.data)
+                    acc_stats1 = model.accumulate(stats1, weights)
+                    acc_stats2 = lm_model.accumulate(stats2, weights)
+                    self.assertEqual(len(acc_stats1), len(acc_stats2))
+                    for value1, value2 in zip(acc_stats1.values(),
+                                              acc_stats2.values()):
+                        self.assertArraysAlmostEqual(value1.numpy(),
+                                                     value2.numpy())
+
+    def test_pickle(self):
+        for i, (model, lm_model) in enumerate(self.models):
+            with self.subTest(i=i):
+                lm_model2 = pickle.loads(pickle.dumps(lm_model))
+                self.assertTrue(lm_model2.low_memory)
+
+                # Set pickled before the low-memory option was added.
+                state = dict(model.__dict__)
+                del state['low_memory']
+                model2 = type(model).__new__(type(model))
+                model2.__setstate__(state)
+                self.assertFalse(model2.low_memory)
+                stats = model2.sufficient_statistics(self.data)
+                self.assertArraysAlmostEqual(
+                    model2.expected_log_likelihood(stats).numpy(),
+                    model.expected_log_likelihood(stats).numpy()
+                )
+
+
 __all__ = [
     'TestNormalDiagonalCovariance',
     'TestNormalFullCovariance',
@@ -421,6 +541,8 @@ __all__ = [
     'TestNormalFullCovarianceSet',
     'TestNormalSetSharedDiagonalCovariance',
     'TestNormalSetSharedFullCovariance',
+    'TestNormalSetMarginalLogLikelihood',
+    'TestNormalSetLowMemory',
     'TestNormalIsotropicCovariance',
     'TestNormalsotropicCovarianceSet'
 ]
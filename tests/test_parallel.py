@@ -0,0 +1,124 @@
+'Test the data-parallel evaluation of the ELBO.'
+
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+import torch
+import beer
+from basetest import BaseTest
+from test_graph import create_unit_graph, create_phone_loop
+
+
+class TestParallelEvidenceLowerBound(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.npoints = int(10 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.models = []
+        for cov_type in ['isotropic', 'diagonal', 'full']:
+            cov = torch.eye(self.dim) if cov_type == 'full' \
+                else torch.ones(self.dim)
+            normalset = beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type), cov.type(self.type),
+                6, cov_type=cov_type, noise_std=1.)
+            mixtureset = beer.MixtureSet.create(3, normalset)
+            self.models.append(beer.Mixture.create(mixtureset))
+
+    def assertSameElbo(self, elbo1, elbo2, parameters):
+        self.assertAlmostEqual(float(elbo1) / self.npoints,
+                               float(elbo2) / self.npoints,
+                               places=self.tolplaces)
+        elbo1.backward()
+        stats1 = [param.stats.clone() for param in parameters]
+        elbo2.backward()
+        stats2 = [param.stats for param in parameters]
+        for p_stats1, p_stats2 in zip(stats1, stats2):
+            self.assertArraysAlmostEqual(p_stats1.numpy(), p_stats2.numpy())
+
+    def test_elbo(self):
+        for i, model in enumerate(self.models):
+            with self.subTest(i=i):
+                parameters = list(model.bayesian_parameters())
+                optim = beer.BayesianModelOptimizer(
+                    model.mean_field_factorization(), lrate=1.)
+                with beer.ParallelEvidenceLowerBound(model, 2) as elbo_fn:
+                    # The second evaluation checks that the workers
+                    # read the updated posteriors.
+                    for _ in range(2):
+                        elbo1 = beer.evidence_lower_bound(
+                            model, self.data, datasize=2 * self.npoints)
+                        elbo2 = elbo_fn(self.data, datasize=2 * self.npoints)
+                        self.assertSameElbo(elbo1, elbo2, parameters)
+                        optim.init_step()
+                        elbo2.backward()
+                        optim.step()
+
+    def test_arena(self):
+        for i, model in enumerate(self.models):
+            with self.subTest(i=i):
+                parameters = list(model.bayesian_parameters())
+                optim = beer.BayesianModelOptimizer(
+                    model.mean_field_factorization(), lrate=1., arena=True)
+                with beer.ParallelEvidenceLowerBound(model, 2) as elbo_fn:
+                    # The arena updates the posteriors in place: the
+                    # workers have to read them after each step.
+                    for _ in range(3):
+                        elbo1 = beer.evidence_lower_bound(
+                            model, self.data, datasize=2 * self.npoints)
+                        elbo2 = elbo_fn(self.data, datasize=2 * self.npoints)
+                        self.assertSameElbo(elbo1, elbo2, parameters)
+                        optim.init_step()
+                        elbo2.backward()
+                        optim.step()
+
+    def test_sequences(self):
+        model = self.models[0]
+        parameters = list(model.bayesian_parameters())
+        sequences = [(self.data[:5], {}), (self.data[5:], {})]
+        with beer.ParallelEvidenceLowerBound(model, 2) as elbo_fn:
+            elbo1 = beer.evidence_lower_bound(model, self.data)
+            elbo2 = elbo_fn.sequences(sequences)
+            self.assertSameElbo(elbo1, elbo2, parameters)
+
+    def test_padded_batch(self):
+        units = [create_unit_graph(2, 2 * i) for i in range(2)]
+        cgraph = create_phone_loop(units).compile()
+        graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping
+        )
+        modelset = beer.NormalSet.create(
+            torch.zeros(self.dim).type(self.type),
+            torch.ones(self.dim).type(self.type), 4, cov_type='diagonal')
+        model = beer.HMM.create(graph, modelset)
+        parameters = list(model.bayesian_parameters())
+        fts = [self.data[:5], self.data[5:], self.data[2:7]]
+        lengths = torch.LongTensor([len(ft) for ft in fts])
+        fts = torch.nn.utils.rnn.pad_sequence(fts, batch_first=True)
+        with beer.ParallelEvidenceLowerBound(model, 2) as elbo_fn:
+            for inference_type in ['viterbi', 'baum_welch']:
+                elbo1 = beer.evidence_lower_bound(
+                    model, fts, inference_type=inference_type,
+                    lengths=lengths)
+                elbo2 = elbo_fn(fts, inference_type=inference_type,
+                                lengths=lengths)
+                self.assertSameElbo(elbo1, elbo2, parameters)
+
+            # A single sequence cannot be split along the frames.
+            with self.assertRaises(ValueError):
+                elbo_fn(self.data, inference_type='viterbi')
+            elbo1 = beer.evidence_lower_bound(model, self.data,
+                                              inference_type='viterbi')
+            elbo2 = elbo_fn.sequences([(self.data, {})],
+                                      inference_type='viterbi')
+            self.assertSameElbo(elbo1, elbo2, parameters)
+
+
+__all__ = ['TestParallelEvidenceLowerBound']
@@ -5,13 +5,23 @@ sys.path.insert(0, './')
 sys.path.insert(0, './tests')
 
 import unittest
+import numpy as np
 import torch
 import beer
 from basetest import BaseTest
 
 
+def random_posdef(batch_shape, dim, dtype):
+    mats = torch.randn(*batch_shape, dim, dim).type(dtype)
+    return mats @ mats.transpose(-2, -1) / dim \
+        + torch.eye(dim).type(dtype)
+
+
 class BaseTestPrior(BaseTest):
 
+    # Leading dimensions of the batched priors.
+    batch_shape = (2, 3)
+
     def test_exp_sufficient_statistics(self):
         stats1 = self.prior.expected_sufficient_statistics()
         copied_tensor = torch.tensor(self.prior.natural_parameters,
@@ -21,6 +31,104 @@ class BaseTestPrior(BaseTest):
         stats2 = copied_tensor.grad
         self.assertArraysAlmostEqual(stats1.numpy(), stats2.numpy())
 
+    def test_expected_value(self):
+        exp_value1 = self.prior.expected_value()
+        exp_value2 = self.prior.expected_value()
+        if isinstance(exp_value1, torch.Tensor):
+            exp_value1, exp_value2 = [exp_value1], [exp_value2]
+        for value1, value2 in zip(exp_value1, exp_value2):
+            self.assertIs(value1, value2)
+
+        # The cache is cleared when the parameters are updated.
+        self.prior.natural_parameters = self.prior.natural_parameters.clone()
+        exp_value3 = self.prior.expected_value()
+        if isinstance(exp_value3, torch.Tensor):
+            exp_value3 = [exp_value3]
+        for value1, value3 in zip(exp_value1, exp_value3):
+            self.assertIsNot(value1, value3)
+            self.assertArraysAlmostEqual(value1.numpy(), value3.numpy())
+
+        # Generic implementation (gradient of the log-normalizer).
+        exp_stats1 = beer.priors.ExpFamilyPrior._expected_value(self.prior)
+        exp_stats2 = self.prior.expected_sufficient_statistics()
+        self.assertArraysAlmostEqual(exp_stats1.numpy(), exp_stats2.numpy())
+
+    def batch_priors(self):
+        'Batched prior and the corresponding prior of each item.'
+        std_params = self.random_std_parameters(self.batch_shape)
+        batch_prior = self.create_prior(*std_params)
+        priors = [self.create_prior(*[param[idx] for param in std_params])
+                  for idx in np.ndindex(*self.batch_shape)]
+        return batch_prior, priors
+
+    def test_batch_natural_parameters(self):
+        batch_prior, priors = self.batch_priors()
+        nparams = batch_prior.natural_parameters
+        self.assertEqual(nparams.shape[:-1], self.batch_shape)
+        for idx, prior in zip(np.ndindex(*self.batch_shape), priors):
+            self.assertArraysAlmostEqual(nparams[idx].numpy(),
+                                         prior.natural_parameters.numpy())
+
+    def test_batch_std_parameters(self):
+        batch_prior, priors = self.batch_priors()
+        std_params1 = batch_prior.to_std_parameters()
+        if isinstance(std_params1, torch.Tensor):
+            std_params1 = [std_params1]
+        for idx, prior in zip(np.ndindex(*self.batch_shape), priors):
+            std_params2 = prior.to_std_parameters()
+            if isinstance(std_params2, torch.Tensor):
+                std_params2 = [std_params2]
+            for param1, param2 in zip(std_params1, std_params2):
+                self.assertEqual(param1[idx].shape, param2.shape)
+                self.assertArraysAlmostEqual(param1[idx].numpy(),
+                                             param2.numpy())
+
+    def test_batch_log_norm(self):
+        batch_prior, priors = self.batch_priors()
+        lnorms1 = batch_prior.log_norm()
+        self.assertEqual(lnorms1.shape, self.batch_shape)
+        lnorms2 = np.array([float(prior.log_norm()) for prior in priors])
+        self.assertArraysAlmostEqual(lnorms1.numpy().reshape(-1), lnorms2)
+
+    def test_batch_exp_sufficient_statistics(self):
+        batch_prior, priors = self.batch_priors()
+        stats1 = batch_prior.expected_sufficient_statistics()
+        stats2 = torch.stack([prior.expected_sufficient_statistics()
+                              for prior in priors])
+        self.assertArraysAlmostEqual(
+            stats1.numpy(),
+            stats2.numpy().reshape(*self.batch_shape, -1)
+        )
+        copied_tensor = torch.tensor(batch_prior.natural_parameters,
+                                     requires_grad=True)
+        log_norm = batch_prior.log_norm(copied_tensor)
+        torch.autograd.backward(log_norm.sum())
+        self.assertArraysAlmostEqual(stats1.numpy(),
+                                     copied_tensor.grad.numpy())
+
+    def test_batch_expected_value(self):
+        batch_prior, priors = self.batch_priors()
+        exp_value1 = batch_prior.expected_value()
+        if isinstance(exp_value1, torch.Tensor):
+            exp_value1 = [exp_value1]
+        for idx, prior in zip(np.ndindex(*self.batch_shape), priors):
+            exp_value2 = prior.expected_value()
+            if isinstance(exp_value2, torch.Tensor):
+                exp_value2 = [exp_value2]
+            for value1, value2 in zip(exp_value1, exp_value2):
+                self.assertArraysAlmostEqual(value1[idx].numpy(),
+                                             value2.numpy())
+
+    def test_batch_kl_div(self):
+        batch_prior1, priors1 = self.batch_priors()
+        batch_prior2, priors2 = self.batch_priors()
+        kl_divs1 = beer.priors.ExpFamilyPrior.kl_div(batch_prior1, batch_prior2)
+        self.assertEqual(kl_divs1.shape, self.batch_shape)
+        kl_divs2 = np.array([float(beer.priors.ExpFamilyPrior.kl_div(prior1, prior2))
+                             for prior1, prior2 in zip(priors1, priors2)])
+        self.assertArraysAlmostEqual(kl_divs1.numpy().reshape(-1), kl_divs2)
+        self.assertTrue((kl_divs1 >= -self.tol).all())
+
 ########################################################################
 # Dirichlet.
 ########################################################################
@@ -32,6 +140,12 @@ class TestDirichletPrior(BaseTestPrior):
         self.std_parameters = 2 * torch.ones(dim)
         self.prior = beer.priors.DirichletPrior(self.std_parameters)
 
+    def random_std_parameters(self, batch_shape):
+        return 1 + torch.rand(*batch_shape, 5).type(self.type),
+
+    def create_prior(self, alphas):
+        return beer.priors.DirichletPrior(alphas)
+
     def test_natural2std(self):
         std_params = self.prior.to_std_parameters(self.prior.natural_parameters)
         self.assertArraysAlmostEqual(
@@ -58,6 +172,13 @@ class TestGammaPrior(BaseTestPrior):
         self.rate = torch.tensor(.5).type(self.type)
         self.prior = beer.priors.GammaPrior(self.shape, self.rate)
 
+    def random_std_parameters(self, batch_shape):
+        return 1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, shape, rate):
+        return beer.priors.GammaPrior(shape, rate)
+
     def test_natural2std(self):
         shape, rate = self.prior.to_std_parameters(self.prior.natural_parameters)
         self.assertArraysAlmostEqual(shape.numpy(), self.shape.numpy())
@@ -82,6 +203,14 @@ class TestWishartPrior(BaseTestPrior):
         self.dof = torch.tensor(dim + 2).type(self.type)
         self.prior = beer.priors.WishartPrior(self.scale, self.dof)
 
+    def random_std_parameters(self, batch_shape):
+        dim = 5
+        return random_posdef(batch_shape, dim, self.type), \
+            dim + 1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, scale, dof):
+        return beer.priors.WishartPrior(scale, dof)
+
     def test_natural2std(self):
         scale, dof = self.prior.to_std_parameters(self.prior.natural_parameters)
         self.assertArraysAlmostEqual(scale.numpy(), self.scale.numpy())
@@ -110,6 +239,15 @@ class TestNormalFullCovariancePrior(BaseTestPrior):
         self.prior = beer.priors.NormalFullCovariancePrior(self.mean, self.scale,
                                                     self.prior_precision)
 
+    def random_std_parameters(self, batch_shape):
+        dim = len(self.mean)
+        return torch.randn(*batch_shape, dim).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, mean, scale):
+        return beer.priors.NormalFullCovariancePrior(mean, scale,
+                                                     self.prior_precision)
+
     def test_natural2std(self):
         mean, scale = self.prior.to_std_parameters(self.prior.natural_parameters)
         self.assertArraysAlmostEqual(mean.numpy(), self.mean.numpy())
@@ -138,6 +276,17 @@ class TestNormalWishartPrior(BaseTestPrior):
         self.prior = beer.priors.NormalWishartPrior(self.mean, self.scale,
                                              self.mean_precision, self.dof)
 
+    def random_std_parameters(self, batch_shape):
+        dim = 5
+        return torch.randn(*batch_shape, dim).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            random_posdef(batch_shape, dim, self.type), \
+            dim + 1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, mean, scale, mean_precision, dof):
+        return beer.priors.NormalWishartPrior(mean, scale, mean_precision,
+                                              dof)
+
     def test_natural2std(self):
         mean, scale, mean_precision, dof = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -168,6 +317,16 @@ class TestNormalGammaPrior(BaseTestPrior):
         self.prior = beer.priors.NormalGammaPrior(self.mean, self.scale,
                                            self.shape, self.rates)
 
+    def random_std_parameters(self, batch_shape):
+        dim = 5
+        return torch.randn(*batch_shape, dim).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape, dim).type(self.type)
+
+    def create_prior(self, mean, scale, shape, rates):
+        return beer.priors.NormalGammaPrior(mean, scale, shape, rates)
+
     def test_natural2std(self):
         mean, scale, shape, rates = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -198,6 +357,16 @@ class TestIsotropicNormalGammaPrior(BaseTestPrior):
         self.prior = beer.priors.IsotropicNormalGammaPrior(self.mean, self.scale,
                                                     self.shape, self.rate)
 
+    def random_std_parameters(self, batch_shape):
+        dim = 5
+        return torch.randn(*batch_shape, dim).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, mean, scale, shape, rate):
+        return beer.priors.IsotropicNormalGammaPrior(mean, scale, shape, rate)
+
     def test_natural2std(self):
         mean, scale, shape, rate = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -229,6 +398,17 @@ class TestJointIsotropicNormalGammaPrior(BaseTestPrior):
         self.prior = beer.priors.JointIsotropicNormalGammaPrior(self.means, self.scales,
                                                          self.shape, self.rate)
 
+    def random_std_parameters(self, batch_shape):
+        dim, k = 5, 3
+        return torch.randn(*batch_shape, k, dim).type(self.type), \
+            1 + torch.rand(*batch_shape, k).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, means, scales, shape, rate):
+        return beer.priors.JointIsotropicNormalGammaPrior(means, scales,
+                                                          shape, rate)
+
     def test_natural2std(self):
         means, scales, shape, rate = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -260,6 +440,16 @@ class TestJointNormalGammaPrior(BaseTestPrior):
         self.prior = beer.priors.JointNormalGammaPrior(self.means, self.scales,
                                                 self.shape, self.rates)
 
+    def random_std_parameters(self, batch_shape):
+        dim, k = 5, 3
+        return torch.randn(*batch_shape, k, dim).type(self.type), \
+            1 + torch.rand(*batch_shape, k).type(self.type), \
+            1 + torch.rand(*batch_shape).type(self.type), \
+            1 + torch.rand(*batch_shape, dim).type(self.type)
+
+    def create_prior(self, means, scales, shape, rates):
+        return beer.priors.JointNormalGammaPrior(means, scales, shape, rates)
+
     def test_natural2std(self):
         means, scales, shape, rates = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -292,6 +482,17 @@ class TestJointNormalWishartPrior(BaseTestPrior):
         self.prior = beer.priors.JointNormalWishartPrior(self.means, self.scales,
                                                   self.mean_precision, self.dof)
 
+    def random_std_parameters(self, batch_shape):
+        dim, k = 5, 3
+        return torch.randn(*batch_shape, k, dim).type(self.type), \
+            1 + torch.rand(*batch_shape, k).type(self.type), \
+            random_posdef(batch_shape, dim, self.type), \
+            dim + 1 + torch.rand(*batch_shape).type(self.type)
+
+    def create_prior(self, means, scales, mean_precision, dof):
+        return beer.priors.JointNormalWishartPrior(means, scales,
+                                                   mean_precision, dof)
+
     def test_natural2std(self):
         means, scales, mean_precision, dof = \
             self.prior.to_std_parameters(self.prior.natural_parameters)
@@ -307,6 +508,38 @@ class TestJointNormalWishartPrior(BaseTestPrior):
                                      self.prior.natural_parameters.numpy())
 
 
+########################################################################
+# Matrix Normal.
+########################################################################
+
+class TestMatrixNormalPrior(BaseTestPrior):
+
+    def setUp(self):
+        dim1, dim2 = 4, 3
+        self.mean = torch.randn(dim1, dim2).type(self.type)
+        self.cov = random_posdef((), dim1, self.type)
+        self.prior = beer.priors.MatrixNormalPrior(self.mean, self.cov)
+
+    def random_std_parameters(self, batch_shape):
+        dim1, dim2 = self.mean.shape
+        return torch.randn(*batch_shape, dim1, dim2).type(self.type), \
+            random_posdef(batch_shape, dim1, self.type)
+
+    def create_prior(self, mean, cov):
+        return beer.priors.MatrixNormalPrior(mean, cov)
+
+    def test_natural2std(self):
+        mean, cov = self.prior.to_std_parameters(self.prior.natural_parameters)
+        self.assertArraysAlmostEqual(mean.numpy(), self.mean.numpy())
+        self.assertArraysAlmostEqual(cov.numpy(), self.cov.numpy())
+
+    def test_std2natural(self):
+        mean, cov = self.prior.to_std_parameters(self.prior.natural_parameters)
+        nparams = self.prior.to_natural_parameters(mean, cov)
+        self.assertArraysAlmostEqual(nparams.numpy(),
+                                     self.prior.natural_parameters.numpy())
+
+
 __all__ = [
     'TestDirichletPrior',
     'TestGammaPrior',
@@ -315,6 +548,7 @@ __all__ = [
     'TestJointIsotropicNormalGammaPrior',
     'TestJointNormalGammaPrior',
     'TestJointNormalWishartPrior',
+    'TestMatrixNormalPrior',
     'TestNormalGammaPrior',
     'TestNormalWishartPrior',
     'TestWishartPrior'
@@ -0,0 +1,231 @@
+'Test the frozen emission scorers.'
+
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+
+import numpy as np
+import torch
+import beer
+from basetest import BaseTest
+from test_graph import create_unit_graph, create_phone_loop
+
+
+class TestScorers(BaseTest):
+
+    def setUp(self):
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.size = int(1 + torch.randint(20, (1, 1)).item())
+        self.modelsets = [
+            beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type),
+                torch.ones(self.dim).type(self.type),
+                self.size,
+                noise_std=0.1,
+                cov_type=cov_type,
+                shared_cov=shared_cov
+            )
+            for cov_type in ['isotropic', 'diagonal']
+            for shared_cov in [False, True]
+        ]
+        self.modelsets += [
+            beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type),
+                torch.eye(self.dim).type(self.type),
+                self.size,
+                noise_std=0.1,
+                cov_type='full',
+                shared_cov=shared_cov
+            )
+            for shared_cov in [False, True]
+        ]
+        self.modelsets += [
+            beer.MixtureSet.create(
+                self.size,
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    2 * self.size,
+                    noise_std=0.1,
+                    cov_type='diagonal'
+                )
+            ),
+            beer.MixtureSet.create(
+                self.size,
+                beer.RepeatedModelSet(
+                    beer.NormalSet.create(
+                        torch.zeros(self.dim).type(self.type),
+                        torch.ones(self.dim).type(self.type),
+                        2,
+                        noise_std=0.1,
+                        cov_type='diagonal'
+                    ),
+                    self.size
+                )
+            ),
+            beer.JointModelSet([
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    self.size,
+                    noise_std=0.1,
+                    cov_type='diagonal'
+                ),
+                beer.NormalSet.create(
+                    torch.zeros(self.dim).type(self.type),
+                    torch.ones(self.dim).type(self.type),
+                    self.size,
+                    noise_std=0.1,
+                    cov_type='diagonal',
+                    shared_cov=True
+                )
+            ])
+        ]
+
+    def test_log_likelihood(self):
+        for i, modelset in enumerate(self.modelsets):
+            with self.subTest(i=i):
+                stats = modelset.sufficient_statistics(self.data)
+                llhs1 = modelset.expected_log_likelihood(stats).numpy()
+                scorer = modelset.scorer()
+                llhs2 = scorer.log_likelihood(self.data).numpy()
+                self.assertEqual(len(scorer), len(modelset))
+                self.assertArraysAlmostEqual(llhs1, llhs2)
+
+    def test_log_likelihood_idxs(self):
+        for i, modelset in enumerate(self.modelsets):
+            with self.subTest(i=i):
+                idxs = torch.randint(len(modelset), (len(modelset),))
+                stats = modelset.sufficient_statistics(self.data)
+                llhs1 = modelset.expected_log_likelihood(stats)[:, idxs]
+                scorer = modelset.scorer()
+                llhs2 = scorer.log_likelihood(self.data, idxs)
+                self.assertArraysAlmostEqual(llhs1.numpy(), llhs2.numpy())
+
+    def test_selected_log_likelihood(self):
+        # Sets of Normal densities only.
+        for i, modelset in enumerate(self.modelsets[:6]):
+            with self.subTest(i=i):
+                frames = torch.randint(self.npoints, (5 * self.npoints,))
+                idxs = torch.randint(len(modelset), (5 * self.npoints,))
+                scorer = modelset.scorer()
+                llhs1 = scorer.log_likelihood(self.data)[frames, idxs]
+                llhs2 = scorer.selected_log_likelihood(self.data, frames,
+                                                       idxs)
+                self.assertArraysAlmostEqual(llhs1.numpy(), llhs2.numpy())
+
+    def test_hmm_decode(self):
+        n_units = int(1 + torch.randint(10, (1, 1)).item())
+        n_states = int(1 + torch.randint(5, (1, 1)).item())
+        units = [create_unit_graph(n_states, i * n_states)
+                 for i in range(n_units)]
+        cgraph = create_phone_loop(units).compile()
+        graph = beer.graph.CompiledGraph(
+            cgraph.init_probs.type(self.type),
+            cgraph.final_probs.type(self.type),
+            cgraph.trans_probs.type(self.type),
+            cgraph.pdf_id_mapping
+        )
+        modelset = beer.NormalSet.create(
+            torch.zeros(self.dim).type(self.type),
+            torch.ones(self.dim).type(self.type),
+            n_units * n_states,
+            cov_type='diagonal'
+        )
+        hmm = beer.HMM.create(graph, modelset)
+        scorer = modelset.scorer()
+        path1 = hmm.decode(self.data, scorer=scorer).numpy()
+        path2 = hmm.decode(self.data).numpy()
+        self.assertTrue(np.all(path1 == path2))
+
+        decoder = beer.BeamSearchDecoder(graph)
+        path1 = hmm.decode(self.data, decoder=decoder, scorer=scorer).numpy()
+        path2 = hmm.decode(self.data, decoder=decoder).numpy()
+        self.assertTrue(np.all(path1 == path2))
+
+        lengths = torch.randint(1, self.npoints + 1, (3,))
+        data = torch.randn(3, self.npoints, self.dim).type(self.type)
+        paths1 = hmm.decode(data, lengths=lengths, scorer=scorer)
+        paths2 = hmm.decode(data, lengths=lengths)
+        for path1, path2 in zip(paths1, paths2):
+            self.assertTrue(np.all(path1.numpy() == path2.numpy()))
+
+
+class TestGaussianSelector(BaseTest):
+
+    def setUp(self):
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.size = int(1 + torch.randint(20, (1, 1)).item())
+        self.n_comps = int(1 + torch.randint(8, (1, 1)).item())
+        self.n_clusters = int(1 + torch.randint(10, (1, 1)).item())
+        self.modelset = beer.MixtureSet.create(
+            self.size,
+            beer.NormalSet.create(
+                torch.zeros(self.dim).type(self.type),
+                torch.ones(self.dim).type(self.type),
+                self.n_comps * self.size,
+                cov_type='diagonal'
+            )
+        )
+
+    def test_create(self):
+        scorer = self.modelset.scorer().scorer
+        selector = beer.GaussianSelector.create(scorer, self.n_clusters, 1)
+        sizes = selector.sizes.numpy()
+        self.assertLessEqual(len(sizes), self.n_clusters)
+        self.assertTrue(np.all(sizes > 0))
+        self.assertEqual(sizes.sum(), len(scorer))
+        gaussians = np.sort(selector.gaussians.numpy())
+        self.assertTrue(np.all(gaussians == np.arange(len(scorer))))
+
+    def test_select(self):
+        n_best = int(1 + torch.randint(self.n_clusters, (1, 1)).item())
+        scorer = self.modelset.scorer().scorer
+        selector = beer.GaussianSelector.create(scorer, self.n_clusters,
+                                                n_best)
+        frames, idxs = selector.select(self.data)
+        self.assertEqual(len(frames), len(idxs))
+        self.assertEqual(selector.n_frames, self.npoints)
+        self.assertEqual(selector.n_selected, len(idxs))
+        self.assertLessEqual(selector.mean_n_selected, len(scorer))
+        for frame in range(self.npoints):
+            frame_idxs = idxs[frames == frame].numpy()
+            self.assertTrue(len(frame_idxs) > 0)
+            self.assertEqual(len(np.unique(frame_idxs)), len(frame_idxs))
+        hit_rate = selector.hit_rate(scorer, self.data)
+        self.assertTrue(0 <= hit_rate <= 1)
+        selector.reset()
+        self.assertEqual(selector.n_frames, 0)
+        self.assertEqual(selector.n_selected, 0)
+
+    def test_select_all(self):
+        scorer1 = self.modelset.scorer()
+        scorer2 = self.modelset.scorer(n_clusters=self.n_clusters,
+                                       n_best=self.n_clusters)
+        llhs1 = scorer1.log_likelihood(self.data).numpy()
+        llhs2 = scorer2.log_likelihood(self.data).numpy()
+        self.assertArraysAlmostEqual(llhs1, llhs2)
+        self.assertAlmostEqual(scorer2.selector.mean_n_selected,
+                               len(scorer2.scorer))
+        self.assertEqual(scorer2.selector.hit_rate(scorer2.scorer,
+                                                   self.data), 1.)
+
+    def test_floor(self):
+        scorer = self.modelset.scorer(n_clusters=self.n_clusters, n_best=1,
+                                      floor=-1e3)
+        idxs = torch.randint(self.size, (self.size,))
+        llhs1 = scorer.log_likelihood(self.data)[:, idxs].numpy()
+        llhs2 = scorer.log_likelihood(self.data, idxs).numpy()
+        self.assertArraysAlmostEqual(llhs1, llhs2)
+        self.assertTrue(np.all(np.isfinite(llhs2)))
+
+
+__all__ = ['TestScorers', 'TestGaussianSelector']
@@ -37,6 +37,31 @@ class TestUtilityFunctions(BaseTest):
         labs2 = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]])
         self.assertArraysAlmostEqual(labs1.numpy(), labs2)
 
+    def test_weighted_sum(self):
+        ncomps = int(1 + torch.randint(10, (1, 1)).item())
+        labels = torch.randint(ncomps, (self.npoints,))
+        resps = beer.utils.onehot(labels, ncomps, dtype=self.data.dtype,
+                                  device=self.data.device)
+        self.assertTrue(beer.utils.is_hard_assignment(labels))
+        self.assertFalse(beer.utils.is_hard_assignment(resps))
+        w_stats1 = beer.utils.weighted_sum(resps, self.data, ncomps).numpy()
+        w_stats2 = beer.utils.weighted_sum(labels, self.data, ncomps).numpy()
+        self.assertArraysAlmostEqual(w_stats1, w_stats2)
+
+    def test_weighted_outer_sum(self):
+        ncomps = int(1 + torch.randint(100, (1, 1)).item())
+        labels = torch.randint(ncomps, (self.npoints,))
+        resps = torch.rand(self.npoints, ncomps).type(self.type)
+        data = self.data.numpy()
+        outer = data[:, :, None] * data[:, None, :]
+        w_stats1 = beer.utils.weighted_outer_sum(resps, self.data, ncomps)
+        w_stats2 = np.einsum('nk,nij->kij', resps.numpy(), outer)
+        self.assertArraysAlmostEqual(w_stats1.numpy(), w_stats2)
+        w_stats1 = beer.utils.weighted_outer_sum(labels, self.data, ncomps)
+        w_stats2 = np.zeros((ncomps, *outer.shape[1:]))
+        np.add.at(w_stats2, labels.numpy(), outer)
+        self.assertArraysAlmostEqual(w_stats1.numpy(), w_stats2)
+
     def test_symmetrize_matrix(self):
         sym_mat1 = beer.symmetrize_matrix(self.matrix).numpy()
         mat = self.matrix.numpy()
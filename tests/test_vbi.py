@@ -155,4 +155,61 @@ class TestEvidenceLowerbound(BaseTest):
                     previous = elbo
 
 
-__all__ = ['TestEvidenceLowerbound']
+class TestEvidenceLowerBoundAccumulator(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = [torch.randn(self.npoints, self.dim).type(self.type)
+                     for _ in range(3)]
+        normalset = beer.NormalSet.create(
+            torch.zeros(self.dim).type(self.type),
+            torch.ones(self.dim).type(self.type), 4, cov_type='diagonal',
+            noise_std=1.)
+        self.model = beer.Mixture.create(normalset)
+        self.datasize = 10 * self.npoints
+
+    def test_sum(self):
+        parameters = list(self.model.bayesian_parameters())
+        elbo1 = beer.evidence_lower_bound(datasize=self.datasize)
+        elbo2 = beer.EvidenceLowerBoundAccumulator(self.model, self.datasize)
+        for _ in range(2):
+            elbo2.reset()
+            for data in self.data:
+                elbo = beer.evidence_lower_bound(self.model, data,
+                                                 datasize=self.datasize)
+                elbo1 += elbo
+                elbo2 += elbo
+            self.assertAlmostEqual(float(elbo1) / self.datasize,
+                                   float(elbo2) / self.datasize,
+                                   places=self.tolplaces)
+            elbo1.natural_backward()
+            stats1 = [param.stats.clone() for param in parameters]
+            elbo2.natural_backward()
+            for param, p_stats1 in zip(parameters, stats1):
+                self.assertArraysAlmostEqual(param.stats.numpy(),
+                                             p_stats1.numpy())
+            elbo1 = beer.evidence_lower_bound(datasize=self.datasize)
+
+    def test_backward(self):
+        weight = torch.ones(self.dim).type(self.type).requires_grad_(True)
+        elbo1 = beer.evidence_lower_bound(datasize=self.datasize)
+        elbo2 = beer.EvidenceLowerBoundAccumulator(self.model, self.datasize)
+        for data in self.data:
+            elbo1 += beer.evidence_lower_bound(self.model, data * weight,
+                                               datasize=self.datasize)
+            elbo2 += beer.evidence_lower_bound(self.model, data * weight,
+                                               datasize=self.datasize)
+        elbo1.backward()
+        grad1 = weight.grad.clone()
+        weight.grad = None
+        elbo2.backward()
+        self.assertArraysAlmostEqual(weight.grad.numpy(), grad1.numpy())
+
+    def test_different_datasize(self):
+        elbo = beer.EvidenceLowerBoundAccumulator(self.model, self.datasize)
+        with self.assertRaises(ValueError):
+            elbo += beer.evidence_lower_bound(self.model, self.data[0])
+
+
+__all__ = ['TestEvidenceLowerbound', 'TestEvidenceLowerBoundAccumulator']